@@ -0,0 +1,65 @@
+"""Asyncio front end for the data layer.
+
+Every function of the configured storage backend (see storage.py) has an
+awaitable twin here. The blocking boto3 work runs on a dedicated worker pool sized to the
+botocore connection pool, not on Starlette's shared threadpool, so handler
+concurrency is bounded by DynamoDB connections instead of the default
+40 framework threads. Independent lookups can be awaited together with
+asyncio.gather.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+import storage
+from common import metrics
+from common.aws import MAX_POOL_CONNECTIONS
+
+DATA_LAYER_WORKERS = int(os.getenv('DATA_LAYER_WORKERS', str(MAX_POOL_CONNECTIONS)))
+
+_backend = storage.backend()
+_executor = ThreadPoolExecutor(max_workers=DATA_LAYER_WORKERS, thread_name_prefix='dynamodb')
+
+
+async def run(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking data-layer call on the DynamoDB worker pool."""
+    loop = asyncio.get_running_loop()
+    with metrics.data_layer():
+        return await loop.run_in_executor(_executor, functools.partial(metrics.bind(func), *args, **kwargs))
+
+
+def _awaitable(func: Callable) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(func, *args, **kwargs)
+    return wrapper
+
+
+# Events
+create_event = _awaitable(_backend.create_event)
+get_event = _awaitable(_backend.get_event)
+get_events_batch = _awaitable(_backend.get_events_batch)
+get_all_events = _awaitable(_backend.get_all_events)
+list_events = _awaitable(_backend.list_events)
+search_events = _awaitable(_backend.search_events)
+update_event = _awaitable(_backend.update_event)
+delete_event = _awaitable(_backend.delete_event)
+
+# Users
+create_user = _awaitable(_backend.create_user)
+get_user = _awaitable(_backend.get_user)
+get_users_batch = _awaitable(_backend.get_users_batch)
+get_all_users = _awaitable(_backend.get_all_users)
+update_user = _awaitable(_backend.update_user)
+delete_user = _awaitable(_backend.delete_user)
+
+# Registrations
+register_user = _awaitable(_backend.register_user)
+register_users_bulk = _awaitable(_backend.register_users_bulk)
+unregister_user = _awaitable(_backend.unregister_user)
+promote_from_waitlist = _awaitable(_backend.promote_from_waitlist)
+get_registration = _awaitable(_backend.get_registration)
+get_user_registrations = _awaitable(_backend.get_user_registrations)
+get_event_registrations = _awaitable(_backend.get_event_registrations)
+get_event_roster = _awaitable(_backend.get_event_roster)
@@ -0,0 +1 @@
+# Benchmarks - load scenarios against a local DynamoDB stand-in
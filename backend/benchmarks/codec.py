@@ -0,0 +1,92 @@
+"""Measure item decoding CPU per item: boto3's TypeDeserializer vs common.codec.
+
+    cd backend
+    python -m benchmarks.codec --items 5000 --output codec.json
+
+No DynamoDB is involved: both decoders read the same synthetic items in
+wire format, the way a Query or Scan response carries them.
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Callable, List, Optional
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from common import codec
+
+
+def make_items(count: int) -> List[dict]:
+    return [{
+        'eventId': {'S': f'event-{i:06d}'},
+        'title': {'S': f'Event number {i}'},
+        'description': {'S': 'A reasonably sized description of the event ' * 4},
+        'date': {'S': '2025-06-01'},
+        'location': {'S': 'Main Hall'},
+        'capacity': {'N': '500'},
+        'organizer': {'S': 'Events Team'},
+        'status': {'S': 'published'},
+        'waitlistEnabled': {'BOOL': True},
+        'highDemand': {'BOOL': False},
+        'currentRegistrations': {'N': str(i % 500)},
+        'currentWaitlist': {'N': '0'},
+        'version': {'N': '3'}
+    } for i in range(count)]
+
+
+def boto3_decode(items: List[dict]) -> List[dict]:
+    """What the resource API does for every item it returns."""
+    deserializer = TypeDeserializer()
+    return [{name: deserializer.deserialize(value) for name, value in item.items()} for item in items]
+
+
+def codec_decode(items: List[dict]) -> List[dict]:
+    return [codec.decode_item(item) for item in items]
+
+
+def measure(func: Callable[[List[dict]], List[dict]], items: List[dict], repeat: int) -> dict:
+    func(items)  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        func(items)
+        timings.append(time.process_time() - start)
+    best = min(timings)
+    return {
+        'bestSeconds': round(best, 6),
+        'microsecondsPerItem': round(best / len(items) * 1e6, 3)
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Write the JSON report here as well as to stdout')
+    args = parser.parse_args(argv)
+
+    items = make_items(args.items)
+    # Same values either way; only the number types differ (Decimal vs int)
+    if boto3_decode(items[:50]) != codec_decode(items[:50]):
+        print("error: codec output differs from TypeDeserializer", file=sys.stderr)
+        sys.exit(1)
+
+    standard = measure(boto3_decode, items, args.repeat)
+    fast = measure(codec_decode, items, args.repeat)
+    report = {
+        'items': args.items,
+        'typeDeserializer': standard,
+        'codec': fast,
+        'microsecondsSavedPerItem': round(standard['microsecondsPerItem'] - fast['microsecondsPerItem'], 3),
+        'speedup': round(standard['bestSeconds'] / fast['bestSeconds'], 2) if fast['bestSeconds'] else None
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    main()
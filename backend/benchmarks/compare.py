@@ -0,0 +1,67 @@
+"""Compare two benchmark reports scenario by scenario.
+
+    python -m benchmarks.compare baseline.json candidate.json
+"""
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+METRICS = (
+    ('throughputRps', lambda s: s['throughputRps'], True),
+    ('p50', lambda s: s['latencyMs']['p50'], False),
+    ('p95', lambda s: s['latencyMs']['p95'], False),
+    ('p99', lambda s: s['latencyMs']['p99'], False),
+    ('calls/req', lambda s: s['dynamodbCallsPerRequest'], False),
+)
+
+
+def change(before: Optional[float], after: Optional[float]) -> str:
+    if not before or after is None:
+        return 'n/a'
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> List[str]:
+    """Print a comparison table; returns the regressions beyond `threshold` percent."""
+    regressions = []
+    print(f"{'scenario':<24}" + ''.join(f"{name:>22}" for name, _, _ in METRICS))
+    for scenario, after in candidate['scenarios'].items():
+        before = baseline['scenarios'].get(scenario)
+        if before is None:
+            print(f"{scenario:<24} (new)")
+            continue
+        cells = []
+        for name, metric, higher_is_better in METRICS:
+            old, new = metric(before), metric(after)
+            cells.append(f"{old:>9} -> {new:<9}{change(old, new):>3}")
+            if old and new is not None:
+                delta = (new - old) / old * 100
+                if (-delta if higher_is_better else delta) > threshold:
+                    regressions.append(f"{scenario} {name} {change(old, new)}")
+        print(f"{scenario:<24}" + ''.join(f"{cell:>22}" for cell in cells))
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percent change that counts as a regression (default 10)')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    regressions = compare(baseline, candidate, args.threshold)
+    if regressions:
+        print('\nRegressions:\n  ' + '\n  '.join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
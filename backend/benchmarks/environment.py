@@ -0,0 +1,195 @@
+"""Storage for benchmarks: in-process moto, DynamoDB Local, or an embedded SQLite file.
+
+Call `start()` before importing any app module, so the backend, table
+names and the endpoint are in place when the data layer first loads.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from typing import Optional
+
+TABLES = {
+    'Events': {
+        'keys': [('eventId', 'S', 'HASH')],
+        'indexes': [
+            ('status-date-index', [('status', 'S', 'HASH'), ('date', 'S', 'RANGE')], 'ALL'),
+            ('organizer-date-index', [('organizer', 'S', 'HASH'), ('date', 'S', 'RANGE')], 'INCLUDE', ['status', 'location']),
+        ],
+        'stream': True,
+    },
+    'Users': {
+        'keys': [('userId', 'S', 'HASH')],
+        'indexes': [],
+        'stream': True,
+    },
+    'Registrations': {
+        'keys': [('eventId', 'S', 'HASH'), ('userId', 'S', 'RANGE')],
+        'indexes': [
+            ('userId-index', [('userId', 'S', 'HASH')], 'ALL'),
+            ('waitlist-index', [('eventId', 'S', 'HASH'), ('waitlistSeq', 'N', 'RANGE')], 'KEYS_ONLY'),
+        ],
+        'stream': True,
+    },
+    'EventCounters': {
+        'keys': [('eventId', 'S', 'HASH'), ('shard', 'N', 'RANGE')],
+        'indexes': [],
+    },
+    'Rosters': {
+        'keys': [('eventId', 'S', 'HASH'), ('chunk', 'N', 'RANGE')],
+        'indexes': [],
+    },
+    'Jobs': {
+        'keys': [('jobId', 'S', 'HASH')],
+        'indexes': [],
+    },
+    'Idempotency': {
+        'keys': [('idempotencyKey', 'S', 'HASH')],
+        'indexes': [],
+    },
+    'SearchTerms': {
+        'keys': [('term', 'S', 'HASH'), ('dateKey', 'S', 'RANGE')],
+        'indexes': [
+            ('eventId-index', [('eventId', 'S', 'HASH')], 'KEYS_ONLY'),
+        ],
+    },
+    'StreamCheckpoints': {
+        'keys': [('partitionKey', 'S', 'HASH')],
+        'indexes': [],
+    },
+}
+
+_mock = None
+_sqlite_dir: Optional[str] = None
+
+
+def start(endpoint_url: Optional[str] = None, prefix: str = 'bench-', backend: str = 'dynamodb'):
+    """Point the app at a fresh set of tables and create them.
+
+    Without `endpoint_url` DynamoDB is mocked in-process with moto. Moto is
+    not thread-safe, so concurrent scenarios are only meaningful against
+    DynamoDB Local (or a real table set). With backend `sqlite` the app
+    uses a new database file in a temporary directory instead.
+    """
+    global _mock, _sqlite_dir
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ['STORAGE_BACKEND'] = backend
+    if backend == 'sqlite':
+        _sqlite_dir = tempfile.mkdtemp(prefix='bench-sqlite-')
+        os.environ['SQLITE_PATH'] = os.path.join(_sqlite_dir, 'events.db')
+        return
+    if endpoint_url:
+        os.environ['AWS_ENDPOINT_URL_DYNAMODB'] = endpoint_url
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+    else:
+        os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+        os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+        from moto import mock_aws
+        _mock = mock_aws()
+        _mock.start()
+
+    names = {
+        'DYNAMODB_TABLE_NAME': 'Events',
+        'USERS_TABLE_NAME': 'Users',
+        'REGISTRATIONS_TABLE_NAME': 'Registrations',
+        'COUNTERS_TABLE_NAME': 'EventCounters',
+        'JOBS_TABLE_NAME': 'Jobs',
+        'ROSTERS_TABLE_NAME': 'Rosters',
+        'IDEMPOTENCY_TABLE_NAME': 'Idempotency',
+        'SEARCH_TERMS_TABLE_NAME': 'SearchTerms',
+        'STREAM_CHECKPOINTS_TABLE_NAME': 'StreamCheckpoints',
+    }
+    for variable, table in names.items():
+        os.environ[variable] = prefix + table
+    create_tables(prefix)
+
+
+def create_tables(prefix: str = 'bench-'):
+    """(Re)create every table empty."""
+    from common import aws
+    client = aws.dynamodb_client()
+    for table, spec in TABLES.items():
+        _create_table(client, prefix + table, spec)
+
+
+def stop(prefix: str = 'bench-'):
+    if _sqlite_dir is not None:
+        shutil.rmtree(_sqlite_dir, ignore_errors=True)
+        return
+    from common import aws
+    client = aws.dynamodb_client()
+    for table in TABLES:
+        try:
+            client.delete_table(TableName=prefix + table)
+        except client.exceptions.ResourceNotFoundException:
+            pass
+    if _mock is not None:
+        _mock.stop()
+
+
+def backend_name() -> str:
+    if os.getenv('STORAGE_BACKEND') == 'sqlite':
+        return 'sqlite'
+    return os.getenv('AWS_ENDPOINT_URL_DYNAMODB') or 'moto'
+
+
+def _create_table(client, name: str, spec: dict):
+    attributes = {}
+    for attr, attr_type, _ in spec['keys']:
+        attributes[attr] = attr_type
+    indexes = []
+    for index_name, keys, projection, *included in spec['indexes']:
+        for attr, attr_type, _ in keys:
+            attributes[attr] = attr_type
+        indexes.append({
+            'IndexName': index_name,
+            'KeySchema': [{'AttributeName': attr, 'KeyType': key_type} for attr, _, key_type in keys],
+            'Projection': {'ProjectionType': projection, **({'NonKeyAttributes': included[0]} if included else {})},
+        })
+
+    params = {
+        'TableName': name,
+        'BillingMode': 'PAY_PER_REQUEST',
+        'AttributeDefinitions': [{'AttributeName': a, 'AttributeType': t} for a, t in attributes.items()],
+        'KeySchema': [{'AttributeName': attr, 'KeyType': key_type} for attr, _, key_type in spec['keys']],
+    }
+    if indexes:
+        params['GlobalSecondaryIndexes'] = indexes
+    if spec.get('stream'):
+        # For stream_replay when the app runs with DERIVED_VIEWS=stream
+        params['StreamSpecification'] = {'StreamEnabled': True, 'StreamViewType': 'NEW_AND_OLD_IMAGES'}
+
+    try:
+        client.delete_table(TableName=name)
+        client.get_waiter('table_not_exists').wait(TableName=name)
+    except client.exceptions.ResourceNotFoundException:
+        pass
+    client.create_table(**params)
+    client.get_waiter('table_exists').wait(TableName=name)
+
+
+class CallCounter:
+    """Counts DynamoDB API calls made through the shared clients, by operation."""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def install(self):
+        from common import aws
+        for client in (aws.dynamodb_client(), aws.dynamodb_raw_client()):
+            client.meta.events.register('before-call.dynamodb', self._record)
+
+    def _record(self, model, **kwargs):
+        with self._lock:
+            self._counts[model.name] += 1
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
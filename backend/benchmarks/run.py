@@ -0,0 +1,227 @@
+"""Run the API benchmark scenarios and write a JSON report.
+
+    cd backend
+    pip install -r requirements-dev.txt
+    python -m benchmarks.run --output bench-report.json
+    python -m benchmarks.run --endpoint-url http://localhost:8001 --concurrency 16
+    python -m benchmarks.run --backend sqlite --concurrency 16
+    python -m benchmarks.run --derived-views stream --scenarios register
+
+The app is driven in-process over ASGI, so the numbers cover the FastAPI
+handlers and the data layer, not network or API Gateway overhead.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from benchmarks import environment
+from benchmarks.seed import REGISTER_EVENT_ID, STORM_EVENT_ID, SeedConfig, event_id, seed, user_id
+
+Request = Tuple[str, str, Optional[dict]]
+
+
+@dataclass
+class Scenario:
+    name: str
+    request: Callable[[int], Request]
+    requests: int
+    concurrency: int
+
+
+def build_scenarios(config: SeedConfig, requests: int, concurrency: int, storm_concurrency: int) -> List[Scenario]:
+    events = max(config.events, 1)
+    users = max(config.users, 1)
+    # Registration scenarios need users that are not yet registered for their target
+    register_requests = min(requests, users)
+    storm_requests = min(requests, users)
+    return [
+        Scenario('get_event', lambda i: ('GET', f'/events/{event_id(i % events)}', None), requests, concurrency),
+        Scenario('list_events', lambda i: ('GET', '/events?limit=100', None), requests, concurrency),
+        Scenario('list_events_by_status', lambda i: ('GET', '/events?status=active&limit=100', None), requests, concurrency),
+        Scenario('get_all_users', lambda i: ('GET', '/users', None), max(1, requests // 20), 1),
+        Scenario('event_registrations',
+                 lambda i: ('GET', f'/events/{event_id(i % events)}/registrations', None), requests, concurrency),
+        Scenario('user_registrations',
+                 lambda i: ('GET', f'/users/{user_id(i % users)}/registrations', None), requests, concurrency),
+        Scenario('register',
+                 lambda i: ('POST', f'/events/{REGISTER_EVENT_ID}/registrations', {'userId': user_id(i)}),
+                 register_requests, 1),
+        Scenario('registration_storm',
+                 lambda i: ('POST', f'/events/{STORM_EVENT_ID}/registrations', {'userId': user_id(i)}),
+                 storm_requests, storm_concurrency),
+    ]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_scenario(client, scenario: Scenario, calls: environment.CallCounter) -> dict:
+    latencies = []
+    statuses = Counter()
+    semaphore = asyncio.Semaphore(scenario.concurrency)
+
+    async def one(i: int):
+        method, path, body = scenario.request(i)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                statuses[str(response.status_code)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    calls.reset()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(scenario.requests)))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    dynamodb_calls = calls.snapshot()
+    total_calls = sum(dynamodb_calls.values())
+    errors = sum(count for status, count in statuses.items() if not status.startswith(('2', '3')))
+    return {
+        'requests': scenario.requests,
+        'concurrency': scenario.concurrency,
+        'errors': errors,
+        'statusCodes': dict(statuses),
+        'durationSeconds': round(duration, 4),
+        'throughputRps': round(scenario.requests / duration, 2) if duration else None,
+        'latencyMs': {
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(latencies[-1], 3) if latencies else 0.0
+        },
+        'dynamodbCalls': dynamodb_calls,
+        'dynamodbCallsPerRequest': round(total_calls / scenario.requests, 2) if scenario.requests else 0.0
+    }
+
+
+async def run_all(scenarios: List[Scenario], warmup: int, log_level: str = 'WARNING') -> dict:
+    import httpx
+    from main import app
+    # Per-request INFO logs would dominate the in-process numbers
+    logging.getLogger().setLevel(log_level)
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    calls = environment.CallCounter()
+    calls.install()
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for scenario in scenarios:
+            # Warm-up requests hit the same paths but stay out of the numbers
+            if warmup and scenario.request(0)[0] == 'GET':
+                for i in range(warmup):
+                    await client.request(*scenario.request(i)[:2])
+            results[scenario.name] = await run_scenario(client, scenario, calls)
+            summary = results[scenario.name]
+            print(
+                f"{scenario.name:<24} {summary['throughputRps']:>9} req/s  "
+                f"p50 {summary['latencyMs']['p50']:>8} ms  p95 {summary['latencyMs']['p95']:>8} ms  "
+                f"p99 {summary['latencyMs']['p99']:>8} ms  calls/req {summary['dynamodbCallsPerRequest']:>6}  "
+                f"errors {summary['errors']}",
+                file=sys.stderr
+            )
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=('dynamodb', 'sqlite'), default='dynamodb',
+                        help='Storage backend to measure')
+    parser.add_argument('--endpoint-url', help='DynamoDB Local endpoint; moto is used when omitted')
+    parser.add_argument('--derived-views', choices=('inline', 'stream'), default='inline',
+                        help='Where derived views are maintained; the stream consumer is not run while measuring')
+    parser.add_argument('--events', type=int, default=SeedConfig.events)
+    parser.add_argument('--users', type=int, default=SeedConfig.users)
+    parser.add_argument('--registrations-per-event', type=int, default=SeedConfig.registrations_per_event)
+    parser.add_argument('--waitlist-per-event', type=int, default=SeedConfig.waitlist_per_event)
+    parser.add_argument('--storm-capacity', type=int, default=SeedConfig.storm_capacity)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='In-flight requests for read scenarios')
+    parser.add_argument('--storm-concurrency', type=int, default=50,
+                        help='In-flight requests in the registration storm')
+    parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests before each read scenario')
+    parser.add_argument('--scenarios', help='Comma-separated subset of scenarios to run')
+    parser.add_argument('--output', default='bench-report.json', help='Where to write the JSON report')
+    parser.add_argument('--log-level', default='WARNING', help='App log level while measuring')
+    args = parser.parse_args(argv)
+
+    config = SeedConfig(
+        events=args.events,
+        users=args.users,
+        registrations_per_event=args.registrations_per_event,
+        waitlist_per_event=args.waitlist_per_event,
+        storm_capacity=args.storm_capacity
+    )
+    os.environ['DERIVED_VIEWS'] = args.derived_views
+    environment.start(args.endpoint_url, backend=args.backend)
+    if args.backend == 'dynamodb' and not args.endpoint_url and (args.concurrency > 1 or args.storm_concurrency > 1):
+        print("warning: moto is not thread-safe; use --endpoint-url for concurrent results", file=sys.stderr)
+
+    seed_started = time.perf_counter()
+    seed(config, workers=8 if args.endpoint_url else 1)
+    seed_seconds = time.perf_counter() - seed_started
+
+    scenarios = build_scenarios(config, args.requests, args.concurrency, args.storm_concurrency)
+    if args.scenarios:
+        wanted = set(args.scenarios.split(','))
+        unknown = wanted - {scenario.name for scenario in scenarios}
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        scenarios = [scenario for scenario in scenarios if scenario.name in wanted]
+
+    try:
+        results = asyncio.run(run_all(scenarios, args.warmup, args.log_level.upper()))
+    finally:
+        environment.stop()
+
+    report = {
+        'meta': {
+            'createdAt': datetime.utcnow().isoformat(),
+            'gitRevision': git_revision(),
+            'backend': environment.backend_name(),
+            'python': platform.python_version(),
+            'cacheEnabled': os.getenv('CACHE_ENABLED', 'true'),
+            'derivedViews': args.derived_views,
+            'seed': config.as_dict(),
+            'seedSeconds': round(seed_seconds, 3)
+        },
+        'scenarios': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}", file=sys.stderr)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Seed benchmark data straight into storage: BatchWriteItem for DynamoDB, bulk INSERTs for SQLite."""
+import os
+from dataclasses import dataclass, asdict
+from datetime import date, timedelta
+from common import aws
+from common.batch import batch_write
+
+STATUSES = ('active', 'published', 'draft')
+
+
+@dataclass
+class SeedConfig:
+    events: int = 50
+    users: int = 2000
+    registrations_per_event: int = 100
+    waitlist_per_event: int = 20
+    storm_capacity: int = 100
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def event_id(i: int) -> str:
+    return f'bench-event-{i:05d}'
+
+
+def user_id(i: int) -> str:
+    return f'bench-user-{i:06d}'
+
+
+STORM_EVENT_ID = 'bench-storm'
+REGISTER_EVENT_ID = 'bench-register'
+
+
+def seed(config: SeedConfig, workers: int = 1):
+    """Write users, events with registrations and waitlists, and empty registration targets."""
+    # Imported here: environment.start picks the backend after this module loads
+    import storage
+    users, events, registrations = build(config)
+    if storage.is_sqlite():
+        _seed_sqlite(users, events, registrations)
+        return
+    dynamodb = aws.dynamodb
+    _write(dynamodb, os.environ['USERS_TABLE_NAME'], workers, users)
+    _write(dynamodb, os.environ['DYNAMODB_TABLE_NAME'], workers, events)
+    _write(dynamodb, os.environ['REGISTRATIONS_TABLE_NAME'], workers, registrations)
+
+
+def build(config: SeedConfig) -> tuple:
+    """The seed items: (users, events, registrations)."""
+    now = '2024-01-01T00:00:00'
+    users = [
+        {'userId': user_id(i), 'name': f'Benchmark User {i}', 'createdAt': now, 'updatedAt': now}
+        for i in range(config.users)
+    ]
+
+    per_event = min(config.registrations_per_event + config.waitlist_per_event, config.users)
+    registered = min(config.registrations_per_event, per_event)
+    waitlisted = per_event - registered
+    start = date(2025, 1, 1)
+    events = []
+    registrations = []
+    for i in range(config.events):
+        eid = event_id(i)
+        events.append({
+            'eventId': eid,
+            'title': f'Benchmark Event {i}',
+            'description': 'Seeded by the benchmark suite',
+            'date': (start + timedelta(days=i)).isoformat(),
+            'location': 'Benchmark Hall',
+            'capacity': registered,
+            'organizer': 'Benchmarks',
+            'status': STATUSES[i % len(STATUSES)],
+            'waitlistEnabled': True,
+            'highDemand': False,
+            'currentRegistrations': registered,
+            'currentWaitlist': waitlisted
+        })
+        # Rotate the user window so user registrations spread over events
+        offset = (i * per_event) % config.users
+        for n in range(per_event):
+            uid = user_id((offset + n) % config.users)
+            registration = {
+                'registrationId': f'{uid}#{eid}',
+                'eventId': eid,
+                'userId': uid,
+                'status': 'registered' if n < registered else 'waitlisted',
+                'registeredAt': now
+            }
+            if n >= registered:
+                registration['waitlistSeq'] = n
+            registrations.append(registration)
+
+    # Empty targets for the sequential and concurrent registration scenarios
+    for eid, title in ((REGISTER_EVENT_ID, 'Registration Run'), (STORM_EVENT_ID, 'Registration Storm')):
+        events.append({
+            'eventId': eid,
+            'title': title,
+            'description': 'Target of a registration scenario',
+            'date': start.isoformat(),
+            'location': 'Benchmark Hall',
+            'capacity': config.storm_capacity,
+            'organizer': 'Benchmarks',
+            'status': 'active',
+            'waitlistEnabled': True,
+            'highDemand': False,
+            'currentRegistrations': 0,
+            'currentWaitlist': 0
+        })
+
+    return users, events, registrations
+
+
+def _write(dynamodb, table_name: str, workers: int, items):
+    failed = batch_write(dynamodb, table_name, ({'PutRequest': {'Item': item}} for item in items), max_workers=workers)
+    if failed:
+        raise RuntimeError(f"{len(failed)} seed items were not written to {table_name}")
+
+
+def _seed_sqlite(users, events, registrations):
+    import sqlite_db
+
+    def insert(conn, table: str, columns: tuple, items, defaults: dict):
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [tuple(item.get(column, defaults.get(column)) for column in columns) for item in items]
+        )
+
+    with sqlite_db.pool().connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        insert(conn, 'users', sqlite_db.USER_COLUMNS, users, {'version': 1})
+        insert(conn, 'events', sqlite_db.EVENT_COLUMNS, events, {'version': 1})
+        insert(conn, 'registrations', sqlite_db.REGISTRATION_COLUMNS, registrations, {})
+        conn.execute("COMMIT")
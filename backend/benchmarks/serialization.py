@@ -0,0 +1,100 @@
+"""Measure response serialization CPU per item: FastAPI's response_model path vs the fast path.
+
+    cd backend
+    python -m benchmarks.serialization --items 5000 --output serialization.json
+
+No DynamoDB is involved: both paths encode the same synthetic items, shaped
+the way boto3 returns them (numbers as Decimal, internal attributes included).
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from decimal import Decimal
+from typing import Callable, List, Optional
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from common import fastjson
+from models import Event
+
+
+def make_items(count: int) -> List[dict]:
+    return [{
+        'eventId': f'event-{i:06d}',
+        'title': f'Event number {i}',
+        'description': 'A reasonably sized description of the event ' * 4,
+        'date': '2025-06-01',
+        'location': 'Main Hall',
+        'capacity': Decimal(500),
+        'organizer': 'Events Team',
+        'status': 'published',
+        'waitlistEnabled': True,
+        'highDemand': False,
+        'currentRegistrations': Decimal(i % 500),
+        'currentWaitlist': Decimal(0),
+        'version': Decimal(3),
+        'counterShards': Decimal(0)
+    } for i in range(count)]
+
+
+def standard_path(items: List[dict]) -> bytes:
+    """What FastAPI does for response_model=List[Event]: validate, serialize, json.dumps."""
+    field = create_response_field(name='Response_get_all_events', type_=List[Event])
+    content = asyncio.run(serialize_response(field=field, response_content=items, is_coroutine=True))
+    return JSONResponse(content).body
+
+
+def fast_path(items: List[dict]) -> bytes:
+    return fastjson.FastJSONResponse(fastjson.project_many(items, Event)).body
+
+
+def measure(func: Callable[[List[dict]], bytes], items: List[dict], repeat: int) -> dict:
+    func(items)  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        func(items)
+        timings.append(time.process_time() - start)
+    best = min(timings)
+    return {
+        'bestSeconds': round(best, 6),
+        'microsecondsPerItem': round(best / len(items) * 1e6, 3)
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Write the JSON report here as well as to stdout')
+    args = parser.parse_args(argv)
+
+    items = make_items(args.items)
+    # Both paths must agree on the payload before their speed is worth comparing
+    if json.loads(standard_path(items[:50])) != json.loads(fast_path(items[:50])):
+        print("error: fast path output differs from the response_model path", file=sys.stderr)
+        sys.exit(1)
+
+    standard = measure(standard_path, items, args.repeat)
+    fast = measure(fast_path, items, args.repeat)
+    report = {
+        'items': args.items,
+        'encoder': fastjson.ENCODER,
+        'standard': standard,
+        'fast': fast,
+        'microsecondsSavedPerItem': round(standard['microsecondsPerItem'] - fast['microsecondsPerItem'], 3),
+        'speedup': round(standard['bestSeconds'] / fast['bestSeconds'], 2) if fast['bestSeconds'] else None
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Shared, lazily constructed AWS session and DynamoDB handles.
+
+Nothing here touches boto3 at import time. The first data-layer call builds
+one session and one DynamoDB resource that every module shares (its
+low-level client is `dynamodb.meta.client`), so a cold start pays for the
+botocore service model once, and only when a request actually needs it.
+"""
+import os
+import threading
+from typing import Callable
+from common import metrics, startup
+
+# Sized for the async data layer's worker pool; botocore's default of 10 would cap it
+MAX_POOL_CONNECTIONS = int(os.getenv('DYNAMODB_MAX_POOL_CONNECTIONS', '64'))
+
+_lock = threading.Lock()
+_session = None
+_resource = None
+_raw_client = None
+
+
+def dynamodb_config():
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        retries={'max_attempts': 5, 'mode': 'adaptive'}
+    )
+
+
+def session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                with startup.timed('init:boto3_session'):
+                    import boto3
+                    _session = boto3.session.Session()
+    return _session
+
+
+def dynamodb_resource():
+    global _resource
+    if _resource is None:
+        boto_session = session()
+        with _lock:
+            if _resource is None:
+                with startup.timed('init:dynamodb_resource'):
+                    _resource = boto_session.resource('dynamodb', config=dynamodb_config())
+                    metrics.install(_resource.meta.client)
+    return _resource
+
+
+def dynamodb_client():
+    """The shared low-level client (with the resource's Python-type serialization)."""
+    return dynamodb_resource().meta.client
+
+
+def dynamodb_raw_client():
+    """A separate low-level client that speaks raw AttributeValues.
+
+    The resource's client converts Python values on every call; this one
+    does not, so callers encode and decode items themselves (common.codec).
+    """
+    global _raw_client
+    if _raw_client is None:
+        boto_session = session()
+        with _lock:
+            if _raw_client is None:
+                with startup.timed('init:dynamodb_raw_client'):
+                    _raw_client = boto_session.client('dynamodb', config=dynamodb_config())
+                    metrics.install(_raw_client)
+    return _raw_client
+
+
+def lambda_client():
+    """A Lambda client for invoking functions; built on demand, not cached."""
+    return session().client('lambda')
+
+
+def dynamodb_streams_client():
+    """A DynamoDB Streams client for reading change records; built on demand, not cached."""
+    return session().client('dynamodbstreams', config=dynamodb_config())
+
+
+class _Lazy:
+    """Stand-in that builds the real object on first attribute access."""
+
+    def __init__(self, factory: Callable):
+        self._factory = factory
+        self._target = None
+
+    def __getattr__(self, name):
+        target = self._target
+        if target is None:
+            target = self._target = self._factory()
+        return getattr(target, name)
+
+
+dynamodb = _Lazy(dynamodb_resource)
+
+
+def table(name: str):
+    """A DynamoDB Table handle that is only created when first used."""
+    return _Lazy(lambda: dynamodb_resource().Table(name))
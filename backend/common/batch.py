@@ -0,0 +1,111 @@
+"""Helpers for chunked DynamoDB batch operations"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional
+from common import aws, codec, metrics
+
+BATCH_GET_LIMIT = 100
+MAX_BATCH_RETRIES = 8
+BASE_BACKOFF_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 2.0
+
+
+def chunked(items: List, size: int) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def backoff(attempt: int) -> None:
+    """Sleep with capped exponential backoff and full jitter."""
+    delay = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** attempt))
+    time.sleep(random.uniform(0, delay))
+
+
+def batch_get(dynamodb, table_name: str, keys: Iterable[dict],
+              projection: Optional[List[str]] = None, max_workers: int = 1, raw: bool = False) -> List[dict]:
+    """Fetch items by key with BatchGetItem, 100 keys per call.
+
+    With max_workers > 1 the chunks are requested concurrently. Unprocessed
+    keys are retried with backoff; a RuntimeError is raised if DynamoDB
+    still refuses them after MAX_BATCH_RETRIES attempts. With `raw` the
+    reads go through the raw client and common.codec instead of boto3's
+    type conversion.
+    """
+    if raw:
+        client = aws.dynamodb_raw_client()
+        keys = [codec.encode_item(key) for key in keys]
+    else:
+        # The low-level client is thread-safe, unlike the resource object
+        client = dynamodb.meta.client
+    chunks = list(chunked(list(keys), BATCH_GET_LIMIT))
+    if max_workers <= 1 or len(chunks) <= 1:
+        results = [_batch_get_chunk(client, table_name, chunk, projection) for chunk in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            results = list(executor.map(
+                metrics.bind(lambda chunk: _batch_get_chunk(client, table_name, chunk, projection)), chunks
+            ))
+    if raw:
+        return [codec.decode_item(item) for chunk_items in results for item in chunk_items]
+    return [item for chunk_items in results for item in chunk_items]
+
+
+def _batch_get_chunk(client, table_name: str, keys: List[dict],
+                     projection: Optional[List[str]]) -> List[dict]:
+    request = {'Keys': keys}
+    if projection:
+        request['ProjectionExpression'] = ', '.join(f"#p{i}" for i in range(len(projection)))
+        request['ExpressionAttributeNames'] = {f"#p{i}": name for i, name in enumerate(projection)}
+
+    items = []
+    request_items = {table_name: request}
+    attempt = 0
+    while True:
+        response = client.batch_get_item(RequestItems=request_items)
+        items.extend(response.get('Responses', {}).get(table_name, []))
+
+        request_items = response.get('UnprocessedKeys') or {}
+        if not request_items:
+            return items
+        if attempt >= MAX_BATCH_RETRIES:
+            raise RuntimeError(f"BatchGetItem left unprocessed keys on {table_name}")
+        backoff(attempt)
+        attempt += 1
+
+
+BATCH_WRITE_LIMIT = 25
+
+
+def batch_write(dynamodb, table_name: str, requests: Iterable[dict], max_workers: int = 1) -> List[dict]:
+    """Apply PutRequest/DeleteRequest entries with BatchWriteItem, 25 per call.
+
+    With max_workers > 1 the chunks are written concurrently. Unprocessed
+    entries are retried with backoff. Entries DynamoDB still refuses after
+    MAX_BATCH_RETRIES attempts are returned rather than raised, so callers
+    can report them per row.
+    """
+    client = dynamodb.meta.client
+    chunks = list(chunked(list(requests), BATCH_WRITE_LIMIT))
+    if max_workers <= 1 or len(chunks) <= 1:
+        results = [_batch_write_chunk(client, table_name, chunk) for chunk in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            results = list(executor.map(
+                metrics.bind(lambda chunk: _batch_write_chunk(client, table_name, chunk)), chunks
+            ))
+    return [request for failed in results for request in failed]
+
+
+def _batch_write_chunk(client, table_name: str, chunk: List[dict]) -> List[dict]:
+    pending = {table_name: chunk}
+    attempt = 0
+    while True:
+        response = client.batch_write_item(RequestItems=pending)
+        pending = response.get('UnprocessedItems') or {}
+        if not pending:
+            return []
+        if attempt >= MAX_BATCH_RETRIES:
+            return pending.get(table_name, [])
+        backoff(attempt)
+        attempt += 1
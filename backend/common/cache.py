@@ -0,0 +1,99 @@
+"""Process-local read-through cache for hot item lookups.
+
+Warm Lambda containers and long-lived workers keep recently read events and
+users in memory for a short TTL. Writers in this process invalidate entries
+directly; writes from other processes become visible once the TTL expires.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'true').lower() == 'true'
+CACHE_TTL_SECONDS = float(os.getenv('CACHE_TTL_SECONDS', '5'))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, name: str, max_entries: int = CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = CACHE_TTL_SECONDS, enabled: bool = CACHE_ENABLED):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled and max_entries > 0 and ttl_seconds > 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def set(self, key: Hashable, value: Optional[dict]):
+        # Misses are not cached, so an item created elsewhere shows up immediately
+        if not self.enabled or value is None:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Optional[dict]],
+                    consistent: bool = False) -> Optional[dict]:
+        """Serve from the cache, or call `loader` and remember its result.
+
+        `consistent=True` always goes to the loader (which should then do a
+        strongly consistent read) and refreshes the cached copy.
+        """
+        if not consistent:
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+        value = loader()
+        if value is None:
+            self.invalidate(key)
+        else:
+            self.set(key, value)
+        return dict(value) if value is not None else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries)
+            }
+
+
+event_cache = TTLCache('events')
+user_cache = TTLCache('users')
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    return {cache.name: cache.stats() for cache in (event_cache, user_cache)}
@@ -0,0 +1,142 @@
+"""Low-level DynamoDB reads without TypeSerializer/TypeDeserializer.
+
+The resource API runs every attribute of every item through boto3's
+TypeDeserializer and turns each number into a Decimal. For the hot read
+paths, RawTable issues the same calls on a plain low-level client and
+decodes items with a small codec that knows our schema. The dicts it
+returns hold str/int/bool values, ready for the response encoder.
+
+RawTable mirrors the slice of the Table API the readers use (get_item,
+query, scan), so it can stand in for a Table handle wherever only reads
+happen.
+"""
+import os
+from decimal import Decimal
+from typing import Any, Dict, Optional
+from common import aws
+
+LOW_LEVEL_READS = os.getenv('LOW_LEVEL_READS', 'true').lower() == 'true'
+
+# Attribute types of the Event, User and Registration fields, so the common
+# case is one dict lookup per attribute instead of a type dispatch
+_S, _N, _BOOL = 'S', 'N', 'BOOL'
+SCHEMA: Dict[str, str] = {
+    # Events
+    'eventId': _S, 'title': _S, 'description': _S, 'date': _S, 'location': _S,
+    'organizer': _S, 'status': _S, 'capacity': _N, 'currentRegistrations': _N,
+    'currentWaitlist': _N, 'waitlistEnabled': _BOOL, 'highDemand': _BOOL,
+    'counterShards': _N, 'version': _N, 'rosterChunks': _N,
+    # Users
+    'userId': _S, 'name': _S, 'createdAt': _S, 'updatedAt': _S,
+    # Registrations
+    'registrationId': _S, 'registeredAt': _S, 'waitlistSeq': _N, 'position': _N,
+    # Roster chunks
+    'chunk': _N
+}
+
+
+def _number(raw: str):
+    try:
+        return int(raw)
+    except ValueError:
+        return float(raw)
+
+
+def decode(value: dict) -> Any:
+    """Decode one AttributeValue of any type."""
+    if 'S' in value:
+        return value['S']
+    if 'N' in value:
+        return _number(value['N'])
+    if 'BOOL' in value:
+        return value['BOOL']
+    if 'NULL' in value:
+        return None
+    if 'M' in value:
+        return decode_item(value['M'])
+    if 'L' in value:
+        return [decode(v) for v in value['L']]
+    if 'SS' in value:
+        return set(value['SS'])
+    if 'NS' in value:
+        return {_number(n) for n in value['NS']}
+    if 'B' in value:
+        return value['B']
+    if 'BS' in value:
+        return set(value['BS'])
+    raise ValueError(f"Unsupported DynamoDB attribute value: {sorted(value)}")
+
+
+def decode_item(item: Optional[dict]) -> Optional[dict]:
+    if item is None:
+        return None
+    out = {}
+    for name, value in item.items():
+        kind = SCHEMA.get(name)
+        if kind is not None and kind in value:
+            raw = value[kind]
+            out[name] = _number(raw) if kind == _N else raw
+        else:
+            out[name] = decode(value)
+    return out
+
+
+def encode(value: Any) -> dict:
+    """Encode a Python value as an AttributeValue (keys and expression values)."""
+    if isinstance(value, str):
+        return {'S': value}
+    # bool before int: True is an int too
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, (int, float, Decimal)):
+        return {'N': str(value)}
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, dict):
+        return {'M': encode_item(value)}
+    if isinstance(value, (list, tuple)):
+        return {'L': [encode(v) for v in value]}
+    if isinstance(value, bytes):
+        return {'B': value}
+    raise TypeError(f"Cannot encode {type(value).__name__} as a DynamoDB attribute")
+
+
+def encode_item(item: Optional[dict]) -> Optional[dict]:
+    if item is None:
+        return None
+    return {name: encode(value) for name, value in item.items()}
+
+
+class RawTable:
+    """Read-only, Table-shaped handle on the low-level client."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _call(self, operation: str, params: dict) -> dict:
+        params = dict(params, TableName=self.name)
+        for key in ('Key', 'ExclusiveStartKey', 'ExpressionAttributeValues'):
+            if key in params:
+                params[key] = encode_item(params[key])
+        response = getattr(aws.dynamodb_raw_client(), operation)(**params)
+        if 'Item' in response:
+            response['Item'] = decode_item(response['Item'])
+        if 'Items' in response:
+            response['Items'] = [decode_item(item) for item in response['Items']]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = decode_item(response['LastEvaluatedKey'])
+        return response
+
+    def get_item(self, **params) -> dict:
+        return self._call('get_item', params)
+
+    def query(self, **params) -> dict:
+        return self._call('query', params)
+
+    def scan(self, **params) -> dict:
+        return self._call('scan', params)
+
+
+def reader(name: str, table):
+    """The handle hot reads should use for `name`: a RawTable unless LOW_LEVEL_READS is off."""
+    return RawTable(name) if LOW_LEVEL_READS else table
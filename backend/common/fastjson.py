@@ -0,0 +1,97 @@
+"""Fast-path JSON responses for read endpoints.
+
+Items read from DynamoDB were validated when they were written, so read
+handlers can skip response_model re-validation and jsonable_encoder. With
+FAST_JSON_RESPONSES=true they project each item onto the response model's
+public fields (filling defaults, dropping internal attributes) and encode
+it in one pass, with orjson when it is installed.
+"""
+import json
+import os
+import typing
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional, Tuple, Type
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+FAST_JSON_ENABLED = os.getenv('FAST_JSON_RESPONSES', 'false').lower() == 'true'
+ENCODER = 'orjson' if orjson is not None else 'json'
+
+
+def _default(value: Any):
+    # boto3 hands back every number as Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class FastJSONResponse(Response):
+    media_type = 'application/json'
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+@lru_cache(maxsize=None)
+def _plan(model: Type[BaseModel]) -> Tuple[Tuple[str, bool, Any, Optional[type]], ...]:
+    """(name, required, default, nested model) for each field, worked out once per model."""
+    plan = []
+    for name, field in model.model_fields.items():
+        nested = _nested_model(field.annotation)
+        default = None if field.is_required() else field.get_default(call_default_factory=True)
+        plan.append((name, field.is_required(), default, nested))
+    return tuple(plan)
+
+
+def _nested_model(annotation) -> Optional[type]:
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in typing.get_args(annotation):
+        nested = _nested_model(arg)
+        if nested is not None:
+            return nested
+    return None
+
+
+def project(item: dict, model: Type[BaseModel]) -> dict:
+    """The public shape of `item` under `model`, without validating it."""
+    plan = _plan(model)
+    if not _has_nested(model):
+        return {name: item.get(name, default) for name, _, default, _ in plan}
+
+    out = {}
+    for name, required, default, nested in plan:
+        if name in item:
+            value = item[name]
+            if nested is not None and value is not None:
+                value = [project(v, nested) for v in value] if isinstance(value, list) else project(value, nested)
+            out[name] = value
+        elif not required:
+            out[name] = default
+    return out
+
+
+@lru_cache(maxsize=None)
+def _has_nested(model: Type[BaseModel]) -> bool:
+    return any(nested is not None for _, _, _, nested in _plan(model))
+
+
+def project_many(items: Iterable[dict], model: Type[BaseModel]) -> List[dict]:
+    if _has_nested(model):
+        return [project(item, model) for item in items]
+    fields = [(name, default) for name, _, default, _ in _plan(model)]
+    return [{name: item.get(name, default) for name, default in fields} for item in items]
@@ -0,0 +1,251 @@
+"""Per-request DynamoDB accounting and latency breakdown.
+
+botocore hooks on the shared client count calls by operation, time them and
+total the ReturnConsumedCapacity they report, into the metrics of whichever
+request is current. The middleware emits each request's numbers as a
+structured log line and a Server-Timing header, and folds them into
+per-route totals rendered in Prometheus text format.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_ENDPOINT_ENABLED = os.getenv('METRICS_ENDPOINT_ENABLED', 'false').lower() == 'true'
+
+# Operations that accept ReturnConsumedCapacity
+CAPACITY_OPERATIONS = {
+    'GetItem', 'PutItem', 'UpdateItem', 'DeleteItem', 'Query', 'Scan',
+    'BatchGetItem', 'BatchWriteItem', 'TransactGetItems', 'TransactWriteItems'
+}
+
+
+class RequestMetrics:
+    """DynamoDB work and timings attributed to one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.calls = Counter()
+        self.capacity: Dict[str, float] = defaultdict(float)
+        self.dynamodb_ms = 0.0
+        self.data_layer_ms = 0.0
+        self._active = 0
+        self._active_since = 0.0
+        self._lock = threading.Lock()
+
+    def record_call(self, operation: str, duration_ms: float, consumed) -> None:
+        with self._lock:
+            self.calls[operation] += 1
+            self.dynamodb_ms += duration_ms
+            for entry in consumed:
+                self.capacity[entry.get('TableName', 'unknown')] += float(entry.get('CapacityUnits', 0))
+
+    def enter_data_layer(self):
+        # Overlapping data-layer calls (asyncio.gather) count once, as wall time
+        with self._lock:
+            if self._active == 0:
+                self._active_since = time.perf_counter()
+            self._active += 1
+
+    def exit_data_layer(self):
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                self.data_layer_ms += (time.perf_counter() - self._active_since) * 1000
+
+    def summary(self) -> dict:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        with self._lock:
+            return {
+                'totalMs': round(total_ms, 2),
+                'dataLayerMs': round(self.data_layer_ms, 2),
+                # Routing, validation and response serialization
+                'appMs': round(max(0.0, total_ms - self.data_layer_ms), 2),
+                'dynamodbMs': round(self.dynamodb_ms, 2),
+                'dynamodbCalls': dict(self.calls),
+                'consumedCapacity': {table: round(units, 2) for table, units in self.capacity.items()}
+            }
+
+
+_current: contextvars.ContextVar[Optional[RequestMetrics]] = contextvars.ContextVar('request_metrics', default=None)
+
+
+def current() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+def bind(func: Callable) -> Callable:
+    """Wrap `func` so DynamoDB calls it makes on another thread count toward this request."""
+    metrics = _current.get()
+    if metrics is None:
+        return func
+
+    def bound(*args, **kwargs):
+        token = _current.set(metrics)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return bound
+
+
+@contextmanager
+def data_layer():
+    """Mark a stretch of time spent waiting on the data layer."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    metrics.enter_data_layer()
+    try:
+        yield
+    finally:
+        metrics.exit_data_layer()
+
+
+# botocore hooks
+def install(client):
+    """Register the accounting hooks on a DynamoDB client."""
+    if not METRICS_ENABLED:
+        return
+    events = client.meta.events
+    events.register('before-parameter-build.dynamodb', _request_capacity)
+    events.register('before-call.dynamodb', _start_call)
+    events.register('after-call.dynamodb', _finish_call)
+
+
+def _request_capacity(params, model, **kwargs):
+    if _current.get() is not None and model.name in CAPACITY_OPERATIONS:
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+
+def _start_call(context, **kwargs):
+    context['metrics_started'] = time.perf_counter()
+
+
+def _finish_call(parsed, model, context, **kwargs):
+    metrics = _current.get()
+    started = context.get('metrics_started')
+    if metrics is None or started is None:
+        return
+    consumed = parsed.get('ConsumedCapacity') or []
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    metrics.record_call(model.name, (time.perf_counter() - started) * 1000, consumed)
+
+
+# Per-route totals for /metrics
+_totals_lock = threading.Lock()
+_requests = Counter()
+_latency_sum = defaultdict(float)
+_data_layer_sum = defaultdict(float)
+_calls = Counter()
+_capacity = defaultdict(float)
+
+
+def _record_totals(method: str, route: str, status_code: int, summary: dict):
+    with _totals_lock:
+        _requests[(method, route, str(status_code))] += 1
+        _latency_sum[(method, route)] += summary['totalMs'] / 1000
+        _data_layer_sum[(method, route)] += summary['dataLayerMs'] / 1000
+        for operation, count in summary['dynamodbCalls'].items():
+            _calls[(method, route, operation)] += count
+        for table, units in summary['consumedCapacity'].items():
+            _capacity[(method, route, table)] += units
+
+
+def _labels(**labels) -> str:
+    escaped = {k: str(v).replace('\\', '\\\\').replace('"', '\\"') for k, v in labels.items()}
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped.items()) + '}'
+
+
+def render_prometheus() -> str:
+    lines = []
+    with _totals_lock:
+        lines += ['# HELP events_api_requests_total Requests served.', '# TYPE events_api_requests_total counter']
+        lines += [f'events_api_requests_total{_labels(method=m, route=r, status=s)} {n}'
+                  for (m, r, s), n in sorted(_requests.items())]
+        lines += ['# HELP events_api_request_seconds_sum Total request time.',
+                  '# TYPE events_api_request_seconds_sum counter']
+        lines += [f'events_api_request_seconds_sum{_labels(method=m, route=r)} {v:.6f}'
+                  for (m, r), v in sorted(_latency_sum.items())]
+        lines += ['# HELP events_api_data_layer_seconds_sum Time spent waiting on the data layer.',
+                  '# TYPE events_api_data_layer_seconds_sum counter']
+        lines += [f'events_api_data_layer_seconds_sum{_labels(method=m, route=r)} {v:.6f}'
+                  for (m, r), v in sorted(_data_layer_sum.items())]
+        lines += ['# HELP events_api_dynamodb_calls_total DynamoDB API calls.',
+                  '# TYPE events_api_dynamodb_calls_total counter']
+        lines += [f'events_api_dynamodb_calls_total{_labels(method=m, route=r, operation=o)} {n}'
+                  for (m, r, o), n in sorted(_calls.items())]
+        lines += ['# HELP events_api_dynamodb_capacity_units_total Consumed capacity units.',
+                  '# TYPE events_api_dynamodb_capacity_units_total counter']
+        lines += [f'events_api_dynamodb_capacity_units_total{_labels(method=m, route=r, table=t)} {v:.2f}'
+                  for (m, r, t), v in sorted(_capacity.items())]
+    return '\n'.join(lines) + '\n'
+
+
+def server_timing(summary: dict) -> str:
+    calls = sum(summary['dynamodbCalls'].values())
+    return (
+        f'db;dur={summary["dataLayerMs"]};desc="{calls} DynamoDB calls", '
+        f'app;dur={summary["appMs"]}, '
+        f'total;dur={summary["totalMs"]}'
+    )
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware that scopes metrics to each HTTP request and reports them."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                headers = list(message.get('headers', []))
+                headers.append((b'server-timing', server_timing(metrics.summary()).encode()))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = _route_template(scope)
+            summary = metrics.summary()
+            _record_totals(scope['method'], route, status_code, summary)
+            logger.info(json.dumps({'request': {
+                'method': scope['method'],
+                'path': scope['path'],
+                'route': route,
+                'status': status_code,
+                **summary
+            }}))
+
+
+def _route_template(scope) -> str:
+    # Label by route template, not raw path, to keep /metrics cardinality bounded
+    from starlette.routing import Match
+    for route in scope['app'].routes if 'app' in scope else []:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, 'path', scope['path'])
+    return 'unmatched'
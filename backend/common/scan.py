@@ -0,0 +1,88 @@
+"""Paginated, optionally parallel table scans with bounded memory"""
+import os
+import queue
+import threading
+from typing import Iterator, List, Optional
+from common import metrics
+
+MAX_SEGMENTS = 32
+# Parallelism for full-table listings; 1 keeps the scan serial
+DEFAULT_SEGMENTS = max(1, min(int(os.getenv('SCAN_SEGMENTS', '4')), MAX_SEGMENTS))
+
+_DONE = object()
+
+
+def scan_pages(table, segments: int = 1, page_size: Optional[int] = None,
+               projection: Optional[List[str]] = None, **scan_params) -> Iterator[list]:
+    """Yield pages of items until every segment has been read to the end.
+
+    With segments > 1, each segment is scanned by its own thread and pages
+    are handed over through a small bounded queue, so memory stays at a few
+    pages no matter how large the table is. `projection` limits the
+    attributes read, which also cuts the read capacity a scan consumes.
+    """
+    segments = max(1, min(segments, MAX_SEGMENTS))
+    if page_size:
+        scan_params['Limit'] = page_size
+    if projection:
+        names = dict(scan_params.get('ExpressionAttributeNames') or {})
+        names.update({f"#p{i}": name for i, name in enumerate(projection)})
+        scan_params['ProjectionExpression'] = ', '.join(f"#p{i}" for i in range(len(projection)))
+        scan_params['ExpressionAttributeNames'] = names
+    if segments == 1:
+        yield from _segment_pages(table, scan_params)
+        return
+
+    pages: "queue.Queue" = queue.Queue(maxsize=segments * 2)
+    stop = threading.Event()
+
+    def worker(segment: int):
+        try:
+            params = {**scan_params, 'Segment': segment, 'TotalSegments': segments}
+            for page in _segment_pages(table, params):
+                if stop.is_set():
+                    return
+                pages.put(page)
+        except Exception as e:
+            pages.put(e)
+        finally:
+            pages.put(_DONE)
+
+    worker = metrics.bind(worker)
+    threads = [threading.Thread(target=worker, args=(segment,), daemon=True) for segment in range(segments)]
+    for thread in threads:
+        thread.start()
+
+    finished = 0
+    try:
+        while finished < segments:
+            page = pages.get()
+            if page is _DONE:
+                finished += 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield page
+    finally:
+        # Unblock workers if the consumer stopped early
+        stop.set()
+        while finished < segments:
+            if pages.get() is _DONE:
+                finished += 1
+
+
+def scan_items(table, segments: int = 1, page_size: Optional[int] = None,
+               projection: Optional[List[str]] = None, **scan_params) -> Iterator[dict]:
+    """Stream individual items from `scan_pages`."""
+    for page in scan_pages(table, segments, page_size, projection, **scan_params):
+        yield from page
+
+
+def _segment_pages(table, params: dict) -> Iterator[list]:
+    params = dict(params)
+    while True:
+        response = table.scan(**params)
+        yield response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
@@ -0,0 +1,70 @@
+"""Cold-start timing: module imports, lazy initialisation and the budget they share.
+
+Run `python -m common.startup` from the backend directory to print the report
+for a fresh interpreter, e.g. to compare branches.
+"""
+import importlib
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+COLD_START_BUDGET_MS = float(os.getenv('COLD_START_BUDGET_MS', '1000'))
+
+_started = time.perf_counter()
+_phases: Dict[str, float] = {}
+reported = False
+
+
+@contextmanager
+def timed(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases[phase] = _phases.get(phase, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def import_timed(*module_names: str):
+    """Import modules in order, recording each one's incremental import time."""
+    for name in module_names:
+        with timed(f'import:{name}'):
+            importlib.import_module(name)
+
+
+def report() -> dict:
+    total = sum(_phases.values())
+    return {
+        'phases': {phase: round(ms, 2) for phase, ms in _phases.items()},
+        'totalMs': round(total, 2),
+        'sinceProcessStartMs': round((time.perf_counter() - _started) * 1000, 2),
+        'budgetMs': COLD_START_BUDGET_MS,
+        'overBudget': total > COLD_START_BUDGET_MS
+    }
+
+
+def log_report():
+    """Log the cold-start report once per process, as a single JSON line."""
+    global reported
+    if reported:
+        return
+    reported = True
+    data = report()
+    message = json.dumps({'coldStart': data})
+    if data['overBudget']:
+        logger.warning(message)
+    else:
+        logger.info(message)
+
+
+if __name__ == '__main__':
+    # Import through the package so the phases land in the module the app records into
+    from common import startup as tracked
+    from common import aws
+    import lambda_handler  # noqa: F401
+    aws.dynamodb_resource()
+    print(json.dumps(tracked.report(), indent=2))
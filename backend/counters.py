@@ -0,0 +1,546 @@
+"""Registration counters for events, optionally sharded for high-demand events.
+
+Ordinary events keep currentRegistrations/currentWaitlist on the event item.
+Events flagged highDemand spread them over `counterShards` items in the
+counters table instead, each owning a slice of the event's capacity, so a
+ticket drop is not capped by the write throughput of a single item.
+
+Adjustments outside the registration transactions (releases and waitlist
+changes) can be buffered per event for COUNTER_FLUSH_INTERVAL seconds and
+written as one update. Whenever a write gives seats back, the waitlist is
+promoted onto them, so a buffered release never leaves a seat empty
+behind a waiting user. Registrations stay the source of truth:
+`reconcile` recounts them and corrects any drift in the counters.
+"""
+from botocore.exceptions import ClientError
+import atexit
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from common import aws
+from common.batch import backoff
+from common.cache import event_cache
+
+logger = logging.getLogger(__name__)
+
+dynamodb = aws.dynamodb
+events_table_name = os.getenv('DYNAMODB_TABLE_NAME', 'Events')
+counters_table_name = os.getenv('COUNTERS_TABLE_NAME', 'EventCounters')
+registrations_table_name = os.getenv('REGISTRATIONS_TABLE_NAME', 'Registrations')
+
+events_table = aws.table(events_table_name)
+counters_table = aws.table(counters_table_name)
+registrations_table = aws.table(registrations_table_name)
+
+DEFAULT_SHARDS = int(os.getenv('COUNTER_SHARDS', '10'))
+MAX_ADJUST_ATTEMPTS = 5
+# Seconds counter adjustments are held to coalesce them; 0 writes each one through
+COUNTER_FLUSH_INTERVAL = float(os.getenv('COUNTER_FLUSH_INTERVAL', '0'))
+
+# Events this process has seen in sharded mode, so writers go straight to the shards
+_known_shards: Dict[str, int] = {}
+_known_lock = threading.Lock()
+
+
+class ShardingChanged(Exception):
+    """The event switched between single-item and sharded counters mid-operation."""
+
+
+def known_shards(event_id: str) -> Optional[int]:
+    return _known_shards.get(event_id)
+
+
+def remember(event_id: str, shards: Optional[int]):
+    event_cache.invalidate(event_id)
+    with _known_lock:
+        if shards:
+            _known_shards[event_id] = int(shards)
+        else:
+            _known_shards.pop(event_id, None)
+
+
+def shard_key(event_id: str, shard: int) -> dict:
+    return {'eventId': event_id, 'shard': shard}
+
+
+def shard_order(shards: int) -> List[int]:
+    order = list(range(shards))
+    random.shuffle(order)
+    return order
+
+
+def allocate(capacity: int, used: List[int]) -> List[int]:
+    """Per-shard capacities summing to `capacity`, never below a shard's current use.
+
+    Spare seats are spread as evenly as possible so concurrent writers
+    picking random shards rarely collide on the last few seats.
+    """
+    spare = max(0, capacity - sum(used))
+    base, extra = divmod(spare, len(used))
+    return [count + base + (1 if i < extra else 0) for i, count in enumerate(used)]
+
+
+def load_shards(event_id: str) -> List[dict]:
+    response = counters_table.query(
+        KeyConditionExpression='eventId = :eid',
+        ExpressionAttributeValues={':eid': event_id},
+        ConsistentRead=True
+    )
+    return sorted(response.get('Items', []), key=lambda item: item['shard'])
+
+
+def aggregate(event_id: str) -> Tuple[int, int]:
+    """Total (registrations, waitlist) across an event's shards."""
+    shards = load_shards(event_id)
+    return (
+        sum(int(item.get('registrations', 0)) for item in shards),
+        sum(int(item.get('waitlist', 0)) for item in shards)
+    )
+
+
+def apply_aggregate(event: Optional[dict]) -> Optional[dict]:
+    """Replace the event item's counters with the shard totals, if it is sharded."""
+    if not event or not event.get('counterShards'):
+        return event
+    registrations, waitlist = aggregate(event['eventId'])
+    return {**event, 'currentRegistrations': registrations, 'currentWaitlist': waitlist}
+
+
+def enable_sharding(event_id: str, shards: int = DEFAULT_SHARDS):
+    """Move an event's counters onto shards.
+
+    The shards are seeded from a snapshot of the event item, and the flag
+    only flips if the counters did not move since; otherwise it retries.
+    """
+    flush(event_id)
+    for attempt in range(MAX_ADJUST_ATTEMPTS):
+        event = events_table.get_item(Key={'eventId': event_id}, ConsistentRead=True).get('Item')
+        if not event:
+            raise ValueError("Event not found")
+        if event.get('counterShards'):
+            remember(event_id, event['counterShards'])
+            return
+
+        registrations = int(event.get('currentRegistrations', 0))
+        waitlist = int(event.get('currentWaitlist', 0))
+        count = max(1, min(shards, int(event.get('capacity', 1))))
+        used = [registrations] + [0] * (count - 1)
+        capacities = allocate(int(event.get('capacity', 0)), used)
+
+        with counters_table.batch_writer() as batch:
+            for shard, shard_capacity in enumerate(capacities):
+                batch.put_item(Item={
+                    **shard_key(event_id, shard),
+                    'capacity': shard_capacity,
+                    'registrations': used[shard],
+                    'waitlist': waitlist if shard == 0 else 0
+                })
+
+        try:
+            events_table.update_item(
+                Key={'eventId': event_id},
+                UpdateExpression='SET counterShards = :shards ADD version :one',
+                ConditionExpression='currentRegistrations = :reg AND currentWaitlist = :wait',
+                ExpressionAttributeValues={':shards': count, ':reg': registrations, ':wait': waitlist, ':one': 1}
+            )
+            remember(event_id, count)
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            backoff(attempt)
+
+    raise RuntimeError(f"Could not enable sharded counters for event {event_id}")
+
+
+def disable_sharding(event_id: str):
+    """Fold the shard totals back onto the event item and drop the shards."""
+    flush(event_id)
+    registrations, waitlist = aggregate(event_id)
+    events_table.update_item(
+        Key={'eventId': event_id},
+        UpdateExpression='SET currentRegistrations = :reg, currentWaitlist = :wait REMOVE counterShards ADD version :one',
+        ExpressionAttributeValues={':reg': registrations, ':wait': waitlist, ':one': 1}
+    )
+    remember(event_id, None)
+    delete_shards(event_id)
+
+
+def delete_shards(event_id: str):
+    shards = load_shards(event_id)
+    with counters_table.batch_writer() as batch:
+        for item in shards:
+            batch.delete_item(Key=shard_key(event_id, item['shard']))
+    remember(event_id, None)
+
+
+def rebalance(event_id: str, capacity: int):
+    """Re-split a new event capacity across the existing shards."""
+    for attempt in range(MAX_ADJUST_ATTEMPTS):
+        shards = load_shards(event_id)
+        if not shards:
+            return
+        used = [int(item.get('registrations', 0)) for item in shards]
+        capacities = allocate(capacity, used)
+        event_cache.invalidate(event_id)
+        try:
+            for item, shard_capacity, count in zip(shards, capacities, used):
+                counters_table.update_item(
+                    Key=shard_key(event_id, item['shard']),
+                    UpdateExpression='SET #capacity = :capacity',
+                    ConditionExpression='registrations = :seen',
+                    ExpressionAttributeNames={'#capacity': 'capacity'},
+                    ExpressionAttributeValues={':capacity': shard_capacity, ':seen': count}
+                )
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            backoff(attempt)
+
+    raise RuntimeError(f"Could not rebalance counter shards for event {event_id}")
+
+
+def find_open_shard(event_id: str) -> Optional[int]:
+    """A random shard that still has unallocated seats, or None if the event is full."""
+    open_shards = [
+        item['shard'] for item in load_shards(event_id)
+        if int(item.get('registrations', 0)) < int(item.get('capacity', 0))
+    ]
+    return int(random.choice(open_shards)) if open_shards else None
+
+
+def reserve_seats(event_id: str, wanted: int) -> int:
+    """Claim up to `wanted` seats across an event's shards, returning how many were claimed.
+
+    Each shard gives up all its free seats in one conditional update, so a
+    group costs one write per shard touched rather than one per seat.
+    """
+    claimed = 0
+    event_cache.invalidate(event_id)
+    for attempt in range(MAX_ADJUST_ATTEMPTS):
+        shards = load_shards(event_id)
+        if not shards:
+            remember(event_id, None)
+            raise ShardingChanged()
+        random.shuffle(shards)
+        contended = False
+        for item in shards:
+            used = int(item.get('registrations', 0))
+            take = min(int(item.get('capacity', 0)) - used, wanted - claimed)
+            if take <= 0:
+                continue
+            try:
+                counters_table.update_item(
+                    Key=shard_key(event_id, item['shard']),
+                    UpdateExpression='SET registrations = registrations + :take',
+                    ConditionExpression='registrations = :seen AND #capacity = :capacity',
+                    ExpressionAttributeNames={'#capacity': 'capacity'},
+                    ExpressionAttributeValues={':take': take, ':seen': used, ':capacity': item['capacity']}
+                )
+                claimed += take
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                contended = True
+            if claimed == wanted:
+                return claimed
+        if not contended:
+            return claimed
+        backoff(attempt)
+    return claimed
+
+
+def seat_update(event_id: str, shard: int) -> dict:
+    """TransactWriteItems Update that claims one seat on a shard while it has room."""
+    return {
+        'TableName': counters_table_name,
+        'Key': shard_key(event_id, shard),
+        'UpdateExpression': 'SET registrations = registrations + :inc',
+        'ConditionExpression': 'registrations < #capacity',
+        'ExpressionAttributeNames': {'#capacity': 'capacity'},
+        'ExpressionAttributeValues': {':inc': 1}
+    }
+
+
+def waitlist_update(event_id: str, shard: int) -> dict:
+    """TransactWriteItems Update that counts one more waitlisted user on a shard."""
+    return {
+        'TableName': counters_table_name,
+        'Key': shard_key(event_id, shard),
+        'UpdateExpression': 'SET waitlist = waitlist + :inc',
+        'ConditionExpression': 'attribute_exists(eventId)',
+        'ExpressionAttributeValues': {':inc': 1}
+    }
+
+
+# Buffered deltas per event: [registrations, waitlist]
+_pending: Dict[str, List[int]] = {}
+_pending_lock = threading.Lock()
+_flusher: Optional[threading.Thread] = None
+
+
+def adjust(event_id: str, registrations: int = 0, waitlist: int = 0):
+    """Adjust an event's counters, coalescing with other pending deltas when buffering is on.
+
+    Only deltas that leave the buffered registrations change at or below
+    zero wait: a net increase is written at once together with what was
+    pending, so a buffer never holds back seats that are taken, only seats
+    that were freed. Those are filled from the waitlist once written.
+    """
+    if not registrations and not waitlist:
+        return
+    if COUNTER_FLUSH_INTERVAL <= 0:
+        apply(event_id, registrations, waitlist)
+        return
+
+    with _pending_lock:
+        pending = _pending.setdefault(event_id, [0, 0])
+        pending[0] += registrations
+        pending[1] += waitlist
+        due = _pending.pop(event_id) if pending[0] > 0 else None
+        if due is None:
+            _start_flusher()
+    if due:
+        apply(event_id, *due)
+
+
+def flush(event_id: Optional[str] = None):
+    """Write out buffered deltas, for one event or for all of them."""
+    with _pending_lock:
+        if event_id is None:
+            due = list(_pending.items())
+            _pending.clear()
+        else:
+            due = [(event_id, _pending.pop(event_id))] if event_id in _pending else []
+
+    for pending_id, (registrations, waitlist) in due:
+        try:
+            apply(pending_id, registrations, waitlist)
+        except (ClientError, RuntimeError) as e:
+            logger.warning(f"Flushing counters of event {pending_id} failed, keeping them buffered: {e}")
+            with _pending_lock:
+                pending = _pending.setdefault(pending_id, [0, 0])
+                pending[0] += registrations
+                pending[1] += waitlist
+
+
+def _start_flusher():
+    # Called with _pending_lock held
+    global _flusher
+    if _flusher is None or not _flusher.is_alive():
+        _flusher = threading.Thread(target=_flush_loop, name='counter-flush', daemon=True)
+        _flusher.start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(COUNTER_FLUSH_INTERVAL)
+        flush()
+
+
+atexit.register(flush)
+
+
+def apply(event_id: str, registrations: int = 0, waitlist: int = 0):
+    """Write counter deltas to whichever representation the event uses.
+
+    Seats a negative registrations delta gives back go to the waitlist.
+    """
+    if not registrations and not waitlist:
+        return
+
+    event_cache.invalidate(event_id)
+    for attempt in range(MAX_ADJUST_ATTEMPTS):
+        shards = known_shards(event_id)
+        try:
+            if shards:
+                _adjust_shards(event_id, shards, registrations, waitlist)
+            else:
+                _adjust_event(event_id, registrations, waitlist)
+            break
+        except ShardingChanged:
+            backoff(attempt)
+    else:
+        raise RuntimeError(f"Counters for event {event_id} kept changing representation")
+
+    if registrations < 0:
+        _promote(event_id, -registrations)
+
+
+def _promote(event_id: str, seats: int):
+    # registration_db imports this module
+    import registration_db
+    try:
+        for _ in range(seats):
+            if not registration_db.promote_from_waitlist(event_id):
+                return
+    except (ClientError, RuntimeError) as e:
+        # The release itself is written; the next one (or a reconcile) promotes again
+        logger.warning(f"Promoting the waitlist of event {event_id} failed: {e}")
+
+
+def _adjust_event(event_id: str, registrations: int, waitlist: int):
+    assignments = []
+    values = {':one': 1}
+    if registrations:
+        assignments.append('currentRegistrations = currentRegistrations + :reg')
+        values[':reg'] = registrations
+    if waitlist:
+        assignments.append('currentWaitlist = currentWaitlist + :wait')
+        values[':wait'] = waitlist
+
+    try:
+        events_table.update_item(
+            Key={'eventId': event_id},
+            UpdateExpression='SET ' + ', '.join(assignments) + ' ADD version :one',
+            ConditionExpression='attribute_exists(eventId) AND attribute_not_exists(counterShards)',
+            ExpressionAttributeValues=values,
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        event = old_image(e.response)
+        if event and event.get('counterShards'):
+            remember(event_id, event['counterShards'])
+            raise ShardingChanged()
+        # The event is gone; there is nothing left to count
+
+
+def _adjust_shards(event_id: str, shards: int, registrations: int, waitlist: int):
+    # Increments can land anywhere; decrements need a shard that holds enough to give back
+    conditions = []
+    values = {}
+    assignments = []
+    for name, delta in (('registrations', registrations), ('waitlist', waitlist)):
+        if not delta:
+            continue
+        assignments.append(f'{name} = {name} + :{name}')
+        values[f':{name}'] = delta
+        if delta < 0:
+            conditions.append(f'{name} >= :{name}_needed')
+            values[f':{name}_needed'] = -delta
+
+    base_condition = 'attribute_exists(eventId)'
+    for shard in shard_order(shards):
+        try:
+            counters_table.update_item(
+                Key=shard_key(event_id, shard),
+                UpdateExpression='SET ' + ', '.join(assignments),
+                ConditionExpression=' AND '.join([base_condition, *conditions]),
+                ExpressionAttributeValues=values,
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            if old_image(e.response) is None:
+                # Shards were dropped: the event went back to single-item counters
+                remember(event_id, None)
+                raise ShardingChanged()
+
+    # No single shard can absorb the whole decrement; split it across shards
+    _spread(event_id, shards, registrations, waitlist)
+
+
+def _spread(event_id: str, shards: int, registrations: int, waitlist: int):
+    increments = {name: delta for name, delta in (('registrations', registrations), ('waitlist', waitlist)) if delta > 0}
+    if increments:
+        counters_table.update_item(
+            Key=shard_key(event_id, shard_order(shards)[0]),
+            UpdateExpression='SET ' + ', '.join(f'{name} = {name} + :{name}' for name in increments),
+            ExpressionAttributeValues={f':{name}': delta for name, delta in increments.items()}
+        )
+
+    remaining = {'registrations': max(0, -registrations), 'waitlist': max(0, -waitlist)}
+    for item in load_shards(event_id):
+        taken = {name: min(amount, int(item.get(name, 0))) for name, amount in remaining.items()}
+        if not any(taken.values()):
+            continue
+        counters_table.update_item(
+            Key=shard_key(event_id, item['shard']),
+            UpdateExpression='SET registrations = registrations - :reg, waitlist = waitlist - :wait',
+            ExpressionAttributeValues={':reg': taken['registrations'], ':wait': taken['waitlist']}
+        )
+        remaining = {name: amount - taken[name] for name, amount in remaining.items()}
+
+
+def reconcile(event_id: str, progress: Optional[Callable[[int, int], None]] = None) -> bool:
+    """Recount an event's registrations and correct its counters to match.
+
+    Counters drift when an adjustment is lost, e.g. a buffered delta in a
+    Lambda container that was recycled, or a release interrupted between
+    deleting the registration and decrementing the count. The stored
+    counters are read before and after counting, and the difference is
+    applied only if they did not move in between; otherwise it counts again.
+    """
+    flush(event_id)
+    for attempt in range(MAX_ADJUST_ATTEMPTS):
+        before = _stored_counts(event_id)
+        if before is None:
+            return True
+        counted = _count_registrations(event_id)
+        if _stored_counts(event_id) != before:
+            backoff(attempt)
+            continue
+
+        registrations, waitlist = counted[0] - before[0], counted[1] - before[1]
+        if registrations or waitlist:
+            logger.warning(
+                f"Counters of event {event_id} drifted by {registrations} registrations "
+                f"and {waitlist} waitlisted; correcting"
+            )
+            apply(event_id, registrations, waitlist)
+        if progress:
+            progress(sum(counted), sum(counted))
+        return True
+
+    raise RuntimeError(f"Counters for event {event_id} kept changing while being reconciled")
+
+
+def _stored_counts(event_id: str) -> Optional[Tuple[int, int]]:
+    event = events_table.get_item(
+        Key={'eventId': event_id},
+        ProjectionExpression='currentRegistrations, currentWaitlist, counterShards',
+        ConsistentRead=True
+    ).get('Item')
+    if not event:
+        return None
+    if event.get('counterShards'):
+        remember(event_id, event['counterShards'])
+        return aggregate(event_id)
+    return int(event.get('currentRegistrations', 0)), int(event.get('currentWaitlist', 0))
+
+
+def _count_registrations(event_id: str) -> Tuple[int, int]:
+    counts = {'registered': 0, 'waitlisted': 0}
+    params = {
+        'KeyConditionExpression': 'eventId = :eid',
+        'ExpressionAttributeValues': {':eid': event_id},
+        'ProjectionExpression': '#status',
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'ConsistentRead': True
+    }
+    while True:
+        response = registrations_table.query(**params)
+        for item in response.get('Items', []):
+            if item.get('status') in counts:
+                counts[item['status']] += 1
+        if 'LastEvaluatedKey' not in response:
+            return counts['registered'], counts['waitlisted']
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def old_image(error_response: dict) -> Optional[dict]:
+    """Decode the ALL_OLD item attached to a failed condition check, if any."""
+    item = error_response.get('Item')
+    if not item:
+        return None
+    from boto3.dynamodb.types import TypeDeserializer
+    deserializer = TypeDeserializer()
+    return {k: deserializer.deserialize(v) for k, v in item.items()}
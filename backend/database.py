@@ -1,15 +1,63 @@
-import boto3
 from botocore.exceptions import ClientError
+import base64
+import heapq
+import json
 import os
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import uuid
+from common import aws, codec, metrics
+from common.batch import batch_get, batch_write
+from common.cache import event_cache
+from common.etag import version_condition
+from common.scan import DEFAULT_SEGMENTS, scan_items
+import counters
+import registration_db
+import rosters
+import search
+import streams
+import summaries
 
-dynamodb = boto3.resource('dynamodb')
+dynamodb = aws.dynamodb
 table_name = os.getenv('DYNAMODB_TABLE_NAME', 'Events')
-table = dynamodb.Table(table_name)
+table = aws.table(table_name)
+# Hot reads skip boto3's TypeDeserializer (common.codec)
+read_table = codec.reader(table_name, table)
+status_index_name = os.getenv('EVENTS_STATUS_INDEX_NAME', 'status-date-index')
+organizer_index_name = os.getenv('EVENTS_ORGANIZER_INDEX_NAME', 'organizer-date-index')
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+BATCH_GET_WORKERS = int(os.getenv('BATCH_GET_WORKERS', '4'))
+# Concurrent UpdateItem calls when a bulk import replaces existing events
+IMPORT_UPDATE_WORKERS = int(os.getenv('IMPORT_UPDATE_WORKERS', '8'))
+# Kept from the stored item when an event is re-imported
+LIVE_EVENT_FIELDS = ('eventId', 'currentRegistrations', 'currentWaitlist', 'counterShards', 'version', 'rosterChunks')
 
-def create_event(event_data: dict) -> dict:
+
+def _encode_cursor(last_key: Optional[dict]) -> Optional[str]:
+    """Turn a LastEvaluatedKey into an opaque, URL-safe cursor token."""
+    if not last_key:
+        return None
+    raw = json.dumps(last_key, separators=(',', ':'), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[dict]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded))
+    except ValueError:
+        raise ValueError("Invalid pagination cursor")
+    if not isinstance(key, dict) or 'eventId' not in key:
+        raise ValueError("Invalid pagination cursor")
+    return key
+
+
+def _prepare_event(event_data: dict) -> dict:
     if 'eventId' not in event_data or not event_data['eventId']:
         event_data['eventId'] = str(uuid.uuid4())
     
@@ -20,48 +68,367 @@ def create_event(event_data: dict) -> dict:
         event_data['currentWaitlist'] = 0
     if 'waitlistEnabled' not in event_data:
         event_data['waitlistEnabled'] = False
-    
+    event_data.setdefault('version', 1)
+    event_data.setdefault('rosterChunks', rosters.chunk_count(event_data.get('capacity', 0)))
+    return event_data
+
+
+def create_event(event_data: dict) -> dict:
+    event_data = _prepare_event(event_data)
     table.put_item(Item=event_data)
+    rosters.create({event_data['eventId']: event_data['rosterChunks']})
+    
+    # High-demand events count registrations on sharded counters
+    if event_data.get('highDemand'):
+        counters.enable_sharding(event_data['eventId'])
+    event_cache.invalidate(event_data['eventId'])
+    # In stream mode the Events stream posts it
+    if streams.inline():
+        search.index_events([event_data])
     return event_data
 
 
-def get_event(event_id: str) -> Optional[dict]:
+def import_events(events: List[dict]) -> List[Tuple[dict, str]]:
+    """Write a batch of validated events.
+
+    New events go out with BatchWriteItem. Events that already exist are
+    updated in place, one UpdateItem each, so their live registration
+    counters are never overwritten. Returns (event, error) pairs for rows
+    that could not be written.
+    """
+    by_id = {}
+    for event_data in events:
+        event_data = _prepare_event(event_data)
+        by_id[event_data['eventId']] = event_data
+    
+    existing = get_events_batch(by_id.keys())
+    new_ids = [event_id for event_id in by_id if event_id not in existing]
+    failed = batch_write(dynamodb, table_name, [{'PutRequest': {'Item': by_id[event_id]}} for event_id in new_ids])
+    failed_ids = {request['PutRequest']['Item']['eventId'] for request in failed}
+    errors = {event_id: "Write was not processed by DynamoDB" for event_id in failed_ids}
+    rosters.create({
+        event_id: by_id[event_id]['rosterChunks'] for event_id in new_ids if event_id not in failed_ids
+    })
+    for event_id in new_ids:
+        event_cache.invalidate(event_id)
+        if event_id not in failed_ids and by_id[event_id].get('highDemand'):
+            counters.enable_sharding(event_id)
+    if streams.inline():
+        search.index_events(by_id[event_id] for event_id in new_ids if event_id not in failed_ids)
+    
+    def reimport(event_id: str) -> Tuple[str, Optional[str]]:
+        return event_id, _reimport_event(by_id[event_id], existing[event_id])
+    
+    with ThreadPoolExecutor(max_workers=max(1, IMPORT_UPDATE_WORKERS)) as executor:
+        for event_id, error in executor.map(metrics.bind(reimport), list(existing)):
+            if error:
+                errors[event_id] = error
+    return [(by_id[event_id], error) for event_id, error in errors.items()]
+
+
+def _reimport_event(event_data: dict, current: dict) -> Optional[str]:
+    """Replace an existing event's fields, leaving its counters alone. Returns an error, if any."""
+    event_id = event_data['eventId']
+    changes = {
+        field: value for field, value in event_data.items()
+        if field not in LIVE_EVENT_FIELDS and current.get(field) != value
+    }
+    if not changes:
+        return None
+    try:
+        event = table.update_item(
+            Key={'eventId': event_id},
+            UpdateExpression="SET " + ", ".join(f"#{k} = :{k}" for k in changes) + " ADD version :one",
+            ConditionExpression='attribute_exists(eventId)',
+            ExpressionAttributeNames={f"#{k}": k for k in changes},
+            ExpressionAttributeValues={**{f":{k}": v for k, v in changes.items()}, ':one': 1},
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return "Event was deleted during the import"
+        return "Write was not processed by DynamoDB"
+    finally:
+        event_cache.invalidate(event_id)
+    _after_update(event_id, changes, event)
+    return None
+
+
+def iter_events(segments: int = 1, page_size: int = MAX_PAGE_SIZE,
+                attributes: Optional[List[str]] = None) -> Iterator[dict]:
+    """Stream every event, one page in memory at a time (per scan segment).
+
+    `attributes` limits the returned fields; sharded counters are only
+    aggregated when the projection keeps them.
+    """
+    projection = None
+    if attributes:
+        projection = list(dict.fromkeys(['eventId', *attributes]))
+        if 'currentRegistrations' in projection or 'currentWaitlist' in projection:
+            projection.append('counterShards')
+    for item in scan_items(read_table, segments=segments, page_size=page_size, projection=projection):
+        yield counters.apply_aggregate(item)
+
+
+def get_event(event_id: str, consistent: bool = False) -> Optional[dict]:
+    """Read an event, from the process-local cache unless `consistent` is set."""
+    def load():
+        response = read_table.get_item(Key={'eventId': event_id}, ConsistentRead=consistent)
+        return counters.apply_aggregate(response.get('Item'))
+    
     try:
-        response = table.get_item(Key={'eventId': event_id})
-        return response.get('Item')
+        return event_cache.get_or_load(event_id, load, consistent=consistent)
     except ClientError:
         return None
 
 
-def get_all_events() -> List[dict]:
+def get_events_batch(event_ids: Iterable[str], attributes: Optional[List[str]] = None,
+                     max_workers: int = BATCH_GET_WORKERS) -> Dict[str, dict]:
+    """Fetch many events at once, keyed by eventId.
+
+    `attributes` limits the returned fields (eventId is always included).
+    """
+    unique_ids = list(dict.fromkeys(eid for eid in event_ids if eid))
+    if not unique_ids:
+        return {}
+    
+    projection = None
+    if attributes:
+        projection = list(dict.fromkeys(['eventId', *attributes]))
+    
+    try:
+        items = batch_get(
+            dynamodb, table_name, [{'eventId': eid} for eid in unique_ids],
+            projection=projection, max_workers=max_workers, raw=codec.LOW_LEVEL_READS
+        )
+        return {item['eventId']: counters.apply_aggregate(item) for item in items}
+    except ClientError:
+        return {}
+
+
+def get_all_events(segments: int = DEFAULT_SEGMENTS, attributes: Optional[List[str]] = None) -> List[dict]:
     try:
-        response = table.scan()
-        return response.get('Items', [])
+        return list(iter_events(segments=segments, attributes=attributes))
     except ClientError:
         return []
 
 
-def update_event(event_id: str, update_data: dict) -> Optional[dict]:
-    update_expr = "SET " + ", ".join([f"#{k} = :{k}" for k in update_data.keys()])
+def list_events(status: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+                cursor: Optional[str] = None) -> dict:
+    """Return one page of events and the cursor for the next page.
+
+    Status filtering is served by the status/date GSI so only matching
+    items are read; results within a status come back ordered by date.
+    """
+    params = {'Limit': max(1, min(limit, MAX_PAGE_SIZE))}
+    start_key = _decode_cursor(cursor)
+    if start_key:
+        params['ExclusiveStartKey'] = start_key
+
+    try:
+        if status:
+            response = read_table.query(
+                IndexName=status_index_name,
+                KeyConditionExpression='#status = :status',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':status': status},
+                **params
+            )
+        else:
+            response = read_table.scan(**params)
+    except ClientError as e:
+        if start_key and e.response['Error']['Code'] == 'ValidationException':
+            raise ValueError("Invalid pagination cursor")
+        return {'items': [], 'nextCursor': None}
+
+    return {
+        'items': [counters.apply_aggregate(item) for item in response.get('Items', [])],
+        'nextCursor': _encode_cursor(response.get('LastEvaluatedKey'))
+    }
+
+
+def search_events(q: Optional[str] = None, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                  organizer: Optional[str] = None, location: Optional[str] = None, status: Optional[str] = None,
+                  limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> dict:
+    """One page of events matching every given filter, ordered by date.
+
+    Text searches query the search postings of their longest term. Without
+    text, an organizer filter queries the organizer GSI, and anything else
+    the status GSI: one status partition, or all of them merged by date.
+    The date range is the key condition either way, and the other filters
+    are applied on the index. The candidates' items are then read and
+    re-checked until the page is full.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    start = _decode_cursor(cursor)
+    if start is not None and not isinstance(start.get('date'), str):
+        raise ValueError("Invalid pagination cursor")
+    after = (start['date'], start['eventId']) if start else None
+    query_terms = search.terms(q)
+    criteria = {
+        'organizer': organizer, 'location': location, 'status': status,
+        'dateFrom': date_from, 'dateTo': date_to
+    }
+
+    page_size = limit + 1
+    if query_terms:
+        keys = search.candidates(query_terms, criteria, after, page_size)
+    elif organizer:
+        keys = _date_index_keys(organizer_index_name, 'organizer', criteria, after, page_size)
+    else:
+        keys = heapq.merge(*(
+            _date_index_keys(status_index_name, 'status', {**criteria, 'status': value}, after, page_size)
+            for value in ([status] if status else search.EVENT_STATUSES)
+        ))
+
+    items: List[dict] = []
+    more = False
+    while not more:
+        chunk = list(islice(keys, page_size))
+        if not chunk:
+            break
+        events = get_events_batch(event_id for _, event_id in chunk)
+        # Indexes may be behind writes; re-check what was read
+        for _, event_id in chunk:
+            event = events.get(event_id)
+            if event is None or not search.matches(event, query_terms, criteria):
+                continue
+            if len(items) == limit:
+                more = True
+                break
+            items.append(event)
+    next_key = {'date': items[-1].get('date') or '', 'eventId': items[-1]['eventId']} if more else None
+    return {'items': items, 'nextCursor': _encode_cursor(next_key)}
+
+
+def _date_index_keys(index_name: str, key: str, criteria: dict, after: Optional[Tuple[str, str]],
+                     page_size: int) -> Iterator[Tuple[str, str]]:
+    """(date, eventId) from the GSI partition `criteria[key]`, sorted by date, in order after `after`.
+
+    Events that share a date are sorted by eventId, so a cursor can resume
+    between them.
+    """
+    names = {'#key': key, '#date': 'date'}
+    values = {':key': criteria[key]}
+    condition = '#key = :key'
+    low = max(criteria['dateFrom'] or '', after[0] if after else '')
+    high = criteria['dateTo']
+    if low and high:
+        condition += ' AND #date BETWEEN :from AND :to'
+    elif low:
+        condition += ' AND #date >= :from'
+    elif high:
+        condition += ' AND #date <= :to'
+    if low:
+        values[':from'] = low
+    if high:
+        values[':to'] = high
+
+    filters = []
+    for field in search.FILTER_FIELDS:
+        if field != key and criteria[field]:
+            names[f'#{field}'] = field
+            values[f':{field}'] = criteria[field]
+            filters.append(f'#{field} = :{field}')
+
+    params = {
+        'IndexName': index_name,
+        'KeyConditionExpression': condition,
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values,
+        'ProjectionExpression': 'eventId, #date',
+        'Limit': page_size
+    }
+    if filters:
+        params['FilterExpression'] = ' AND '.join(filters)
+
+    run: List[Tuple[str, str]] = []
+    while True:
+        response = read_table.query(**params)
+        for item in response.get('Items', []):
+            if run and item['date'] != run[0][0]:
+                yield from (k for k in sorted(run) if not after or k > after)
+                run = []
+            run.append((item['date'], item['eventId']))
+        if 'LastEvaluatedKey' not in response:
+            break
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    yield from (k for k in sorted(run) if not after or k > after)
+
+
+def update_event(event_id: str, update_data: dict, expected_version: Optional[int] = None) -> Optional[dict]:
+    """Apply a partial update and bump the event's version.
+    
+    With `expected_version` the write only happens if the stored version
+    still matches; otherwise ValueError is raised. Returns None if the
+    event does not exist.
+    """
+    update_expr = "SET " + ", ".join([f"#{k} = :{k}" for k in update_data.keys()]) + " ADD version :one"
     expr_attr_names = {f"#{k}": k for k in update_data.keys()}
     expr_attr_values = {f":{k}": v for k, v in update_data.items()}
+    expr_attr_values[':one'] = 1
+    condition = 'attribute_exists(eventId)'
+    if expected_version is not None:
+        condition, expr_attr_values = version_condition(condition, expected_version, expr_attr_values)
     
     try:
         response = table.update_item(
             Key={'eventId': event_id},
             UpdateExpression=update_expr,
+            ConditionExpression=condition,
             ExpressionAttributeNames=expr_attr_names,
             ExpressionAttributeValues=expr_attr_values,
-            ReturnValues="ALL_NEW"
+            ReturnValues="ALL_NEW",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD"
         )
-        return response.get('Attributes')
-    except ClientError:
+        event = response.get('Attributes')
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException' and e.response.get('Item'):
+            raise ValueError("Event has been modified")
         return None
+    finally:
+        event_cache.invalidate(event_id)
+    
+    return _after_update(event_id, update_data, event)
 
 
-def delete_event(event_id: str) -> bool:
+def _after_update(event_id: str, update_data: dict, event: dict) -> dict:
+    """Bring counters, registration summaries and the search index in line with an updated event.
+
+    Returns the event with aggregated counters.
+    """
+    # Keep the counter representation in step with the highDemand flag and capacity
+    if update_data.get('highDemand') and not event.get('counterShards'):
+        counters.enable_sharding(event_id)
+        event = table.get_item(Key={'eventId': event_id}).get('Item')
+    elif update_data.get('highDemand') is False and event.get('counterShards'):
+        counters.disable_sharding(event_id)
+        event = table.get_item(Key={'eventId': event_id}).get('Item')
+    elif 'capacity' in update_data and event.get('counterShards'):
+        counters.rebalance(event_id, update_data['capacity'])
+    event = counters.apply_aggregate(event)
+    
+    # Registrations carry a copy of these fields; in stream mode the Events stream refreshes them
+    if streams.inline() and any(field in update_data for field in summaries.SUMMARY_FIELDS):
+        summaries.propagate(event)
+    if streams.inline() and any(field in update_data for field in search.INDEXED_FIELDS):
+        search.index_event(event)
+    return event
+
+
+def delete_event(event_id: str, progress: Optional[Callable[[int, int], None]] = None) -> bool:
+    """Delete an event, its counter shards and all of its registrations.
+    
+    The event item goes first so no new registration can land while the
+    rest is cleaned up. `progress(done, total)` reports registration deletes.
+    """
     try:
         table.delete_item(Key={'eventId': event_id})
+        event_cache.invalidate(event_id)
+        if streams.inline():
+            search.remove_event(event_id)
+        counters.delete_shards(event_id)
+        registration_db.delete_event_registrations(event_id, progress)
         return True
     except ClientError:
         return False
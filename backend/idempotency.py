@@ -0,0 +1,117 @@
+"""Idempotency keys for retried POST requests.
+
+A client that sends an `Idempotency-Key` header gets the first response to
+that key back on every retry, without the request running again. The
+first request claims the key with a conditional put, so concurrent retries
+cannot both run. The response is then stored next to the claim until the
+record expires. Keys are scoped to the method and path they were sent to,
+and a retry must carry the same body as the first request.
+"""
+from botocore.exceptions import ClientError
+import hashlib
+import json
+import os
+import time
+from typing import Any, Optional
+from common import aws, codec
+import storage
+
+idempotency_table_name = os.getenv('IDEMPOTENCY_TABLE_NAME', 'Idempotency')
+idempotency_table = aws.table(idempotency_table_name)
+
+# Stored responses are replayed for this long, then dropped by the table's TTL
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', str(24 * 3600)))
+# A claim that never completed (the worker died) can be taken over after this long
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '60'))
+MAX_KEY_LENGTH = 255
+# Conditional puts to try when the key's holder is gone by the time it is read
+CLAIM_ATTEMPTS = 3
+
+
+def record_key(scope: str, key: str) -> str:
+    return f"{scope}#{key}"
+
+
+def fingerprint(payload: Any) -> str:
+    raw = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def claim(scope: str, key: str, request_fingerprint: str) -> Optional[dict]:
+    """Claim a key for a new request. Returns None if claimed, else the record already holding it."""
+    now = int(time.time())
+    record = {
+        'idempotencyKey': record_key(scope, key),
+        'fingerprint': request_fingerprint,
+        'state': 'pending',
+        'lockedUntil': now + IDEMPOTENCY_LOCK_SECONDS,
+        'expiresAt': now + IDEMPOTENCY_TTL_SECONDS
+    }
+    if storage.is_sqlite():
+        import sqlite_db
+        return sqlite_db.claim_idempotency_key(record, now)
+
+    for _ in range(CLAIM_ATTEMPTS):
+        try:
+            idempotency_table.put_item(
+                Item=record,
+                # Expired records may linger until TTL deletes them; treat them as absent
+                ConditionExpression=(
+                    'attribute_not_exists(idempotencyKey) OR expiresAt < :now '
+                    'OR (#state = :pending AND lockedUntil < :now)'
+                ),
+                ExpressionAttributeNames={'#state': 'state'},
+                ExpressionAttributeValues={':now': now, ':pending': 'pending'},
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+            return None
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            existing = codec.decode_item(e.response.get('Item'))
+        if existing is None:
+            existing = idempotency_table.get_item(
+                Key={'idempotencyKey': record['idempotencyKey']}, ConsistentRead=True
+            ).get('Item')
+        if existing is not None:
+            return existing
+        # The holder released the key in between; try to claim it again
+    # Still contended: report it as in progress rather than run unclaimed
+    return record
+
+
+def complete(scope: str, key: str, status_code: int, body: Any):
+    """Store the response to replay for a claimed key."""
+    fields = {'state': 'completed', 'statusCode': status_code, 'body': json.dumps(body, separators=(',', ':'))}
+    if storage.is_sqlite():
+        import sqlite_db
+        sqlite_db.complete_idempotency_key(record_key(scope, key), fields)
+        return
+    idempotency_table.update_item(
+        Key={'idempotencyKey': record_key(scope, key)},
+        UpdateExpression='SET #state = :state, statusCode = :status, #body = :body',
+        ExpressionAttributeNames={'#state': 'state', '#body': 'body'},
+        ExpressionAttributeValues={':state': fields['state'], ':status': status_code, ':body': fields['body']}
+    )
+
+
+def release(scope: str, key: str):
+    """Give up a claim whose request failed, so a retry can run it again."""
+    if storage.is_sqlite():
+        import sqlite_db
+        sqlite_db.release_idempotency_key(record_key(scope, key))
+        return
+    try:
+        idempotency_table.delete_item(
+            Key={'idempotencyKey': record_key(scope, key)},
+            ConditionExpression='#state = :pending',
+            ExpressionAttributeNames={'#state': 'state'},
+            ExpressionAttributeValues={':pending': 'pending'}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+
+def stored_body(record: dict) -> Any:
+    return json.loads(record['body'])
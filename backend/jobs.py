@@ -0,0 +1,136 @@
+"""Background jobs for work too large to finish inside one request.
+
+A job is an item in the jobs table recording its status and progress.
+On Lambda the work runs in a separate asynchronous invocation of the same
+function; anywhere else it runs on a background thread of this process.
+With the sqlite storage backend, job records live in the local database
+and the work always runs on a thread.
+"""
+from botocore.exceptions import ClientError
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Optional
+from common import aws
+import counters
+import storage
+import summaries
+
+logger = logging.getLogger(__name__)
+
+jobs_table_name = os.getenv('JOBS_TABLE_NAME', 'Jobs')
+jobs_table = aws.table(jobs_table_name)
+
+# Finished jobs are dropped by the table's TTL after this long
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', str(7 * 24 * 3600)))
+
+
+def _backend_job(member: str) -> Callable:
+    """A storage backend function, looked up when the job runs rather than on import."""
+    return lambda target_id, **kwargs: getattr(storage.backend(), member)(target_id, **kwargs)
+
+
+JOB_TYPES = {
+    'delete_user': _backend_job('delete_user'),
+    'delete_event': _backend_job('delete_event'),
+}
+if not storage.is_sqlite():
+    # Summaries are denormalized and counters adjusted outside transactions only in DynamoDB
+    JOB_TYPES['refresh_summaries'] = summaries.refresh
+    JOB_TYPES['settle_summaries'] = summaries.settle
+    JOB_TYPES['reconcile_counters'] = counters.reconcile
+
+
+def create_job(job_type: str, target_id: str) -> dict:
+    if job_type not in JOB_TYPES:
+        raise ValueError(f"Unknown job type {job_type}")
+
+    now = datetime.utcnow().isoformat()
+    job = {
+        'jobId': str(uuid.uuid4()),
+        'type': job_type,
+        'targetId': target_id,
+        'status': 'pending',
+        'processed': 0,
+        'total': None,
+        'createdAt': now,
+        'updatedAt': now,
+        'expiresAt': int(time.time()) + JOB_RETENTION_SECONDS
+    }
+    if storage.is_sqlite():
+        import sqlite_db
+        sqlite_db.put_job(job)
+    else:
+        jobs_table.put_item(Item=job)
+    return job
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    if storage.is_sqlite():
+        import sqlite_db
+        return sqlite_db.get_job(job_id)
+    try:
+        response = jobs_table.get_item(Key={'jobId': job_id}, ConsistentRead=True)
+        return response.get('Item')
+    except ClientError:
+        return None
+
+
+def start(job_type: str, target_id: str) -> dict:
+    """Record a job and hand it to a worker; returns the pending job."""
+    job = create_job(job_type, target_id)
+    function_name = os.getenv('AWS_LAMBDA_FUNCTION_NAME')
+    if function_name and not storage.is_sqlite():
+        aws.lambda_client().invoke(
+            FunctionName=function_name,
+            InvocationType='Event',
+            Payload=json.dumps({'backgroundJob': job['jobId']}).encode()
+        )
+    else:
+        threading.Thread(target=run, args=(job['jobId'],), daemon=True).start()
+    return job
+
+
+def is_job_event(event) -> bool:
+    return isinstance(event, dict) and 'backgroundJob' in event
+
+
+def run(job_id: str) -> Optional[dict]:
+    """Execute a job and record its outcome. Safe to re-run after a failure."""
+    job = get_job(job_id)
+    if not job:
+        logger.error(f"Job {job_id} not found")
+        return None
+
+    _update(job_id, status='running')
+
+    def progress(processed: int, total: int):
+        _update(job_id, processed=processed, total=total)
+
+    try:
+        succeeded = JOB_TYPES[job['type']](job['targetId'], progress=progress)
+        if succeeded:
+            return _update(job_id, status='succeeded')
+        return _update(job_id, status='failed', error='Storage request failed')
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {str(e)}")
+        return _update(job_id, status='failed', error=str(e))
+
+
+def _update(job_id: str, **fields) -> Optional[dict]:
+    fields['updatedAt'] = datetime.utcnow().isoformat()
+    if storage.is_sqlite():
+        import sqlite_db
+        return sqlite_db.update_job(job_id, fields)
+    response = jobs_table.update_item(
+        Key={'jobId': job_id},
+        UpdateExpression="SET " + ", ".join(f"#{k} = :{k}" for k in fields),
+        ExpressionAttributeNames={f"#{k}": k for k in fields},
+        ExpressionAttributeValues={f":{k}": v for k, v in fields.items()},
+        ReturnValues="ALL_NEW"
+    )
+    return response.get('Attributes')
@@ -1,4 +1,26 @@
+from common import startup
+
+# Time the heavy imports individually so cold-start regressions show up per module
+startup.import_timed('pydantic', 'fastapi', 'mangum', 'main')
+
 from mangum import Mangum
 from main import app
+import counters
+import jobs
+
+with startup.timed('init:mangum'):
+    _asgi_handler = Mangum(app, lifespan="off")
+
 
-handler = Mangum(app, lifespan="off")
+def handler(event, context):
+    try:
+        # Asynchronous self-invocations carry background jobs, not HTTP requests
+        if jobs.is_job_event(event):
+            jobs.run(event['backgroundJob'])
+            return None
+        return _asgi_handler(event, context)
+    finally:
+        # The container may be frozen or recycled after this; don't leave counter deltas behind
+        counters.flush()
+        # The first invocation also pays for the lazily created DynamoDB client
+        startup.log_report()
@@ -1,22 +1,35 @@
-from fastapi import FastAPI, HTTPException, Request, status
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.exceptions import RequestValidationError
-from typing import List
+from pydantic import ValidationError
+from decimal import Decimal
+from typing import AsyncIterator, List, Optional, Tuple
 from models import (
     Event, EventCreate, EventUpdate,
     User, UserCreate, UserUpdate,
     RegistrationRequest, RegistrationResponse,
-    UserRegistrations, EventRegistrations
+    BulkRegistrationRequest, BulkRegistrationResponse,
+    UserRegistrations, EventRegistrations,
+    Job
 )
-import database
-import registration_db
+import asyncio
+import async_db
+import idempotency
+import jobs
+import storage
+import summaries
+from common import cache, etag, fastjson, metrics
+from common.scan import DEFAULT_SEGMENTS, MAX_SEGMENTS
+import json
 import os
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+BULK_IMPORT_CHUNK_SIZE = 500
+
 app = FastAPI(
     title="Events API",
     version="1.0.0",
@@ -35,6 +48,9 @@ app.add_middleware(
     max_age=3600,
 )
 
+# Per-request DynamoDB call counts and timings (log line + Server-Timing header)
+app.add_middleware(metrics.RequestMetricsMiddleware)
+
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -64,49 +80,234 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "cache": cache.stats()}
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    if not metrics.METRICS_ENDPOINT_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
 
 
 @app.post("/events", response_model=Event, status_code=201)
-def create_event(event: EventCreate):
+async def create_event(event: EventCreate, request: Request, idempotency_key: Optional[str] = Header(None)):
+    async def create():
+        try:
+            event_data = event.model_dump()
+            created_event = await async_db.create_event(event_data)
+            logger.info(f"Created event: {created_event['eventId']}")
+            return created_event
+        except Exception as e:
+            logger.error(f"Error creating event: {str(e)}")
+            raise HTTPException(status_code=500, detail="Failed to create event")
+    
+    return await _idempotent(request, idempotency_key, event.model_dump(), Event, 201, create)
+
+
+async def _idempotent(request: Request, key: Optional[str], payload, model, status_code: int, handler):
+    """Run a POST handler at most once per Idempotency-Key and replay its response to retries.
+    
+    Outcomes below 500 are stored, errors included, so a retried
+    registration gets its first answer rather than "already registered".
+    Server errors release the key so the retry runs again.
+    """
+    if not key:
+        return await handler()
+    if len(key) > idempotency.MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+    
+    scope = f"{request.method} {request.url.path}"
+    fingerprint = idempotency.fingerprint(payload)
+    existing = await async_db.run(idempotency.claim, scope, key, fingerprint)
+    if existing:
+        if existing['fingerprint'] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        if existing['state'] != 'completed':
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        return JSONResponse(
+            status_code=int(existing['statusCode']),
+            content=idempotency.stored_body(existing),
+            headers={"Idempotent-Replayed": "true"}
+        )
+    
     try:
-        event_data = event.model_dump()
-        created_event = database.create_event(event_data)
-        logger.info(f"Created event: {created_event['eventId']}")
-        return created_event
-    except Exception as e:
-        logger.error(f"Error creating event: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to create event")
+        result = await handler()
+    except HTTPException as e:
+        if e.status_code >= 500:
+            await async_db.run(idempotency.release, scope, key)
+        else:
+            await async_db.run(idempotency.complete, scope, key, e.status_code, {"detail": e.detail})
+        raise
+    except BaseException:
+        await async_db.run(idempotency.release, scope, key)
+        raise
+    
+    body = model.model_validate(result).model_dump(mode='json')
+    await async_db.run(idempotency.complete, scope, key, status_code, body)
+    return JSONResponse(status_code=status_code, content=body)
+
+
+def _fast(content, model, response: Optional[Response] = None):
+    """Return read results as-is, or pre-encoded when fast JSON responses are on.
+    
+    Stored items were validated on write, so the fast path only projects
+    them onto the model's public fields and skips response_model validation.
+    """
+    if not fastjson.FAST_JSON_ENABLED:
+        return content
+    if isinstance(content, list):
+        body = fastjson.project_many(content, model)
+    else:
+        body = fastjson.project(content, model)
+    headers = None
+    if response is not None:
+        headers = {k: v for k, v in response.headers.items() if k != 'content-length'}
+    return fastjson.FastJSONResponse(body, headers=headers)
+
+
+def _not_modified(tag: str, headers=None) -> Response:
+    not_modified = Response(status_code=304)
+    for name, value in (headers or {}).items():
+        not_modified.headers[name] = value
+    not_modified.headers['ETag'] = tag
+    return not_modified
 
 
 @app.get("/events", response_model=List[Event])
-def get_all_events(status: str = None):
+async def get_all_events(
+    response: Response,
+    status: str = None,
+    q: Optional[str] = None,
+    organizer: Optional[str] = None,
+    location: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias='dateFrom'),
+    date_to: Optional[str] = Query(None, alias='dateTo'),
+    # DEFAULT_PAGE_SIZE and MAX_PAGE_SIZE of both backends; literal so the backend loads on first use
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
     try:
-        events = database.get_all_events()
+        filters = (q, organizer, location, date_from, date_to)
+        if any(filters):
+            page = await async_db.search_events(
+                q=q, date_from=date_from, date_to=date_to, organizer=organizer, location=location,
+                status=status, limit=limit, cursor=cursor
+            )
+        else:
+            page = await async_db.list_events(status=status, limit=limit, cursor=cursor)
+        events = page['items']
         
-        # Filter by status if provided
-        if status:
-            events = [e for e in events if e.get('status') == status]
+        # Hand the client an opaque token for the next page, if any
+        if page['nextCursor']:
+            response.headers['X-Next-Cursor'] = page['nextCursor']
+        
+        tag = etag.collection_etag(events, 'eventId', status, *filters, cursor, str(limit), page['nextCursor'])
+        if etag.if_none_match(if_none_match, tag):
+            return _not_modified(tag, response.headers)
+        response.headers['ETag'] = tag
         
         logger.info(f"Retrieved {len(events)} events" + (f" with status={status}" if status else ""))
-        return events
+        return _fast(events, Event, response)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving events: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve events")
 
 
+async def _ndjson_lines(request: Request) -> AsyncIterator[Tuple[int, bytes]]:
+    """Yield (line number, line) pairs from a streamed NDJSON request body."""
+    buffer = b''
+    line_number = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, line
+    if buffer.strip():
+        yield line_number + 1, buffer
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+@app.post("/events:bulk")
+async def bulk_import_events(request: Request):
+    imported = 0
+    errors = []
+    rows = []
+    
+    async def flush(rows: List[Tuple[int, dict]]) -> int:
+        # Map failed writes back to their input lines
+        lines = {id(event): line_number for line_number, event in rows}
+        failed = await async_db.run(storage.backend().import_events, [event for _, event in rows])
+        for event, error in failed:
+            errors.append({'line': lines.get(id(event)), 'eventId': event['eventId'], 'error': error})
+        return len(rows) - len(failed)
+    
+    try:
+        async for line_number, line in _ndjson_lines(request):
+            try:
+                event = EventCreate.model_validate_json(line)
+            except ValidationError as e:
+                errors.append({
+                    'line': line_number,
+                    'error': 'Validation error',
+                    'errors': e.errors(include_url=False)
+                })
+                continue
+            
+            rows.append((line_number, event.model_dump()))
+            if len(rows) >= BULK_IMPORT_CHUNK_SIZE:
+                imported += await flush(rows)
+                rows = []
+        if rows:
+            imported += await flush(rows)
+        
+        logger.info(f"Bulk imported {imported} events, {len(errors)} rows failed")
+        return {'imported': imported, 'failed': len(errors), 'errors': errors}
+    except Exception as e:
+        logger.error(f"Error importing events: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to import events")
+
+
+@app.get("/events:export")
+def export_events(segments: int = Query(1, ge=1, le=MAX_SEGMENTS)):
+    fields = list(Event.model_fields)
+    
+    def lines():
+        for event in storage.backend().iter_events(segments=segments):
+            public = {field: event[field] for field in fields if field in event}
+            yield json.dumps(public, default=_json_default).encode() + b'\n'
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @app.get("/events/{event_id}", response_model=Event)
-def get_event(event_id: str):
+async def get_event(event_id: str, response: Response, consistent: bool = False,
+                    if_none_match: Optional[str] = Header(None)):
     try:
         if not event_id or not event_id.strip():
             raise HTTPException(status_code=400, detail="Event ID is required")
         
-        event = database.get_event(event_id)
+        event = await async_db.get_event(event_id, consistent=consistent)
         if not event:
             raise HTTPException(status_code=404, detail="Event not found")
         
+        tag = etag.entity_etag(event)
+        if etag.if_none_match(if_none_match, tag):
+            return _not_modified(tag)
+        response.headers['ETag'] = tag
+        
         logger.info(f"Retrieved event: {event_id}")
-        return event
+        return _fast(event, Event, response)
     except HTTPException:
         raise
     except Exception as e:
@@ -114,8 +315,21 @@ def get_event(event_id: str):
         raise HTTPException(status_code=500, detail="Failed to retrieve event")
 
 
+def _expected_version(if_match: str, current: Optional[dict], message: str) -> Optional[int]:
+    # No representation matches any If-Match, * included (RFC 9110, 13.1.1)
+    if not current:
+        raise HTTPException(status_code=412, detail=message)
+    # If-Match: * only requires the item to exist
+    if if_match.strip() == '*':
+        return None
+    if not etag.if_match(if_match, etag.entity_etag(current)):
+        raise HTTPException(status_code=412, detail=message)
+    return etag.version_of(current)
+
+
 @app.put("/events/{event_id}", response_model=Event)
-def update_event(event_id: str, event_update: EventUpdate):
+async def update_event(event_id: str, event_update: EventUpdate, response: Response,
+                       if_match: Optional[str] = Header(None)):
     try:
         if not event_id or not event_id.strip():
             raise HTTPException(status_code=400, detail="Event ID is required")
@@ -124,26 +338,40 @@ def update_event(event_id: str, event_update: EventUpdate):
         if not update_data:
             raise HTTPException(status_code=400, detail="No fields to update")
         
-        updated_event = database.update_event(event_id, update_data)
+        expected_version = None
+        if if_match:
+            current = await async_db.get_event(event_id, consistent=True)
+            expected_version = _expected_version(if_match, current, "Event has been modified")
+        
+        updated_event = await async_db.update_event(event_id, update_data, expected_version=expected_version)
         if not updated_event:
+            # Deleted since it was read
+            if if_match:
+                raise HTTPException(status_code=412, detail="Event has been modified")
             raise HTTPException(status_code=404, detail="Event not found")
         
+        response.headers['ETag'] = etag.entity_etag(updated_event)
         logger.info(f"Updated event: {event_id}")
         return updated_event
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=412, detail=str(e))
     except Exception as e:
         logger.error(f"Error updating event {event_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to update event")
 
 
 @app.delete("/events/{event_id}", status_code=204)
-def delete_event(event_id: str):
+async def delete_event(event_id: str, background: bool = False):
     try:
         if not event_id or not event_id.strip():
             raise HTTPException(status_code=400, detail="Event ID is required")
         
-        success = database.delete_event(event_id)
+        if background:
+            return await _start_job('delete_event', event_id)
+        
+        success = await async_db.delete_event(event_id)
         if not success:
             raise HTTPException(status_code=404, detail="Event not found")
         
@@ -156,28 +384,52 @@ def delete_event(event_id: str):
         raise HTTPException(status_code=500, detail="Failed to delete event")
 
 
-# User Management Endpoints
-@app.post("/users", response_model=User, status_code=201)
-def create_user(user: UserCreate):
+@app.post("/events/{event_id}/counters:reconcile", response_model=Job, status_code=202)
+async def reconcile_event_counters(event_id: str):
     try:
-        user_data = user.model_dump()
-        created_user = registration_db.create_user(user_data)
-        logger.info(f"Created user: {created_user['userId']}")
-        return created_user
-    except ValueError as e:
-        raise HTTPException(status_code=409, detail=str(e))
+        if 'reconcile_counters' not in jobs.JOB_TYPES:
+            raise HTTPException(status_code=400, detail="Counters are kept transactionally by this storage backend")
+        if not await async_db.get_event(event_id):
+            raise HTTPException(status_code=404, detail="Event not found")
+        return await _start_job('reconcile_counters', event_id)
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error creating user: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to create user")
+        logger.error(f"Error reconciling counters of event {event_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to reconcile event counters")
+
+
+# User Management Endpoints
+@app.post("/users", response_model=User, status_code=201)
+async def create_user(user: UserCreate, request: Request, idempotency_key: Optional[str] = Header(None)):
+    async def create():
+        try:
+            user_data = user.model_dump()
+            created_user = await async_db.create_user(user_data)
+            logger.info(f"Created user: {created_user['userId']}")
+            return created_user
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except Exception as e:
+            logger.error(f"Error creating user: {str(e)}")
+            raise HTTPException(status_code=500, detail="Failed to create user")
+    
+    return await _idempotent(request, idempotency_key, user.model_dump(), User, 201, create)
 
 
 @app.get("/users/{user_id}", response_model=User)
-def get_user(user_id: str):
+async def get_user(user_id: str, response: Response, consistent: bool = False,
+                   if_none_match: Optional[str] = Header(None)):
     try:
-        user = registration_db.get_user(user_id)
+        user = await async_db.get_user(user_id, consistent=consistent)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        return user
+        
+        tag = etag.entity_etag(user)
+        if etag.if_none_match(if_none_match, tag):
+            return _not_modified(tag)
+        response.headers['ETag'] = tag
+        return _fast(user, User, response)
     except HTTPException:
         raise
     except Exception as e:
@@ -186,38 +438,53 @@ def get_user(user_id: str):
 
 
 @app.get("/users", response_model=List[User])
-def get_all_users():
+async def get_all_users(segments: int = Query(DEFAULT_SEGMENTS, ge=1, le=MAX_SEGMENTS)):
     try:
-        users = registration_db.get_all_users()
-        return users
+        users = await async_db.get_all_users(segments=segments)
+        return _fast(users, User)
     except Exception as e:
         logger.error(f"Error retrieving users: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve users")
 
 
 @app.put("/users/{user_id}", response_model=User)
-def update_user(user_id: str, user_update: UserUpdate):
+async def update_user(user_id: str, user_update: UserUpdate, response: Response,
+                      if_match: Optional[str] = Header(None)):
     try:
         update_data = {k: v for k, v in user_update.model_dump().items() if v is not None}
         if not update_data:
             raise HTTPException(status_code=400, detail="No fields to update")
         
-        updated_user = registration_db.update_user(user_id, update_data)
+        expected_version = None
+        if if_match:
+            current = await async_db.get_user(user_id, consistent=True)
+            expected_version = _expected_version(if_match, current, "User has been modified")
+        
+        updated_user = await async_db.update_user(user_id, update_data, expected_version=expected_version)
         if not updated_user:
+            # Deleted since it was read
+            if if_match:
+                raise HTTPException(status_code=412, detail="User has been modified")
             raise HTTPException(status_code=404, detail="User not found")
         
+        response.headers['ETag'] = etag.entity_etag(updated_user)
         return updated_user
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=412, detail=str(e))
     except Exception as e:
         logger.error(f"Error updating user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to update user")
 
 
 @app.delete("/users/{user_id}", status_code=204)
-def delete_user(user_id: str):
+async def delete_user(user_id: str, background: bool = False):
     try:
-        success = registration_db.delete_user(user_id)
+        if background:
+            return await _start_job('delete_user', user_id)
+        
+        success = await async_db.delete_user(user_id)
         if not success:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -230,31 +497,90 @@ def delete_user(user_id: str):
         raise HTTPException(status_code=500, detail="Failed to delete user")
 
 
-# Registration Endpoints
-@app.post("/events/{event_id}/registrations", response_model=RegistrationResponse, status_code=201)
-def register_for_event(event_id: str, request: RegistrationRequest):
+# Background Jobs
+async def _start_job(job_type: str, target_id: str) -> JSONResponse:
+    job = await async_db.run(jobs.start, job_type, target_id)
+    logger.info(f"Started {job_type} job {job['jobId']} for {target_id}")
+    return JSONResponse(
+        status_code=202,
+        content=Job(**job).model_dump(),
+        headers={"Location": f"/jobs/{job['jobId']}"}
+    )
+
+
+@app.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
     try:
-        registration = registration_db.register_user(event_id, request.userId)
-        logger.info(f"User {request.userId} registered for event {event_id}: {registration['status']}")
-        return registration
-    except ValueError as e:
-        error_msg = str(e)
-        if "not found" in error_msg.lower():
-            raise HTTPException(status_code=404, detail=error_msg)
-        elif "already" in error_msg.lower():
-            raise HTTPException(status_code=409, detail=error_msg)
-        elif "capacity" in error_msg.lower():
-            raise HTTPException(status_code=409, detail=error_msg)
-        raise HTTPException(status_code=400, detail=error_msg)
+        job = await async_db.run(jobs.get_job, job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error registering user for event: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to register for event")
+        logger.error(f"Error retrieving job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve job")
+
+
+# Registration Endpoints
+@app.post("/events/{event_id}/registrations", response_model=RegistrationResponse, status_code=201)
+async def register_for_event(event_id: str, request: RegistrationRequest, http_request: Request,
+                             idempotency_key: Optional[str] = Header(None)):
+    async def register():
+        try:
+            registration = await async_db.register_user(event_id, request.userId)
+            logger.info(f"User {request.userId} registered for event {event_id}: {registration['status']}")
+            return registration
+        except ValueError as e:
+            error_msg = str(e)
+            if "not found" in error_msg.lower():
+                raise HTTPException(status_code=404, detail=error_msg)
+            elif "already" in error_msg.lower():
+                raise HTTPException(status_code=409, detail=error_msg)
+            elif "capacity" in error_msg.lower():
+                raise HTTPException(status_code=409, detail=error_msg)
+            raise HTTPException(status_code=400, detail=error_msg)
+        except Exception as e:
+            logger.error(f"Error registering user for event: {str(e)}")
+            raise HTTPException(status_code=500, detail="Failed to register for event")
+    
+    return await _idempotent(
+        http_request, idempotency_key, request.model_dump(), RegistrationResponse, 201, register
+    )
+
+
+@app.post("/events/{event_id}/registrations:bulk", response_model=BulkRegistrationResponse)
+async def bulk_register_for_event(event_id: str, request: BulkRegistrationRequest, http_request: Request,
+                                  idempotency_key: Optional[str] = Header(None)):
+    if len(request.userIds) > storage.backend().MAX_BULK_REGISTRATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {storage.backend().MAX_BULK_REGISTRATIONS} users can be registered per request"
+        )
+    
+    async def register():
+        try:
+            result = await async_db.register_users_bulk(event_id, request.userIds)
+            logger.info(
+                f"Bulk registration for event {event_id}: {result['registered']} registered, "
+                f"{result['waitlisted']} waitlisted, {result['rejected']} rejected"
+            )
+            return result
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except Exception as e:
+            logger.error(f"Error bulk registering users for event: {str(e)}")
+            raise HTTPException(status_code=500, detail="Failed to register users for event")
+    
+    return await _idempotent(
+        http_request, idempotency_key, request.model_dump(), BulkRegistrationResponse, 200, register
+    )
 
 
 @app.delete("/events/{event_id}/registrations/{user_id}", status_code=204)
-def unregister_from_event(event_id: str, user_id: str):
+async def unregister_from_event(event_id: str, user_id: str):
     try:
-        registration_db.unregister_user(event_id, user_id)
+        await async_db.unregister_user(event_id, user_id)
         logger.info(f"User {user_id} unregistered from event {event_id}")
         return None
     except ValueError as e:
@@ -265,28 +591,53 @@ def unregister_from_event(event_id: str, user_id: str):
 
 
 @app.get("/users/{user_id}/registrations", response_model=UserRegistrations)
-def get_user_registrations(user_id: str):
+async def get_user_registrations(user_id: str, fields: Optional[str] = None, full_events: bool = False):
     try:
-        user = registration_db.get_user(user_id)
+        # Optional comma-separated projection of the embedded event, e.g. ?fields=title,date
+        attributes = None
+        if fields:
+            attributes = [f.strip() for f in fields.split(',') if f.strip()]
+            unknown = [f for f in attributes if f not in Event.model_fields]
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown event fields: {', '.join(unknown)}")
+        
+        # The user check and the registrations query are independent
+        user, registrations = await asyncio.gather(
+            async_db.get_user(user_id),
+            async_db.get_user_registrations(user_id)
+        )
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        registrations = registration_db.get_user_registrations(user_id)
-        
-        # Enrich with event details
-        enriched = []
-        for reg in registrations:
-            event = database.get_event(reg['eventId'])
-            if event:
-                enriched.append({
-                    **reg,
-                    'event': event
-                })
+        # Registrations carry a summary of their event; only fall back to
+        # reading events for other fields and for rows written before summaries
+        summary_fields = ['eventId', *summaries.SUMMARY_FIELDS]
+        use_summaries = not full_events and all(f in summary_fields for f in attributes or summary_fields)
+        embedded = {}
+        if use_summaries:
+            for reg in registrations:
+                if 'eventSummary' in reg:
+                    event = summaries.public(reg['eventId'], reg['eventSummary'])
+                    embedded[reg['eventId']] = {f: event[f] for f in ['eventId', *attributes] if f in event} if attributes else event
+        missing = [reg['eventId'] for reg in registrations if reg['eventId'] not in embedded]
+        if missing:
+            events = await async_db.get_events_batch(
+                missing, attributes=attributes or (list(summaries.SUMMARY_FIELDS) if use_summaries else None)
+            )
+            # Internal attributes (counter shards, roster chunks) stay out of the response
+            embedded.update({
+                event_id: {k: v for k, v in event.items() if k in Event.model_fields}
+                for event_id, event in events.items()
+            })
+        enriched = [
+            {**{k: v for k, v in reg.items() if k != 'eventSummary'}, 'event': embedded[reg['eventId']]}
+            for reg in registrations if reg['eventId'] in embedded
+        ]
         
-        return {
+        return _fast({
             'userId': user_id,
             'registrations': enriched
-        }
+        }, UserRegistrations)
     except HTTPException:
         raise
     except Exception as e:
@@ -295,43 +646,46 @@ def get_user_registrations(user_id: str):
 
 
 @app.get("/events/{event_id}/registrations", response_model=EventRegistrations)
-def get_event_registrations(event_id: str):
+async def get_event_registrations(event_id: str, full_users: bool = False):
     try:
-        event = database.get_event(event_id)
-        if not event:
-            raise HTTPException(status_code=404, detail="Event not found")
-        
-        registrations = registration_db.get_event_registrations(event_id)
-        
-        # Enrich with user details
-        registered_enriched = []
-        for reg in registrations['registered']:
-            user = registration_db.get_user(reg['userId'])
-            if user:
-                registered_enriched.append({
-                    **reg,
-                    'user': user
-                })
-        
-        waitlisted_enriched = []
-        for reg in registrations['waitlisted']:
-            user = registration_db.get_user(reg['userId'])
-            if user:
-                waitlisted_enriched.append({
-                    **reg,
-                    'user': user
-                })
+        if not full_users:
+            event = await async_db.get_event(event_id)
+            if not event:
+                raise HTTPException(status_code=404, detail="Event not found")
+            # Materialized roster: user names are stored alongside the entries
+            roster = await async_db.get_event_roster(event)
+            registered_enriched, waitlisted_enriched = roster['registered'], roster['waitlisted']
+        else:
+            event, registrations = await asyncio.gather(
+                async_db.get_event(event_id),
+                async_db.get_event_registrations(event_id)
+            )
+            if not event:
+                raise HTTPException(status_code=404, detail="Event not found")
+            
+            # Enrich with user details, fetched in bulk rather than one call per attendee
+            users = await async_db.get_users_batch(
+                reg['userId'] for reg in registrations['registered'] + registrations['waitlisted']
+            )
+            registered_enriched = [
+                {**reg, 'user': users[reg['userId']]}
+                for reg in registrations['registered'] if reg['userId'] in users
+            ]
+            waitlisted_enriched = [
+                {**reg, 'user': users[reg['userId']]}
+                for reg in registrations['waitlisted'] if reg['userId'] in users
+            ]
         
-        return {
+        return _fast({
             'eventId': event_id,
             'registered': registered_enriched,
             'waitlisted': waitlisted_enriched,
             'counts': {
                 'registered': len(registered_enriched),
                 'waitlisted': len(waitlisted_enriched),
-                'capacity': event.get('capacity', 0)
+                'capacity': int(event.get('capacity', 0))
             }
-        }
+        }, EventRegistrations)
     except HTTPException:
         raise
     except Exception as e:
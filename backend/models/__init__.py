@@ -1,10 +1,14 @@
 # Data models
 from .event import Event, EventCreate, EventUpdate
 from .user import User, UserCreate, UserUpdate
+from .job import Job
 from .registration import (
     Registration,
     RegistrationRequest,
     RegistrationResponse,
+    BulkRegistrationRequest,
+    BulkRegistrationResult,
+    BulkRegistrationResponse,
     UserRegistrations,
     EventRegistrations
 )
@@ -13,5 +17,7 @@ __all__ = [
     'Event', 'EventCreate', 'EventUpdate',
     'User', 'UserCreate', 'UserUpdate',
     'Registration', 'RegistrationRequest', 'RegistrationResponse',
-    'UserRegistrations', 'EventRegistrations'
+    'BulkRegistrationRequest', 'BulkRegistrationResult', 'BulkRegistrationResponse',
+    'UserRegistrations', 'EventRegistrations',
+    'Job'
 ]
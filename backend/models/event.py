@@ -12,8 +12,10 @@ class Event(BaseModel):
     organizer: str = Field(..., min_length=1, max_length=100)
     status: str = Field(..., pattern="^(draft|published|cancelled|completed|active)$")
     waitlistEnabled: bool = False
+    highDemand: bool = False
     currentRegistrations: int = 0
     currentWaitlist: int = 0
+    version: int = 0
 
 
 class EventCreate(BaseModel):
@@ -26,6 +28,7 @@ class EventCreate(BaseModel):
     organizer: str = Field(..., min_length=1, max_length=100)
     status: str = Field(default="draft", pattern="^(draft|published|cancelled|completed|active)$")
     waitlistEnabled: bool = False
+    highDemand: bool = False
 
 
 class EventUpdate(BaseModel):
@@ -37,3 +40,4 @@ class EventUpdate(BaseModel):
     organizer: Optional[str] = Field(None, min_length=1, max_length=100)
     status: Optional[str] = Field(None, pattern="^(draft|published|cancelled|completed|active)$")
     waitlistEnabled: Optional[bool] = None
+    highDemand: Optional[bool] = None
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class Job(BaseModel):
+    jobId: str
+    type: str  # "delete_user", "delete_event", "refresh_summaries", "settle_summaries" or "reconcile_counters"
+    targetId: str
+    status: str  # "pending", "running", "succeeded" or "failed"
+    processed: int = 0
+    total: Optional[int] = None
+    error: Optional[str] = None
+    createdAt: str
+    updatedAt: str
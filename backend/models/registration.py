@@ -15,6 +15,10 @@ class RegistrationRequest(BaseModel):
     userId: str = Field(..., min_length=1)
 
 
+class BulkRegistrationRequest(BaseModel):
+    userIds: List[str] = Field(..., min_length=1)
+
+
 class RegistrationResponse(BaseModel):
     registrationId: str
     userId: str
@@ -25,6 +29,24 @@ class RegistrationResponse(BaseModel):
     message: str
 
 
+class BulkRegistrationResult(BaseModel):
+    userId: str
+    eventId: str
+    status: str  # "registered", "waitlisted" or "rejected"
+    registrationId: Optional[str] = None
+    registeredAt: Optional[str] = None
+    position: Optional[int] = None
+    message: str
+
+
+class BulkRegistrationResponse(BaseModel):
+    eventId: str
+    registered: int
+    waitlisted: int
+    rejected: int
+    results: List[BulkRegistrationResult]
+
+
 class UserRegistrations(BaseModel):
     userId: str
     registrations: List[dict]
@@ -7,6 +7,7 @@ class User(BaseModel):
     name: str = Field(..., min_length=1, max_length=200)
     createdAt: str
     updatedAt: str
+    version: int = 0
 
 
 class UserCreate(BaseModel):
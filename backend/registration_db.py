@@ -1,18 +1,50 @@
-import boto3
 from botocore.exceptions import ClientError
+import logging
 import os
-from typing import List, Optional, Dict
+import random
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Dict
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from common import aws, codec, metrics
+from common.batch import BATCH_WRITE_LIMIT, backoff, batch_get, batch_write, chunked
+from common.cache import event_cache, user_cache
+from common.etag import version_condition
+from common.scan import DEFAULT_SEGMENTS, scan_items
+import counters
+import rosters
+import streams
+import summaries
 
-dynamodb = boto3.resource('dynamodb')
+logger = logging.getLogger(__name__)
+
+dynamodb = aws.dynamodb
 users_table_name = os.getenv('USERS_TABLE_NAME', 'Users')
 registrations_table_name = os.getenv('REGISTRATIONS_TABLE_NAME', 'Registrations')
 events_table_name = os.getenv('DYNAMODB_TABLE_NAME', 'Events')
 
-users_table = dynamodb.Table(users_table_name)
-registrations_table = dynamodb.Table(registrations_table_name)
-events_table = dynamodb.Table(events_table_name)
+users_table = aws.table(users_table_name)
+registrations_table = aws.table(registrations_table_name)
+events_table = aws.table(events_table_name)
+# Hot reads skip boto3's TypeDeserializer (common.codec)
+users_reader = codec.reader(users_table_name, users_table)
+registrations_reader = codec.reader(registrations_table_name, registrations_table)
+
+# Sparse GSI (eventId, waitlistSeq): only waitlisted registrations carry waitlistSeq
+waitlist_index_name = os.getenv('REGISTRATIONS_WAITLIST_INDEX_NAME', 'waitlist-index')
+
+_seq_lock = threading.Lock()
+_last_seq = 0
+
+
+def _next_waitlist_seq() -> int:
+    """Monotonic waitlist sequence number based on wall-clock nanoseconds."""
+    global _last_seq
+    with _seq_lock:
+        _last_seq = max(time.time_ns(), _last_seq + 1)
+        return _last_seq
 
 
 # User operations
@@ -23,12 +55,14 @@ def create_user(user_data: dict) -> dict:
     now = datetime.utcnow().isoformat()
     user_data['createdAt'] = now
     user_data['updatedAt'] = now
+    user_data['version'] = 1
     
     try:
         users_table.put_item(
             Item=user_data,
             ConditionExpression='attribute_not_exists(userId)'
         )
+        user_cache.invalidate(user_data['userId'])
         return user_data
     except ClientError as e:
         if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
@@ -36,220 +70,879 @@ def create_user(user_data: dict) -> dict:
         raise
 
 
-def get_user(user_id: str) -> Optional[dict]:
-    try:
-        response = users_table.get_item(Key={'userId': user_id})
+def get_user(user_id: str, consistent: bool = False) -> Optional[dict]:
+    """Read a user, from the process-local cache unless `consistent` is set."""
+    def load():
+        response = users_reader.get_item(Key={'userId': user_id}, ConsistentRead=consistent)
         return response.get('Item')
+    
+    try:
+        return user_cache.get_or_load(user_id, load, consistent=consistent)
     except ClientError:
         return None
 
 
-def get_all_users() -> List[dict]:
+def get_users_batch(user_ids: Iterable[str]) -> Dict[str, dict]:
+    """Look up many users at once, keyed by userId. Duplicate IDs are fetched once."""
+    unique_ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+    if not unique_ids:
+        return {}
+    
     try:
-        response = users_table.scan()
-        return response.get('Items', [])
+        items = batch_get(
+            dynamodb, users_table_name, [{'userId': uid} for uid in unique_ids], raw=codec.LOW_LEVEL_READS
+        )
+        return {item['userId']: item for item in items}
+    except ClientError:
+        return {}
+
+
+def iter_users(segments: int = 1, attributes: Optional[List[str]] = None) -> Iterator[dict]:
+    """Stream every user, one page in memory at a time (per scan segment)."""
+    projection = list(dict.fromkeys(['userId', *attributes])) if attributes else None
+    return scan_items(users_reader, segments=segments, projection=projection)
+
+
+def get_all_users(segments: int = DEFAULT_SEGMENTS, attributes: Optional[List[str]] = None) -> List[dict]:
+    try:
+        return list(iter_users(segments=segments, attributes=attributes))
     except ClientError:
         return []
 
 
-def update_user(user_id: str, update_data: dict) -> Optional[dict]:
+def update_user(user_id: str, update_data: dict, expected_version: Optional[int] = None) -> Optional[dict]:
+    """Apply a partial update and bump the user's version.
+    
+    With `expected_version` the write only happens if the stored version
+    still matches; otherwise ValueError is raised.
+    """
     update_data['updatedAt'] = datetime.utcnow().isoformat()
     
-    update_expr = "SET " + ", ".join([f"#{k} = :{k}" for k in update_data.keys()])
+    update_expr = "SET " + ", ".join([f"#{k} = :{k}" for k in update_data.keys()]) + " ADD version :one"
     expr_attr_names = {f"#{k}": k for k in update_data.keys()}
     expr_attr_values = {f":{k}": v for k, v in update_data.items()}
+    expr_attr_values[':one'] = 1
+    condition = 'attribute_exists(userId)'
+    if expected_version is not None:
+        condition, expr_attr_values = version_condition(condition, expected_version, expr_attr_values)
     
     try:
         response = users_table.update_item(
             Key={'userId': user_id},
             UpdateExpression=update_expr,
+            ConditionExpression=condition,
             ExpressionAttributeNames=expr_attr_names,
             ExpressionAttributeValues=expr_attr_values,
-            ReturnValues="ALL_NEW"
+            ReturnValues="ALL_NEW",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD"
         )
+        if 'name' in update_data and streams.inline():
+            # Rosters carry a copy of the name
+            registrations = _query_all(
+                IndexName='userId-index',
+                KeyConditionExpression='userId = :uid',
+                ExpressionAttributeValues={':uid': user_id},
+                ProjectionExpression='eventId'
+            )
+            rosters.rename(user_id, update_data['name'], (reg['eventId'] for reg in registrations))
         return response.get('Attributes')
-    except ClientError:
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException' and e.response.get('Item'):
+            raise ValueError("User has been modified")
         return None
+    finally:
+        user_cache.invalidate(user_id)
 
 
-def delete_user(user_id: str) -> bool:
+def delete_user(user_id: str, progress: Optional[Callable[[int, int], None]] = None) -> bool:
+    """Delete a user together with every registration they hold.
+    
+    Registrations are removed with parallel BatchWriteItem calls. Each
+    affected event then gets one aggregated counter adjustment and its freed
+    seats go to the waitlist, with events handled concurrently.
+    `progress(done, total)` is called as registrations are removed.
+    """
     try:
-        # Delete all user registrations first
-        registrations = get_user_registrations(user_id)
-        for reg in registrations:
-            unregister_user(reg['eventId'], user_id)
+        registrations = _query_all(
+            IndexName='userId-index',
+            KeyConditionExpression='userId = :uid',
+            ExpressionAttributeValues={':uid': user_id}
+        )
+        deleted = _delete_registrations(registrations, progress)
+        
+        released: Dict[str, List[int]] = {}
+        for reg in deleted:
+            counts = released.setdefault(reg['eventId'], [0, 0])
+            counts[0 if reg['status'] == 'registered' else 1] += 1
+        
+        def release(item):
+            event_id, (registered, waitlisted) = item
+            if streams.inline():
+                rosters.remove(event_id, user_id)
+            _release(event_id, registered, waitlisted)
+        _fan_out(release, list(released.items()))
+        
+        if len(deleted) < len(registrations):
+            raise RuntimeError(f"{len(registrations) - len(deleted)} registrations of user {user_id} could not be deleted")
         
         users_table.delete_item(Key={'userId': user_id})
+        user_cache.invalidate(user_id)
         return True
     except ClientError:
         return False
 
 
+def delete_event_registrations(event_id: str, progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """Remove every registration for an event (whose counters go with it). Returns the count removed."""
+    registrations = _query_all(
+        KeyConditionExpression='eventId = :eid',
+        ExpressionAttributeValues={':eid': event_id},
+        ProjectionExpression='eventId, userId'
+    )
+    deleted = _delete_registrations(registrations, progress)
+    if len(deleted) < len(registrations):
+        raise RuntimeError(f"{len(registrations) - len(deleted)} registrations of event {event_id} could not be deleted")
+    rosters.delete(event_id)
+    return len(deleted)
+
+
+CASCADE_WORKERS = int(os.getenv('CASCADE_WORKERS', '8'))
+# Deletes between progress reports
+CASCADE_PROGRESS_STEP = BATCH_WRITE_LIMIT * CASCADE_WORKERS
+
+
+def _query_all(**params) -> List[dict]:
+    items = []
+    while True:
+        response = registrations_table.query(**params)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _delete_registrations(registrations: List[dict],
+                          progress: Optional[Callable[[int, int], None]] = None) -> List[dict]:
+    """Batch-delete registrations; returns the ones that were actually removed."""
+    deleted = []
+    for step in chunked(registrations, CASCADE_PROGRESS_STEP):
+        failed = batch_write(dynamodb, registrations_table_name, [
+            {'DeleteRequest': {'Key': {'eventId': reg['eventId'], 'userId': reg['userId']}}}
+            for reg in step
+        ], max_workers=CASCADE_WORKERS)
+        refused = {(req['DeleteRequest']['Key']['eventId'], req['DeleteRequest']['Key']['userId']) for req in failed}
+        deleted.extend(reg for reg in step if (reg['eventId'], reg['userId']) not in refused)
+        if progress:
+            progress(len(deleted), len(registrations))
+    return deleted
+
+
+def _release(event_id: str, registered: int, waitlisted: int):
+    # Writing the release promotes the waitlist; with stream-maintained counters the consumer does both
+    if streams.inline():
+        counters.adjust(event_id, registrations=-registered, waitlist=-waitlisted)
+
+
+def _fan_out(func: Callable, items: List):
+    if len(items) <= 1:
+        for item in items:
+            func(item)
+        return
+    with ThreadPoolExecutor(max_workers=min(CASCADE_WORKERS, len(items))) as executor:
+        list(executor.map(metrics.bind(func), items))
+
+
 # Registration operations
+MAX_REGISTRATION_ATTEMPTS = 6
+
+
+class _TransactionRetry(Exception):
+    """Raised when a registration transaction lost a race and should be retried."""
+
+
+class _GuardFailed(Exception):
+    """The counter (or event) guard of a registration transaction did not hold."""
+    def __init__(self, item: Optional[dict]):
+        self.item = item
+        super().__init__("Registration guard failed")
+
+
 def register_user(event_id: str, user_id: str) -> dict:
-    # Get event details
-    event_response = events_table.get_item(Key={'eventId': event_id})
-    event = event_response.get('Item')
+    """Register a user, or waitlist them once the event is full.
+
+    Each attempt is a single TransactWriteItems call: the user must exist,
+    a counter is bumped only while its guard holds, and the registration
+    is put only if absent. Nothing is read up front; on a cancelled
+    transaction the failure reasons say which check failed. High-demand
+    events claim seats on one of their counter shards instead of the
+    event item.
+    """
+    summary = summaries.load(event_id)
+    for attempt in range(MAX_REGISTRATION_ATTEMPTS):
+        now = datetime.utcnow().isoformat()
+        try:
+            shards = counters.known_shards(event_id)
+            if shards:
+                return _register_sharded(event_id, user_id, now, summary)
+            return _register_single(event_id, user_id, now, summary)
+        except counters.ShardingChanged:
+            continue
+        except _TransactionRetry:
+            backoff(attempt)
     
+    raise RuntimeError(f"Registration for event {event_id} did not settle after {MAX_REGISTRATION_ATTEMPTS} attempts")
+
+
+def _new_registration(event_id: str, user_id: str, status: str, now: str,
+                      summary: Optional[dict] = None) -> dict:
+    registration = {
+        'registrationId': f"{user_id}#{event_id}",
+        'eventId': event_id,
+        'userId': user_id,
+        'status': status,
+        'registeredAt': now
+    }
+    if summary:
+        registration['eventSummary'] = summary
+    if status == 'waitlisted':
+        registration['waitlistSeq'] = _next_waitlist_seq()
+    else:
+        registration['position'] = None
+    return registration
+
+
+def _registered_response(registration: dict) -> dict:
+    return {**registration, 'message': 'Successfully registered for event'}
+
+
+def _waitlisted_response(registration: dict) -> dict:
+    position = get_waitlist_position(registration['eventId'], registration['waitlistSeq'])
+    return {
+        **_public_registration(registration),
+        'position': position,
+        'message': f'Event is full. Added to waitlist at position {position}'
+    }
+
+
+def _register_single(event_id: str, user_id: str, now: str, summary: Optional[dict] = None) -> dict:
+    # Claim a seat while currentRegistrations < capacity
+    registration = _new_registration(event_id, user_id, 'registered', now, summary)
+    try:
+        _transact_register(registration, {
+            'TableName': events_table_name,
+            'Key': {'eventId': event_id},
+            'UpdateExpression': 'SET currentRegistrations = currentRegistrations + :inc ADD version :inc',
+            'ConditionExpression': (
+                'attribute_exists(eventId) AND attribute_not_exists(counterShards) '
+                'AND currentRegistrations < #capacity'
+            ),
+            'ExpressionAttributeNames': {'#capacity': 'capacity'},
+            'ExpressionAttributeValues': {':inc': 1}
+        })
+        return _registered_response(registration)
+    except _GuardFailed as e:
+        event = _check_event_guard(event_id, e.item)
+    
+    if not event.get('waitlistEnabled', False):
+        raise ValueError("Event is at capacity and has no waitlist")
+    
+    # Event is full: join the waitlist, unless a seat opened up in the meantime
+    registration = _new_registration(event_id, user_id, 'waitlisted', now, summary)
+    try:
+        _transact_register(registration, {
+            'TableName': events_table_name,
+            'Key': {'eventId': event_id},
+            'UpdateExpression': 'SET currentWaitlist = currentWaitlist + :inc ADD version :inc',
+            'ConditionExpression': (
+                'attribute_exists(eventId) AND attribute_not_exists(counterShards) '
+                'AND waitlistEnabled = :enabled AND currentRegistrations >= #capacity'
+            ),
+            'ExpressionAttributeNames': {'#capacity': 'capacity'},
+            'ExpressionAttributeValues': {':inc': 1, ':enabled': True}
+        })
+        return _waitlisted_response(registration)
+    except _GuardFailed as e:
+        event = _check_event_guard(event_id, e.item)
+    
+    if not event.get('waitlistEnabled', False) and event.get('currentRegistrations', 0) >= event.get('capacity', 0):
+        raise ValueError("Event is at capacity and has no waitlist")
+    raise _TransactionRetry()
+
+
+def _check_event_guard(event_id: str, event: Optional[dict]) -> dict:
+    """Make sense of a failed event guard: missing event, switched to shards, or full."""
+    if event is None:
+        event = get_event_item(event_id)
     if not event:
         raise ValueError("Event not found")
+    if event.get('counterShards'):
+        counters.remember(event_id, event['counterShards'])
+        raise counters.ShardingChanged()
+    return event
+
+
+def _register_sharded(event_id: str, user_id: str, now: str, summary: Optional[dict] = None) -> dict:
+    # Try a random shard first, then one that is known to have seats left
+    shard = random.randrange(counters.known_shards(event_id))
+    while shard is not None:
+        registration = _new_registration(event_id, user_id, 'registered', now, summary)
+        try:
+            _transact_register(registration, counters.seat_update(event_id, shard))
+            return _registered_response(registration)
+        except _GuardFailed as e:
+            if e.item is None:
+                # Shards are gone: the event is back on single-item counters
+                counters.remember(event_id, None)
+                raise counters.ShardingChanged()
+        shard = counters.find_open_shard(event_id)
     
-    # Check if user exists
-    user = get_user(user_id)
-    if not user:
+    # Every shard is full: waitlist, if the event allows it
+    registration = _new_registration(event_id, user_id, 'waitlisted', now, summary)
+    try:
+        _transact_register(
+            registration,
+            counters.waitlist_update(event_id, random.randrange(counters.known_shards(event_id) or 1)),
+            event_check={
+                'TableName': events_table_name,
+                'Key': {'eventId': event_id},
+                'ConditionExpression': 'attribute_exists(counterShards) AND waitlistEnabled = :enabled',
+                'ExpressionAttributeValues': {':enabled': True}
+            }
+        )
+    except _GuardFailed as e:
+        event = e.item if e.item is not None else get_event_item(event_id)
+        if not event:
+            raise ValueError("Event not found")
+        if not event.get('counterShards'):
+            counters.remember(event_id, None)
+            raise counters.ShardingChanged()
+        if not event.get('waitlistEnabled', False):
+            raise ValueError("Event is at capacity and has no waitlist")
+        # The shard vanished under us; start over
+        counters.remember(event_id, None)
+        raise counters.ShardingChanged()
+    
+    # A seat may have been released while every shard looked full
+    if counters.find_open_shard(event_id) is not None:
+        promote_from_waitlist(event_id)
+        promoted = get_registration(event_id, user_id)
+        if promoted and promoted['status'] == 'registered':
+            return _registered_response({**_public_registration(registration), **promoted})
+    return _waitlisted_response(registration)
+
+
+def _transact_register(registration: dict, counter_update: dict, event_check: Optional[dict] = None):
+    """Write a registration and its counter change atomically.
+
+    Raises _GuardFailed (carrying the guard item's old image) when only
+    the counter update or event check failed, so the caller can pick the
+    next path. Missing users and duplicates raise ValueError; transaction
+    conflicts raise _TransactionRetry.
+    """
+    event_id = registration['eventId']
+    user_id = registration['userId']
+    items = [
+        {'ConditionCheck': {
+            'TableName': users_table_name,
+            'Key': {'userId': user_id},
+            'ConditionExpression': 'attribute_exists(userId)'
+        }},
+        {'Update': {**counter_update, 'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'}}
+    ]
+    if event_check:
+        items.append({'ConditionCheck': {**event_check, 'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'}})
+    items.append({'Put': {
+        'TableName': registrations_table_name,
+        'Item': registration,
+        'ConditionExpression': 'attribute_not_exists(userId)',
+        'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+    }})
+    
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=items)
+        event_cache.invalidate(event_id)
+        if streams.inline():
+            rosters.add(registration, (get_user(user_id) or {}).get('name'))
+        return
+    except ClientError as e:
+        code = e.response['Error']['Code']
+        if code == 'TransactionConflictException':
+            raise _TransactionRetry()
+        if code != 'TransactionCanceledException':
+            raise
+        reasons = e.response.get('CancellationReasons', [])
+    
+    codes = [reason.get('Code') for reason in reasons]
+    if 'TransactionConflict' in codes or 'ThrottlingError' in codes:
+        raise _TransactionRetry()
+    if len(reasons) != len(items):
+        raise RuntimeError(f"Unexpected cancellation reasons for event {event_id}: {codes}")
+    
+    failed = [reason.get('Code') == 'ConditionalCheckFailed' for reason in reasons]
+    guard_reasons = reasons[1:-1]
+    guard_failed = any(failed[1:-1])
+    if guard_failed and event_check is None and counter_update['TableName'] == events_table_name:
+        # A missing event outranks the user and duplicate checks
+        if counters.old_image(reasons[1]) is None and not get_event_item(event_id):
+            raise ValueError("Event not found")
+    if failed[0]:
         raise ValueError("User not found")
+    if failed[-1]:
+        existing = counters.old_image(reasons[-1]) or get_registration(event_id, user_id)
+        if existing:
+            raise ValueError(f"User already {existing['status']} for this event")
+        raise _TransactionRetry()
+    if guard_failed:
+        # Prefer the event check's image, it carries the flags the caller needs
+        failed_guards = [reason for reason in guard_reasons if reason.get('Code') == 'ConditionalCheckFailed']
+        raise _GuardFailed(counters.old_image(failed_guards[-1]))
+    raise RuntimeError(f"Unexpected cancellation reasons for event {event_id}: {codes}")
+
+
+MAX_BULK_REGISTRATIONS = int(os.getenv('MAX_BULK_REGISTRATIONS', '2000'))
+TRANSACT_WRITE_LIMIT = 100
+
+
+def register_users_bulk(event_id: str, user_ids: List[str]) -> dict:
+    """Register a group of users with a single capacity reservation.
     
-    # Check if already registered
-    existing = get_registration(event_id, user_id)
-    if existing:
-        raise ValueError(f"User already {existing['status']} for this event")
+    Users and existing registrations are checked with BatchGetItem, seats
+    and waitlist places for the whole group are claimed in one counter
+    update (one per shard for high-demand events), and registrations are
+    written in conditional transactions of up to 100 puts. Seats go to
+    users in request order. Every user gets an outcome: registered,
+    waitlisted or rejected with the reason.
+    """
+    unique_ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+    if not get_event_item(event_id):
+        raise ValueError("Event not found")
+    
+    users = {item['userId']: item.get('name') for item in batch_get(
+        dynamodb, users_table_name, [{'userId': uid} for uid in unique_ids], projection=['userId', 'name']
+    )}
+    existing = {item['userId']: item['status'] for item in batch_get(
+        dynamodb, registrations_table_name,
+        [{'eventId': event_id, 'userId': uid} for uid in unique_ids if uid in users],
+        projection=['userId', 'status']
+    )}
     
-    # Check capacity
-    current_registrations = event.get('currentRegistrations', 0)
-    capacity = event.get('capacity', 0)
-    has_waitlist = event.get('waitlistEnabled', False)
+    outcomes = {}
+    for user_id in unique_ids:
+        if user_id not in users:
+            outcomes[user_id] = _rejected(event_id, user_id, "User not found")
+        elif user_id in existing:
+            outcomes[user_id] = _rejected(event_id, user_id, f"User already {existing[user_id]} for this event")
+    candidates = [uid for uid in unique_ids if uid not in outcomes]
     
-    registration_id = f"{user_id}#{event_id}"
+    seats, waitlist = _reserve_bulk(event_id, len(candidates)) if candidates else (0, 0)
     now = datetime.utcnow().isoformat()
+    summary = summaries.load(event_id)
+    registrations = [
+        _new_registration(event_id, user_id, 'registered' if i < seats else 'waitlisted', now, summary)
+        for i, user_id in enumerate(candidates[:seats + waitlist])
+    ]
+    for user_id in candidates[seats + waitlist:]:
+        outcomes[user_id] = _rejected(event_id, user_id, "Event is at capacity and has no waitlist")
+    
+    # Hand back counters for puts that lost a race with a single registration
+    failed = _put_registrations(registrations)
+    released = {'registered': 0, 'waitlisted': 0}
+    for registration, reason in failed:
+        released[registration['status']] += 1
+        outcomes[registration['userId']] = _rejected(event_id, registration['userId'], reason)
+    if streams.inline():
+        rosters.add_many(event_id, [reg for reg in registrations if reg['userId'] not in outcomes], users)
+    # Puts that failed left no record in the stream, so their seats are handed back here either way
+    counters.adjust(event_id, registrations=-released['registered'], waitlist=-released['waitlisted'])
     
-    if current_registrations < capacity:
-        # Register user
-        registration = {
-            'registrationId': registration_id,
-            'eventId': event_id,
-            'userId': user_id,
-            'status': 'registered',
-            'registeredAt': now,
-            'position': None
+    written = [reg for reg in registrations if reg['userId'] not in outcomes]
+    if released['registered']:
+        written = _refresh_statuses(event_id, written)
+    
+    position = None
+    for registration in written:
+        if registration['status'] == 'registered':
+            outcomes[registration['userId']] = _registered_response(registration)
+            continue
+        # Our waitlist entries were sequenced back to back, so one count places them all
+        position = position + 1 if position else get_waitlist_position(event_id, registration['waitlistSeq'])
+        outcomes[registration['userId']] = {
+            **_public_registration(registration),
+            'position': position,
+            'message': f'Event is full. Added to waitlist at position {position}'
         }
-        
-        registrations_table.put_item(Item=registration)
-        
-        # Update event registration count
-        events_table.update_item(
-            Key={'eventId': event_id},
-            UpdateExpression='SET currentRegistrations = currentRegistrations + :inc',
-            ExpressionAttributeValues={':inc': 1}
-        )
-        
-        return {**registration, 'message': 'Successfully registered for event'}
     
-    elif has_waitlist:
-        # Add to waitlist
-        current_waitlist = event.get('currentWaitlist', 0)
-        position = current_waitlist + 1
+    results = [outcomes[uid] for uid in unique_ids]
+    summary = {status: 0 for status in ('registered', 'waitlisted', 'rejected')}
+    for result in results:
+        summary[result['status']] += 1
+    return {'eventId': event_id, **summary, 'results': results}
+
+
+def _rejected(event_id: str, user_id: str, reason: str) -> dict:
+    return {'eventId': event_id, 'userId': user_id, 'status': 'rejected', 'message': reason}
+
+
+def _reserve_bulk(event_id: str, wanted: int) -> tuple:
+    """Claim seats, then waitlist places, for `wanted` users: (seats, waitlist places)."""
+    for attempt in range(MAX_REGISTRATION_ATTEMPTS):
+        event = get_event_item(event_id)
+        if not event:
+            raise ValueError("Event not found")
+        waitlist_enabled = event.get('waitlistEnabled', False)
         
-        registration = {
-            'registrationId': registration_id,
-            'eventId': event_id,
-            'userId': user_id,
-            'status': 'waitlisted',
-            'registeredAt': now,
-            'position': position
-        }
+        if event.get('counterShards'):
+            counters.remember(event_id, event['counterShards'])
+            try:
+                seats = counters.reserve_seats(event_id, wanted)
+            except counters.ShardingChanged:
+                continue
+            waitlist = wanted - seats if waitlist_enabled else 0
+            counters.adjust(event_id, waitlist=waitlist)
+            return seats, waitlist
         
-        registrations_table.put_item(Item=registration)
+        current = int(event.get('currentRegistrations', 0))
+        seats = max(0, min(wanted, int(event.get('capacity', 0)) - current))
+        waitlist = wanted - seats if waitlist_enabled else 0
+        if not seats and not waitlist:
+            return 0, 0
         
-        # Update event waitlist count
-        events_table.update_item(
-            Key={'eventId': event_id},
-            UpdateExpression='SET currentWaitlist = currentWaitlist + :inc',
-            ExpressionAttributeValues={':inc': 1}
+        # The counters must not have moved since the read, so the split stays exact
+        condition = (
+            'attribute_not_exists(counterShards) AND #capacity = :capacity '
+            'AND currentRegistrations = :seen'
         )
-        
-        return {**registration, 'message': f'Event is full. Added to waitlist at position {position}'}
+        values = {':seats': seats, ':waitlist': waitlist, ':capacity': event['capacity'], ':seen': current, ':one': 1}
+        if waitlist:
+            condition += ' AND waitlistEnabled = :enabled'
+            values[':enabled'] = True
+        try:
+            events_table.update_item(
+                Key={'eventId': event_id},
+                UpdateExpression=(
+                    'SET currentRegistrations = currentRegistrations + :seats, '
+                    'currentWaitlist = currentWaitlist + :waitlist ADD version :one'
+                ),
+                ConditionExpression=condition,
+                ExpressionAttributeNames={'#capacity': 'capacity'},
+                ExpressionAttributeValues=values
+            )
+            event_cache.invalidate(event_id)
+            return seats, waitlist
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            backoff(attempt)
     
-    else:
-        raise ValueError("Event is at capacity and has no waitlist")
+    raise RuntimeError(f"Bulk registration for event {event_id} did not settle after {MAX_REGISTRATION_ATTEMPTS} attempts")
+
+
+def _put_registrations(registrations: List[dict]) -> List[tuple]:
+    """Write registrations in conditional transactions; returns (registration, reason) for rejects."""
+    failed = []
+    for chunk in chunked(registrations, TRANSACT_WRITE_LIMIT):
+        attempt = 0
+        while chunk:
+            try:
+                dynamodb.meta.client.transact_write_items(TransactItems=[
+                    {'Put': {
+                        'TableName': registrations_table_name,
+                        'Item': registration,
+                        'ConditionExpression': 'attribute_not_exists(userId)',
+                        'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+                    }}
+                    for registration in chunk
+                ])
+                break
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                if code not in ('TransactionCanceledException', 'TransactionConflictException'):
+                    raise
+                reasons = e.response.get('CancellationReasons', [])
+            
+            # Drop the duplicates and retry the rest of the chunk
+            retry = []
+            for registration, reason in zip(chunk, reasons or [{}] * len(chunk)):
+                if reason.get('Code') == 'ConditionalCheckFailed':
+                    existing = counters.old_image(reason) or {}
+                    failed.append((registration, f"User already {existing.get('status', 'registered')} for this event"))
+                else:
+                    retry.append(registration)
+            if len(retry) == len(chunk):
+                if attempt >= MAX_REGISTRATION_ATTEMPTS:
+                    raise RuntimeError(f"Bulk registration writes for event {chunk[0]['eventId']} kept conflicting")
+                backoff(attempt)
+                attempt += 1
+            chunk = retry
+    return failed
+
+
+def _refresh_statuses(event_id: str, registrations: List[dict]) -> List[dict]:
+    # Promotions may have moved some of our waitlisted users onto a seat
+    current = {item['userId']: item for item in batch_get(
+        dynamodb, registrations_table_name,
+        [{'eventId': event_id, 'userId': reg['userId']} for reg in registrations if reg['status'] == 'waitlisted']
+    )}
+    return [current.get(reg['userId'], reg) for reg in registrations]
 
 
 def unregister_user(event_id: str, user_id: str) -> bool:
-    registration = get_registration(event_id, user_id)
-    
-    if not registration:
-        raise ValueError("User is not registered for this event")
-    
-    # Delete registration
-    registrations_table.delete_item(
-        Key={'eventId': event_id, 'userId': user_id}
-    )
-    
-    if registration['status'] == 'registered':
-        # Decrement registration count
-        events_table.update_item(
-            Key={'eventId': event_id},
-            UpdateExpression='SET currentRegistrations = currentRegistrations - :dec',
-            ExpressionAttributeValues={':dec': 1}
-        )
+    """Cancel a registration.
+
+    A registered user's seat goes straight to the head of the waitlist: the
+    delete and the promotion are one transaction that leaves the seat
+    count alone, so no concurrent registration can take the seat in
+    between. Only the caller whose delete actually removed the row adjusts
+    the counters.
+    """
+    for attempt in range(MAX_REGISTRATION_ATTEMPTS):
+        registration = get_registration(event_id, user_id)
+        if not registration:
+            raise ValueError("User is not registered for this event")
         
-        # Promote first waitlisted user
-        promote_from_waitlist(event_id)
+        # With stream-maintained counters the release is counted from the stream, which then promotes
+        if registration['status'] == 'registered' and streams.inline():
+            try:
+                if _hand_off_seat(event_id, user_id):
+                    return True
+            except _TransactionRetry:
+                backoff(attempt)
+                continue
+        
+        deleted = _delete_registration(event_id, user_id)
+        if streams.inline():
+            rosters.remove(event_id, user_id)
+            if deleted['status'] == 'registered':
+                # Fills the seat from the waitlist once written, in case someone joined since we looked
+                counters.adjust(event_id, registrations=-1)
+            else:
+                # Positions behind this one shift implicitly
+                counters.adjust(event_id, waitlist=-1)
+        return True
     
-    elif registration['status'] == 'waitlisted':
-        # Decrement waitlist count and update positions
-        events_table.update_item(
-            Key={'eventId': event_id},
-            UpdateExpression='SET currentWaitlist = currentWaitlist - :dec',
-            ExpressionAttributeValues={':dec': 1}
+    raise RuntimeError(f"Cancellation for event {event_id} did not settle after {MAX_REGISTRATION_ATTEMPTS} attempts")
+
+
+def _delete_registration(event_id: str, user_id: str) -> dict:
+    """Delete a registration if it is still there; returns the copy that was deleted."""
+    try:
+        response = registrations_table.delete_item(
+            Key={'eventId': event_id, 'userId': user_id},
+            ConditionExpression='attribute_exists(userId)',
+            ReturnValues='ALL_OLD'
         )
+        return response['Attributes']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            # A concurrent cancellation got there first
+            raise ValueError("User is not registered for this event")
+        raise
+
+
+def _hand_off_seat(event_id: str, user_id: str) -> bool:
+    """Delete a registered user and promote the waitlist head in one transaction.
+
+    Returns False when nobody is waiting.
+    """
+    for head in _waitlist_heads(event_id):
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=[
+                {'Delete': {
+                    'TableName': registrations_table_name,
+                    'Key': {'eventId': event_id, 'userId': user_id},
+                    'ConditionExpression': '#status = :registered',
+                    'ExpressionAttributeNames': {'#status': 'status'},
+                    'ExpressionAttributeValues': {':registered': 'registered'},
+                    'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+                }},
+                _promotion(event_id, head['userId'])
+            ])
+        except ClientError as e:
+            reasons = _cancellation_reasons(e)
+            if reasons[0].get('Code') == 'ConditionalCheckFailed':
+                if counters.old_image(reasons[0]) is None:
+                    raise ValueError("User is not registered for this event")
+                raise _TransactionRetry()
+            if reasons[1].get('Code') == 'ConditionalCheckFailed':
+                # Promoted or cancelled since the index was read
+                continue
+            raise _TransactionRetry()
         
-        # Update positions for remaining waitlisted users
-        update_waitlist_positions(event_id, registration.get('position', 0))
-    
-    return True
+        rosters.remove(event_id, user_id)
+        rosters.promote(event_id, head['userId'])
+        # The seat changed hands; only the waitlist shrank
+        counters.adjust(event_id, waitlist=-1)
+        return True
+    return False
 
 
-def promote_from_waitlist(event_id: str):
-    # Get first waitlisted user
-    response = registrations_table.query(
-        KeyConditionExpression='eventId = :eid',
-        FilterExpression='#status = :status',
-        ExpressionAttributeNames={'#status': 'status'},
-        ExpressionAttributeValues={':eid': event_id, ':status': 'waitlisted'}
-    )
-    
-    waitlisted = response.get('Items', [])
-    if not waitlisted:
-        return
-    
-    # Sort by position
-    waitlisted.sort(key=lambda x: x.get('position', 999))
-    first_user = waitlisted[0]
-    
-    # Update to registered
-    registrations_table.update_item(
-        Key={'eventId': event_id, 'userId': first_user['userId']},
-        UpdateExpression='SET #status = :status, #position = :pos',
-        ExpressionAttributeNames={'#status': 'status', '#position': 'position'},
-        ExpressionAttributeValues={':status': 'registered', ':pos': None}
-    )
-    
-    # Update counts
-    events_table.update_item(
-        Key={'eventId': event_id},
-        UpdateExpression='SET currentRegistrations = currentRegistrations + :inc, currentWaitlist = currentWaitlist - :dec',
-        ExpressionAttributeValues={':inc': 1, ':dec': 1}
-    )
+def promote_from_waitlist(event_id: str) -> bool:
+    """Move the head of the waitlist onto a free seat; returns whether anyone was promoted.
+
+    The promotion claims its seat in the same transaction, under the same
+    guard as a registration, so it never takes a seat that a concurrent
+    registration already holds.
+    """
+    for attempt in range(MAX_REGISTRATION_ATTEMPTS):
+        try:
+            for head in _waitlist_heads(event_id):
+                seat = _seat_claim(event_id)
+                if seat is None:
+                    return False
+                try:
+                    dynamodb.meta.client.transact_write_items(TransactItems=[
+                        _promotion(event_id, head['userId']),
+                        {'Update': {**seat, 'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'}}
+                    ])
+                except ClientError as e:
+                    reasons = _cancellation_reasons(e)
+                    if reasons[1].get('Code') == 'ConditionalCheckFailed':
+                        if _another_seat(event_id, seat, counters.old_image(reasons[1])):
+                            raise _TransactionRetry()
+                        return False
+                    if reasons[0].get('Code') == 'ConditionalCheckFailed':
+                        continue
+                    raise _TransactionRetry()
+                
+                event_cache.invalidate(event_id)
+                if streams.inline():
+                    rosters.promote(event_id, head['userId'])
+                    counters.adjust(event_id, waitlist=-1)
+                return True
+            return False
+        except (_TransactionRetry, counters.ShardingChanged):
+            backoff(attempt)
     
-    # Update remaining waitlist positions
-    update_waitlist_positions(event_id, first_user.get('position', 1))
+    raise RuntimeError(f"Promotion for event {event_id} did not settle after {MAX_REGISTRATION_ATTEMPTS} attempts")
 
 
-def update_waitlist_positions(event_id: str, removed_position: int):
-    response = registrations_table.query(
-        KeyConditionExpression='eventId = :eid',
-        FilterExpression='#status = :status AND #position > :pos',
-        ExpressionAttributeNames={'#status': 'status', '#position': 'position'},
-        ExpressionAttributeValues={':eid': event_id, ':status': 'waitlisted', ':pos': removed_position}
-    )
-    
-    for item in response.get('Items', []):
+def _waitlist_heads(event_id: str) -> Iterator[dict]:
+    """Waitlisted registrations in waitlist order, read lazily from the sparse index."""
+    params = {
+        'IndexName': waitlist_index_name,
+        'KeyConditionExpression': 'eventId = :eid',
+        'ExpressionAttributeValues': {':eid': event_id},
+        'Limit': 1
+    }
+    while True:
+        response = registrations_table.query(**params)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _promotion(event_id: str, user_id: str) -> dict:
+    # Dropping waitlistSeq takes the registration out of the sparse index
+    return {'Update': {
+        'TableName': registrations_table_name,
+        'Key': {'eventId': event_id, 'userId': user_id},
+        'UpdateExpression': 'SET #status = :registered REMOVE waitlistSeq, #position',
+        'ConditionExpression': '#status = :waitlisted',
+        'ExpressionAttributeNames': {'#status': 'status', '#position': 'position'},
+        'ExpressionAttributeValues': {':registered': 'registered', ':waitlisted': 'waitlisted'}
+    }}
+
+
+def _seat_claim(event_id: str) -> Optional[dict]:
+    """The counter update that claims one seat, or None if a sharded event has none left."""
+    if counters.known_shards(event_id):
+        shard = counters.find_open_shard(event_id)
+        return counters.seat_update(event_id, shard) if shard is not None else None
+    return {
+        'TableName': events_table_name,
+        'Key': {'eventId': event_id},
+        'UpdateExpression': 'SET currentRegistrations = currentRegistrations + :inc ADD version :inc',
+        'ConditionExpression': (
+            'attribute_exists(eventId) AND attribute_not_exists(counterShards) '
+            'AND currentRegistrations < #capacity'
+        ),
+        'ExpressionAttributeNames': {'#capacity': 'capacity'},
+        'ExpressionAttributeValues': {':inc': 1}
+    }
+
+
+def _another_seat(event_id: str, seat: dict, item: Optional[dict]) -> bool:
+    """Make sense of a failed seat claim; returns whether another seat is worth trying.
+
+    Raises ShardingChanged when the event switched counter representation.
+    """
+    if seat['TableName'] == counters.counters_table_name:
+        if item is None:
+            # Shards are gone: the event is back on single-item counters
+            counters.remember(event_id, None)
+            raise counters.ShardingChanged()
+        # That shard filled up; another may still have room
+        return True
+    if item and item.get('counterShards'):
+        counters.remember(event_id, item['counterShards'])
+        raise counters.ShardingChanged()
+    # Full, or the event is gone
+    return False
+
+
+def _cancellation_reasons(error: ClientError) -> List[dict]:
+    """Per-item reasons of a cancelled transaction; other errors are re-raised."""
+    code = error.response['Error']['Code']
+    if code == 'TransactionConflictException':
+        raise _TransactionRetry()
+    if code != 'TransactionCanceledException':
+        raise error
+    return error.response.get('CancellationReasons') or [{}, {}]
+
+
+def get_event_item(event_id: str) -> Optional[dict]:
+    # Always a strong read: it explains why a transaction guard just failed
+    try:
+        response = events_table.get_item(Key={'eventId': event_id}, ConsistentRead=True)
+        return response.get('Item')
+    except ClientError:
+        return None
+
+
+def get_waitlist_position(event_id: str, waitlist_seq: int) -> int:
+    """1-based waitlist position, counted from the sparse index (reads only, no writes).
+
+    Only the entries ahead are counted: the GSI is eventually consistent and
+    may not hold the caller's own entry yet.
+    """
+    position = 1
+    params = {
+        'IndexName': waitlist_index_name,
+        'KeyConditionExpression': 'eventId = :eid AND waitlistSeq < :seq',
+        'ExpressionAttributeValues': {':eid': event_id, ':seq': waitlist_seq},
+        'Select': 'COUNT'
+    }
+    while True:
+        response = registrations_reader.query(**params)
+        position += response.get('Count', 0)
+        if 'LastEvaluatedKey' not in response:
+            return position
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _public_registration(registration: dict) -> dict:
+    return {k: v for k, v in registration.items() if k not in ('waitlistSeq', 'eventSummary')}
+
+
+def backfill_waitlist_seq(event_id: str) -> int:
+    """One-off migration for waitlists written with stored positions.
+
+    Assigns waitlistSeq in existing position order so the rows appear in
+    the waitlist index. Returns the number of rows migrated.
+    """
+    legacy = [
+        item for item in get_event_registrations(event_id)['waitlisted']
+        if 'waitlistSeq' not in item
+    ]
+    for item in legacy:
         registrations_table.update_item(
             Key={'eventId': event_id, 'userId': item['userId']},
-            UpdateExpression='SET #position = #position - :dec',
+            UpdateExpression='SET waitlistSeq = :seq REMOVE #position',
             ExpressionAttributeNames={'#position': 'position'},
-            ExpressionAttributeValues={':dec': 1}
+            ExpressionAttributeValues={':seq': _next_waitlist_seq()}
         )
+    return len(legacy)
 
 
 def get_registration(event_id: str, user_id: str) -> Optional[dict]:
@@ -264,29 +957,52 @@ def get_registration(event_id: str, user_id: str) -> Optional[dict]:
 
 def get_user_registrations(user_id: str) -> List[dict]:
     try:
-        response = registrations_table.query(
-            IndexName='userId-index',
-            KeyConditionExpression='userId = :uid',
-            ExpressionAttributeValues={':uid': user_id}
-        )
-        return response.get('Items', [])
+        items = []
+        params = {
+            'IndexName': 'userId-index',
+            'KeyConditionExpression': 'userId = :uid',
+            'ExpressionAttributeValues': {':uid': user_id}
+        }
+        while True:
+            response = registrations_reader.query(**params)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        
+        # Derive waitlist positions for the (usually few) waitlisted entries.
+        # eventSummary stays on the rows: callers embed it instead of reading the events
+        for item in items:
+            if 'waitlistSeq' in item:
+                item['position'] = get_waitlist_position(item['eventId'], item.pop('waitlistSeq'))
+        return items
     except ClientError:
         return []
 
 
 def get_event_registrations(event_id: str) -> Dict[str, List[dict]]:
     try:
-        response = registrations_table.query(
-            KeyConditionExpression='eventId = :eid',
-            ExpressionAttributeValues={':eid': event_id}
-        )
+        items = []
+        params = {
+            'KeyConditionExpression': 'eventId = :eid',
+            'ExpressionAttributeValues': {':eid': event_id}
+        }
+        while True:
+            response = registrations_reader.query(**params)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
         
-        items = response.get('Items', [])
-        registered = [item for item in items if item['status'] == 'registered']
+        registered = [_public_registration(item) for item in items if item['status'] == 'registered']
         waitlisted = [item for item in items if item['status'] == 'waitlisted']
         
-        # Sort waitlist by position
-        waitlisted.sort(key=lambda x: x.get('position', 999))
+        # Order the waitlist by sequence (stored position for unmigrated rows) and number it
+        waitlisted.sort(key=lambda x: (x.get('waitlistSeq', 0), x.get('position') or 0))
+        waitlisted = [
+            {**_public_registration(item), 'position': position}
+            for position, item in enumerate(waitlisted, start=1)
+        ]
         
         return {
             'registered': registered,
@@ -294,3 +1010,54 @@ def get_event_registrations(event_id: str) -> Dict[str, List[dict]]:
         }
     except ClientError:
         return {'registered': [], 'waitlisted': []}
+
+
+# Rebuilds of a drifted roster, per event, are spaced at least this far apart
+ROSTER_REBUILD_INTERVAL = float(os.getenv('ROSTER_REBUILD_INTERVAL', '30'))
+_roster_rebuilt: Dict[str, float] = {}
+
+
+def _roster_matches(roster: dict, event: dict) -> bool:
+    return (
+        len(roster['registered']) == int(event.get('currentRegistrations', 0))
+        and len(roster['waitlisted']) == int(event.get('currentWaitlist', 0))
+    )
+
+
+def get_event_roster(event: dict) -> Dict[str, List[dict]]:
+    """Attendee lists for an event, with user names, from its materialized roster.
+
+    A roster that is missing, or disagrees with the event's counters even
+    after a strong re-read, is rebuilt from the registrations (at most once
+    per ROSTER_REBUILD_INTERVAL per process); those calls answer from the
+    registrations directly.
+    """
+    event_id = event['eventId']
+    roster = rosters.load(event_id)
+    if roster is not None:
+        if _roster_matches(roster, event):
+            return roster
+        # The caller's copy of the event may be cached; only a strong read settles it
+        current = counters.apply_aggregate(get_event_item(event_id))
+        if current and _roster_matches(roster, current):
+            return roster
+    
+    live = get_event_registrations(event_id)
+    users = get_users_batch(reg['userId'] for reg in live['registered'] + live['waitlisted'])
+    names = {user_id: user.get('name') for user_id, user in users.items()}
+    
+    now = time.monotonic()
+    if now - _roster_rebuilt.get(event_id, float('-inf')) >= ROSTER_REBUILD_INTERVAL:
+        _roster_rebuilt[event_id] = now
+        try:
+            rosters.rebuild(event_id, int(event.get('capacity', 0)), live['registered'], live['waitlisted'], names)
+        except ClientError as e:
+            logger.warning(f"Rebuilding the roster of event {event_id} failed: {e}")
+    
+    return {
+        status: [
+            {**reg, 'user': {'userId': reg['userId'], 'name': names[reg['userId']]}}
+            for reg in live[status] if reg['userId'] in names
+        ]
+        for status in ('registered', 'waitlisted')
+    }
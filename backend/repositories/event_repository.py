@@ -1,79 +1,58 @@
-import boto3
 from botocore.exceptions import ClientError
 import os
-from typing import List, Optional
-import uuid
+from typing import Dict, Iterable, Iterator, List, Optional
+from common import aws
+import counters
+import database
+from common.cache import event_cache
+from common.scan import DEFAULT_SEGMENTS, scan_items
 
 
 class EventRepository:
     def __init__(self):
-        dynamodb = boto3.resource('dynamodb')
-        table_name = os.getenv('DYNAMODB_TABLE_NAME', 'Events')
-        self.table = dynamodb.Table(table_name)
+        self.dynamodb = aws.dynamodb
+        self.table_name = os.getenv('DYNAMODB_TABLE_NAME', 'Events')
+        self.table = aws.table(self.table_name)
+        self.batch_workers = int(os.getenv('BATCH_GET_WORKERS', '4'))
     
     def create(self, event_data: dict) -> dict:
-        if 'eventId' not in event_data or not event_data['eventId']:
-            event_data['eventId'] = str(uuid.uuid4())
-        
-        # Initialize registration fields
-        if 'currentRegistrations' not in event_data:
-            event_data['currentRegistrations'] = 0
-        if 'currentWaitlist' not in event_data:
-            event_data['currentWaitlist'] = 0
-        if 'waitlistEnabled' not in event_data:
-            event_data['waitlistEnabled'] = False
-        
-        self.table.put_item(Item=event_data)
-        return event_data
+        # One write path, so counter shards, rosters and the search index are set up too
+        return database.create_event(event_data)
     
-    def get_by_id(self, event_id: str) -> Optional[dict]:
+    def get_by_id(self, event_id: str, consistent: bool = False) -> Optional[dict]:
+        def load():
+            response = self.table.get_item(Key={'eventId': event_id}, ConsistentRead=consistent)
+            return counters.apply_aggregate(response.get('Item'))
+        
         try:
-            response = self.table.get_item(Key={'eventId': event_id})
-            return response.get('Item')
+            return event_cache.get_or_load(event_id, load, consistent=consistent)
         except ClientError:
             return None
     
-    def get_all(self) -> List[dict]:
+    def get_many(self, event_ids: Iterable[str], attributes: Optional[List[str]] = None) -> Dict[str, dict]:
+        return database.get_events_batch(event_ids, attributes, max_workers=self.batch_workers)
+    
+    def get_all(self, segments: int = DEFAULT_SEGMENTS, attributes: Optional[List[str]] = None) -> List[dict]:
         try:
-            response = self.table.scan()
-            return response.get('Items', [])
+            return list(self.iter_all(segments=segments, attributes=attributes))
         except ClientError:
             return []
     
+    def iter_all(self, segments: int = 1, attributes: Optional[List[str]] = None) -> Iterator[dict]:
+        projection = list(dict.fromkeys(['eventId', *attributes])) if attributes else None
+        for item in scan_items(self.table, segments=segments, projection=projection):
+            yield counters.apply_aggregate(item)
+    
     def update(self, event_id: str, update_data: dict) -> Optional[dict]:
-        update_expr = "SET " + ", ".join([f"#{k} = :{k}" for k in update_data.keys()])
-        expr_attr_names = {f"#{k}": k for k in update_data.keys()}
-        expr_attr_values = {f":{k}": v for k, v in update_data.items()}
-        
-        try:
-            response = self.table.update_item(
-                Key={'eventId': event_id},
-                UpdateExpression=update_expr,
-                ExpressionAttributeNames=expr_attr_names,
-                ExpressionAttributeValues=expr_attr_values,
-                ReturnValues="ALL_NEW"
-            )
-            return response.get('Attributes')
-        except ClientError:
-            return None
+        return database.update_event(event_id, update_data)
     
     def delete(self, event_id: str) -> bool:
-        try:
-            self.table.delete_item(Key={'eventId': event_id})
-            return True
-        except ClientError:
-            return False
+        # Counter shards, rosters, registrations and the search entry go with it
+        return database.delete_event(event_id)
     
     def increment_registrations(self, event_id: str, amount: int = 1):
-        self.table.update_item(
-            Key={'eventId': event_id},
-            UpdateExpression='SET currentRegistrations = currentRegistrations + :inc',
-            ExpressionAttributeValues={':inc': amount}
-        )
+        # Routed to the counter shards when the event is flagged high-demand
+        counters.adjust(event_id, registrations=amount)
     
     def increment_waitlist(self, event_id: str, amount: int = 1):
-        self.table.update_item(
-            Key={'eventId': event_id},
-            UpdateExpression='SET currentWaitlist = currentWaitlist + :inc',
-            ExpressionAttributeValues={':inc': amount}
-        )
+        counters.adjust(event_id, waitlist=amount)
@@ -0,0 +1,282 @@
+"""Materialized event rosters.
+
+Each event's attendee list is kept in the rosters table as a few chunk
+items (eventId, chunk), so reading a roster is one Query however many
+people registered. Users are spread over the event's `rosterChunks` items
+by a hash of their userId, and each chunk holds two maps keyed by userId
+with compact entries that carry the user's name:
+
+    registered: {userId: {"n": name, "at": registeredAt}}
+    waitlisted: {userId: {"n": name, "at": registeredAt, "seq": waitlistSeq}}
+
+Writers set and remove single map entries, so concurrent changes to the
+same chunk never overwrite each other. They only touch chunks that already
+exist: an event without chunk items has no materialized roster yet, and
+`rebuild` creates one from the registrations table.
+"""
+from botocore.exceptions import ClientError
+import logging
+import math
+import os
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional
+from common import aws, codec
+from common.batch import batch_write, chunked
+
+logger = logging.getLogger(__name__)
+
+dynamodb = aws.dynamodb
+events_table_name = os.getenv('DYNAMODB_TABLE_NAME', 'Events')
+rosters_table_name = os.getenv('ROSTERS_TABLE_NAME', 'Rosters')
+
+events_table = aws.table(events_table_name)
+rosters_table = aws.table(rosters_table_name)
+events_reader = codec.reader(events_table_name, events_table)
+rosters_reader = codec.reader(rosters_table_name, rosters_table)
+
+# Entries per chunk to plan for; about 100 bytes each keeps chunks far below the 400 KB item limit
+ROSTER_CHUNK_ENTRIES = int(os.getenv('ROSTER_CHUNK_ENTRIES', '2000'))
+MAX_ROSTER_CHUNKS = 64
+# Map entries set by one UpdateItem in bulk writes
+UPDATE_BATCH = 50
+
+# Chunk counts this process has seen, so writers skip the event lookup
+_known_chunks: Dict[str, int] = {}
+_known_lock = threading.Lock()
+
+
+def chunk_count(capacity: int, waitlisted: int = 0) -> int:
+    """Chunks for an event: room for a full house and an equally long waitlist."""
+    wanted = max(int(capacity) * 2, int(capacity) + int(waitlisted))
+    return max(1, min(math.ceil(wanted / ROSTER_CHUNK_ENTRIES), MAX_ROSTER_CHUNKS))
+
+
+def chunk_of(user_id: str, chunks: int) -> int:
+    return zlib.crc32(user_id.encode()) % chunks
+
+
+def remember(event_id: str, chunks: Optional[int]):
+    with _known_lock:
+        if chunks:
+            _known_chunks[event_id] = int(chunks)
+        else:
+            _known_chunks.pop(event_id, None)
+
+
+def chunks_for(event_id: str) -> Optional[int]:
+    """The event's chunk count, or None if its roster is not materialized."""
+    chunks = _known_chunks.get(event_id)
+    if chunks:
+        return chunks
+    try:
+        item = events_reader.get_item(
+            Key={'eventId': event_id}, ProjectionExpression='rosterChunks'
+        ).get('Item') or {}
+    except ClientError as e:
+        logger.warning(f"Could not look up the roster of event {event_id}: {e}")
+        return None
+    chunks = item.get('rosterChunks')
+    if chunks:
+        remember(event_id, chunks)
+    return chunks
+
+
+def create(chunks_by_event: Dict[str, int]):
+    """Write empty chunk items for new events (whose items carry `rosterChunks`)."""
+    batch_write(dynamodb, rosters_table_name, [
+        {'PutRequest': {'Item': {'eventId': event_id, 'chunk': chunk, 'registered': {}, 'waitlisted': {}}}}
+        for event_id, chunks in chunks_by_event.items()
+        for chunk in range(chunks)
+    ])
+    for event_id, chunks in chunks_by_event.items():
+        remember(event_id, chunks)
+
+
+def _entry(registration: dict, name: Optional[str]) -> dict:
+    entry = {'n': name or '', 'at': registration['registeredAt']}
+    if registration['status'] == 'waitlisted':
+        # Unmigrated rows only have their stored position, which sorts ahead of any sequence number
+        entry['seq'] = registration.get('waitlistSeq', registration.get('position') or 0)
+    return entry
+
+
+def _update(event_id: str, chunk: int, expression: str, names: dict, values: Optional[dict] = None,
+            condition: str = 'attribute_exists(eventId)') -> bool:
+    """One roster write. Failures are logged, not raised: the registration itself already happened."""
+    params = {
+        'Key': {'eventId': event_id, 'chunk': chunk},
+        'UpdateExpression': expression,
+        'ConditionExpression': condition,
+        'ExpressionAttributeNames': names
+    }
+    if values:
+        params['ExpressionAttributeValues'] = values
+    try:
+        rosters_table.update_item(**params)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            logger.warning(f"Roster update for event {event_id} failed: {e}")
+        return False
+
+
+def add(registration: dict, name: Optional[str]):
+    """Record a new registration (or a status change) in the event's roster."""
+    event_id = registration['eventId']
+    chunks = chunks_for(event_id)
+    if not chunks:
+        return
+    status, other = ('registered', 'waitlisted') if registration['status'] == 'registered' else ('waitlisted', 'registered')
+    _update(
+        event_id, chunk_of(registration['userId'], chunks),
+        'SET #status.#u = :entry REMOVE #other.#u',
+        {'#status': status, '#other': other, '#u': registration['userId']},
+        {':entry': _entry(registration, name)}
+    )
+
+
+def add_many(event_id: str, registrations: List[dict], names: Dict[str, Optional[str]]):
+    """Record a group of new registrations, several entries per UpdateItem."""
+    chunks = chunks_for(event_id)
+    if not chunks or not registrations:
+        return
+    by_chunk: Dict[int, List[dict]] = {}
+    for registration in registrations:
+        by_chunk.setdefault(chunk_of(registration['userId'], chunks), []).append(registration)
+    for chunk, members in by_chunk.items():
+        for group in chunked(members, UPDATE_BATCH):
+            names_map = {f'#u{i}': reg['userId'] for i, reg in enumerate(group)}
+            names_map.update({f"#{reg['status']}": reg['status'] for reg in group})
+            _update(
+                event_id, chunk,
+                'SET ' + ', '.join(f"#{reg['status']}.#u{i} = :e{i}" for i, reg in enumerate(group)),
+                names_map,
+                {f':e{i}': _entry(reg, names.get(reg['userId'])) for i, reg in enumerate(group)}
+            )
+
+
+def promote(event_id: str, user_id: str):
+    """Move a user's entry from the waitlist to the registered list."""
+    chunks = chunks_for(event_id)
+    if not chunks:
+        return
+    _update(
+        event_id, chunk_of(user_id, chunks),
+        'SET #registered.#u = #waitlisted.#u REMOVE #waitlisted.#u',
+        {'#registered': 'registered', '#waitlisted': 'waitlisted', '#u': user_id},
+        condition='attribute_exists(#waitlisted.#u)'
+    )
+
+
+def remove(event_id: str, user_id: str):
+    chunks = chunks_for(event_id)
+    if not chunks:
+        return
+    _update(
+        event_id, chunk_of(user_id, chunks),
+        'REMOVE #registered.#u, #waitlisted.#u',
+        {'#registered': 'registered', '#waitlisted': 'waitlisted', '#u': user_id}
+    )
+
+
+def rename(user_id: str, name: str, event_ids: Iterable[str]):
+    """Refresh a user's denormalized name in the rosters of the given events."""
+    for event_id in event_ids:
+        chunks = chunks_for(event_id)
+        if not chunks:
+            continue
+        for status in ('registered', 'waitlisted'):
+            if _update(
+                event_id, chunk_of(user_id, chunks),
+                'SET #status.#u.#name = :name',
+                {'#status': status, '#u': user_id, '#name': 'n'},
+                {':name': name},
+                condition='attribute_exists(#status.#u)'
+            ):
+                break
+
+
+def delete(event_id: str):
+    """Remove an event's roster chunks."""
+    response = rosters_reader.query(
+        KeyConditionExpression='eventId = :eid',
+        ExpressionAttributeValues={':eid': event_id},
+        ProjectionExpression='eventId, chunk'
+    )
+    batch_write(dynamodb, rosters_table_name, [
+        {'DeleteRequest': {'Key': {'eventId': event_id, 'chunk': item['chunk']}}}
+        for item in response.get('Items', [])
+    ])
+    remember(event_id, None)
+
+
+def load(event_id: str) -> Optional[Dict[str, List[dict]]]:
+    """The event's roster in response shape, or None if it is not materialized.
+
+    Registered entries come back ordered by userId, as a registrations
+    query returns them; the waitlist in join order with 1-based positions.
+    """
+    params = {'KeyConditionExpression': 'eventId = :eid', 'ExpressionAttributeValues': {':eid': event_id}}
+    registered: Dict[str, dict] = {}
+    waitlisted: Dict[str, dict] = {}
+    found = False
+    while True:
+        response = rosters_reader.query(**params)
+        for item in response.get('Items', []):
+            found = True
+            registered.update(item.get('registered') or {})
+            waitlisted.update(item.get('waitlisted') or {})
+        if 'LastEvaluatedKey' not in response:
+            break
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    if not found:
+        return None
+
+    def expand(user_id: str, entry: dict, status: str, position: Optional[int]) -> dict:
+        return {
+            'registrationId': f"{user_id}#{event_id}",
+            'eventId': event_id,
+            'userId': user_id,
+            'status': status,
+            'registeredAt': entry['at'],
+            'position': position,
+            'user': {'userId': user_id, 'name': entry['n']}
+        }
+
+    return {
+        'registered': [
+            expand(uid, entry, 'registered', None)
+            for uid, entry in sorted(registered.items())
+        ],
+        'waitlisted': [
+            expand(uid, entry, 'waitlisted', position)
+            for position, (uid, entry) in enumerate(
+                sorted(waitlisted.items(), key=lambda kv: (int(kv[1].get('seq', 0)), kv[0])), start=1
+            )
+        ]
+    }
+
+
+def rebuild(event_id: str, capacity: int, registered: List[dict], waitlisted: List[dict],
+            names: Dict[str, Optional[str]]) -> int:
+    """Rewrite an event's roster from its registrations. Returns the chunk count used.
+
+    The chunk count never shrinks, so processes still using an older,
+    smaller count keep writing to chunks that exist.
+    """
+    chunks = max(chunk_count(capacity, len(waitlisted)), chunks_for(event_id) or 0)
+    items = [{'eventId': event_id, 'chunk': chunk, 'registered': {}, 'waitlisted': {}} for chunk in range(chunks)]
+    for status, registrations in (('registered', registered), ('waitlisted', waitlisted)):
+        for registration in registrations:
+            entry = _entry({**registration, 'status': status}, names.get(registration['userId']))
+            items[chunk_of(registration['userId'], chunks)][status][registration['userId']] = entry
+    batch_write(dynamodb, rosters_table_name, [{'PutRequest': {'Item': item}} for item in items])
+    events_table.update_item(
+        Key={'eventId': event_id},
+        UpdateExpression='SET rosterChunks = :chunks',
+        ConditionExpression='attribute_exists(eventId) AND (attribute_not_exists(rosterChunks) OR rosterChunks <= :chunks)',
+        ExpressionAttributeValues={':chunks': chunks}
+    )
+    remember(event_id, chunks)
+    return chunks
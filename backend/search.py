@@ -0,0 +1,230 @@
+"""Event search postings.
+
+Free-text search is served from the search terms table. For every prefix
+(up to SEARCH_PREFIX_LENGTH characters) of every title and description
+word, an event has one posting item, keyed by the prefix and sorted by
+date:
+
+    term (HASH) | dateKey = "<date>#<eventId>" (RANGE) | eventId, date, organizer, location, status
+
+A query term is then one Query on its prefix's partition, already in date
+order, with the date range as key condition and the other filters
+applied to the posting. Terms longer than the prefix length are looked up
+by their prefix. Callers fetch the events and re-check them with
+`matches`, so a posting that has not caught up with a write never returns
+an event that does not match.
+
+Postings are written with the events: on the request path, or by the
+stream consumer with DERIVED_VIEWS=stream. Searches never build anything.
+Events written before the table existed are posted once with
+`python -m search --backfill`.
+"""
+import argparse
+import logging
+import os
+import re
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+from common import aws, codec
+from common.batch import batch_write
+
+logger = logging.getLogger(__name__)
+
+dynamodb = aws.dynamodb
+terms_table_name = os.getenv('SEARCH_TERMS_TABLE_NAME', 'SearchTerms')
+terms_table = aws.table(terms_table_name)
+terms_reader = codec.reader(terms_table_name, terms_table)
+# KEYS_ONLY GSI (eventId): the postings of one event, to replace them
+event_index_name = os.getenv('SEARCH_TERMS_EVENT_INDEX_NAME', 'eventId-index')
+
+SEARCH_PREFIX_LENGTH = int(os.getenv('SEARCH_PREFIX_LENGTH', '8'))
+INDEXED_FIELDS = ('eventId', 'title', 'description', 'date', 'organizer', 'location', 'status')
+TEXT_FIELDS = ('title', 'description')
+# Exact-match filters; dateFrom/dateTo bound the date inclusively
+FILTER_FIELDS = ('organizer', 'location', 'status')
+# As validated by models.Event
+EVENT_STATUSES = ('draft', 'published', 'cancelled', 'completed', 'active')
+
+_WORD = re.compile(r'\w+')
+# Sorts after any "<date>#<eventId>" with the same date
+_DATE_END = '#\uffff'
+
+
+def tokens(text: Optional[str]) -> Set[str]:
+    return set(_WORD.findall(text.lower())) if text else set()
+
+
+def terms(query: Optional[str]) -> List[str]:
+    """Search terms of a free-text query; each must prefix a word of the title or description."""
+    return sorted(tokens(query))
+
+
+def _text_tokens(event: dict) -> Set[str]:
+    return set().union(*(tokens(event.get(field)) for field in TEXT_FIELDS))
+
+
+def _in_range(date: str, criteria: dict) -> bool:
+    if criteria.get('dateFrom') and date < criteria['dateFrom']:
+        return False
+    if criteria.get('dateTo') and date > criteria['dateTo']:
+        return False
+    return True
+
+
+def matches(event: dict, query_terms: List[str], criteria: dict) -> bool:
+    """Whether a stored event satisfies the search, checked on the item itself."""
+    for field in FILTER_FIELDS:
+        if criteria.get(field) and event.get(field) != criteria[field]:
+            return False
+    if not _in_range(event.get('date', ''), criteria):
+        return False
+    words = _text_tokens(event) if query_terms else set()
+    return all(any(word.startswith(term) for word in words) for term in query_terms)
+
+
+def date_key(date: Optional[str], event_id: str) -> str:
+    return f"{date or ''}#{event_id}"
+
+
+def postings(event: dict) -> List[dict]:
+    """The posting items an event should have."""
+    prefixes = {word[:length] for word in _text_tokens(event) for length in range(1, SEARCH_PREFIX_LENGTH + 1)}
+    fields = {field: event[field] for field in ('eventId', 'date', *FILTER_FIELDS) if event.get(field) is not None}
+    key = date_key(event.get('date'), event['eventId'])
+    return [{'term': prefix, 'dateKey': key, **fields} for prefix in sorted(prefixes)]
+
+
+def index_events(events: Iterable[dict]):
+    """Post events that have no postings yet (new ones)."""
+    _write([], [item for event in events for item in postings(event)])
+
+
+def index_event(event: dict):
+    """Post an updated event, replacing whatever its earlier version posted."""
+    _write(_posted_keys(event['eventId']), postings(event))
+
+
+def reindex(before: Optional[dict], after: Optional[dict]):
+    """Apply the change between two images of an event, as stream records carry them."""
+    if before and after and all(before.get(field) == after.get(field) for field in INDEXED_FIELDS):
+        return
+    old = [(item['term'], item['dateKey']) for item in postings(before)] if before else []
+    _write(old, postings(after) if after else [])
+
+
+def remove_event(event_id: str):
+    _write(_posted_keys(event_id), [])
+
+
+def _posted_keys(event_id: str) -> List[Tuple[str, str]]:
+    keys = []
+    params = {
+        'IndexName': event_index_name,
+        'KeyConditionExpression': 'eventId = :eid',
+        'ExpressionAttributeValues': {':eid': event_id}
+    }
+    while True:
+        response = terms_reader.query(**params)
+        keys.extend((item['term'], item['dateKey']) for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return keys
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _write(old_keys: Iterable[Tuple[str, str]], items: List[dict]):
+    """Put `items` and delete the old postings they do not replace.
+
+    Failures are logged, not raised: the event itself is already written,
+    and searches re-check what the postings return.
+    """
+    new_keys = {(item['term'], item['dateKey']) for item in items}
+    requests = [{'PutRequest': {'Item': item}} for item in items]
+    requests.extend(
+        {'DeleteRequest': {'Key': {'term': term, 'dateKey': key}}}
+        for term, key in dict.fromkeys(old_keys) if (term, key) not in new_keys
+    )
+    if not requests:
+        return
+    failed = batch_write(dynamodb, terms_table_name, requests)
+    if failed:
+        logger.warning(f"{len(failed)} search postings could not be written")
+
+
+def candidates(query_terms: List[str], criteria: dict, after: Optional[Tuple[str, str]],
+               page_size: int) -> Iterator[Tuple[str, str]]:
+    """(date, eventId) of events whose postings match, in date order after `after`.
+
+    The longest term drives the query, as usually the most selective one;
+    the others are left to the caller's re-check.
+    """
+    term = max(query_terms, key=len)[:SEARCH_PREFIX_LENGTH]
+    names = {'#term': 'term', '#date': 'date'}
+    values = {':term': term}
+    condition = '#term = :term'
+    low = criteria.get('dateFrom') or ''
+    if after:
+        low = max(low, date_key(*after))
+    high = criteria['dateTo'] + _DATE_END if criteria.get('dateTo') else None
+    if low or high:
+        names['#key'] = 'dateKey'
+    if low and high:
+        condition += ' AND #key BETWEEN :low AND :high'
+        values.update({':low': low, ':high': high})
+    elif low:
+        condition += ' AND #key >= :low'
+        values[':low'] = low
+    elif high:
+        condition += ' AND #key <= :high'
+        values[':high'] = high
+
+    filters = []
+    for field in FILTER_FIELDS:
+        if criteria.get(field):
+            names[f'#{field}'] = field
+            values[f':{field}'] = criteria[field]
+            filters.append(f'#{field} = :{field}')
+
+    params = {
+        'KeyConditionExpression': condition,
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values,
+        'ProjectionExpression': 'eventId, #date',
+        'Limit': page_size
+    }
+    if filters:
+        params['FilterExpression'] = ' AND '.join(filters)
+    while True:
+        response = terms_reader.query(**params)
+        for item in response.get('Items', []):
+            key = (item.get('date') or '', item['eventId'])
+            if not after or key > after:
+                yield key
+        if 'LastEvaluatedKey' not in response:
+            return
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def backfill(events: Iterable[dict]) -> int:
+    """Re-post every given event; returns how many were posted."""
+    count = 0
+    for event in events:
+        index_event(event)
+        count += 1
+    return count
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Maintain the event search postings')
+    parser.add_argument('--backfill', action='store_true', help='Post every stored event (one scan)')
+    parser.add_argument('--endpoint-url', help='DynamoDB Local endpoint')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.endpoint_url:
+        os.environ['AWS_ENDPOINT_URL_DYNAMODB'] = args.endpoint_url
+    if args.backfill:
+        import database
+        print(f"Posted {backfill(database.iter_events(attributes=list(INDEXED_FIELDS)))} events")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,801 @@
+"""Embedded SQLite storage backend.
+
+Implements the data-layer interface of database.py and registration_db.py
+(see storage.py) on a local SQLite database, for on-prem and edge
+deployments and for running the API without a network. The database runs
+in WAL mode so readers never block the writer, connections come from a
+small pool, and every statement is a module-level constant that each
+connection keeps compiled in its statement cache. Registrations, promotions
+and cascading deletes are single IMMEDIATE transactions, so capacity checks
+and counter updates cannot interleave.
+"""
+import base64
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import search
+
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'events.db')
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', '8'))
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv('SQLITE_BUSY_TIMEOUT_SECONDS', '5'))
+STATEMENT_CACHE_SIZE = 256
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BULK_REGISTRATIONS = int(os.getenv('MAX_BULK_REGISTRATIONS', '2000'))
+# Bound parameters per IN (...) lookup, well under SQLite's variable limit
+LOOKUP_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    eventId TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    date TEXT NOT NULL,
+    location TEXT NOT NULL,
+    capacity INTEGER NOT NULL,
+    organizer TEXT NOT NULL,
+    status TEXT NOT NULL,
+    waitlistEnabled INTEGER NOT NULL DEFAULT 0,
+    highDemand INTEGER NOT NULL DEFAULT 0,
+    currentRegistrations INTEGER NOT NULL DEFAULT 0,
+    currentWaitlist INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS events_status_date ON events (status, date, eventId);
+CREATE INDEX IF NOT EXISTS events_organizer_date ON events (organizer, date, eventId);
+CREATE INDEX IF NOT EXISTS events_date ON events (date, eventId);
+
+-- Full-text index over title and description, kept in step by the triggers.
+-- It maps rowids, which VACUUM may renumber; rebuild it after a VACUUM.
+CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+    title, description, content = 'events', content_rowid = 'rowid',
+    tokenize = 'unicode61 remove_diacritics 0'
+);
+CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+    INSERT INTO events_fts (rowid, title, description) VALUES (new.rowid, new.title, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+    INSERT INTO events_fts (events_fts, rowid, title, description)
+    VALUES ('delete', old.rowid, old.title, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF title, description ON events BEGIN
+    INSERT INTO events_fts (events_fts, rowid, title, description)
+    VALUES ('delete', old.rowid, old.title, old.description);
+    INSERT INTO events_fts (rowid, title, description) VALUES (new.rowid, new.title, new.description);
+END;
+
+CREATE TABLE IF NOT EXISTS users (
+    userId TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    createdAt TEXT NOT NULL,
+    updatedAt TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS registrations (
+    eventId TEXT NOT NULL REFERENCES events (eventId) ON DELETE CASCADE,
+    userId TEXT NOT NULL REFERENCES users (userId) ON DELETE CASCADE,
+    status TEXT NOT NULL,
+    registeredAt TEXT NOT NULL,
+    waitlistSeq INTEGER,
+    PRIMARY KEY (eventId, userId)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS registrations_user ON registrations (userId);
+-- Waitlist order per event; positions are counted from it
+CREATE INDEX IF NOT EXISTS registrations_waitlist ON registrations (eventId, waitlistSeq)
+    WHERE waitlistSeq IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS jobs (
+    jobId TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    targetId TEXT NOT NULL,
+    status TEXT NOT NULL,
+    processed INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    error TEXT,
+    createdAt TEXT NOT NULL,
+    updatedAt TEXT NOT NULL,
+    expiresAt INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS idempotency (
+    idempotencyKey TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    state TEXT NOT NULL,
+    statusCode INTEGER,
+    body TEXT,
+    lockedUntil INTEGER NOT NULL,
+    expiresAt INTEGER NOT NULL
+);
+"""
+
+EVENT_COLUMNS = (
+    'eventId', 'title', 'description', 'date', 'location', 'capacity', 'organizer', 'status',
+    'waitlistEnabled', 'highDemand', 'currentRegistrations', 'currentWaitlist', 'version'
+)
+EVENT_BOOLEANS = ('waitlistEnabled', 'highDemand')
+# Fields an update may set; counters and version are owned by the data layer
+EVENT_UPDATABLE = (
+    'title', 'description', 'date', 'location', 'capacity', 'organizer', 'status',
+    'waitlistEnabled', 'highDemand'
+)
+USER_COLUMNS = ('userId', 'name', 'createdAt', 'updatedAt', 'version')
+REGISTRATION_COLUMNS = ('eventId', 'userId', 'status', 'registeredAt', 'waitlistSeq')
+JOB_COLUMNS = ('jobId', 'type', 'targetId', 'status', 'processed', 'total', 'error', 'createdAt', 'updatedAt', 'expiresAt')
+
+_EVENT_FIELDS = ', '.join(EVENT_COLUMNS)
+_USER_FIELDS = ', '.join(USER_COLUMNS)
+
+# Statements
+_SELECT_EVENT = f"SELECT {_EVENT_FIELDS} FROM events WHERE eventId = ?"
+_HAS_FTS = "SELECT 1 FROM sqlite_master WHERE name = 'events_fts'"
+_REBUILD_FTS = "INSERT INTO events_fts (events_fts) VALUES ('rebuild')"
+_MATCHING_TEXT = "rowid IN (SELECT rowid FROM events_fts WHERE events_fts MATCH ?)"
+_UPSERT_EVENT = (
+    f"INSERT INTO events ({_EVENT_FIELDS}) VALUES ({', '.join('?' * len(EVENT_COLUMNS))}) "
+    "ON CONFLICT (eventId) DO UPDATE SET "
+    + ', '.join(f"{column} = excluded.{column}" for column in EVENT_UPDATABLE)
+    # Re-created events keep their live counters, as with DynamoDB imports
+    + ", version = events.version + 1"
+)
+_DELETE_EVENT = "DELETE FROM events WHERE eventId = ?"
+_EVENT_EXISTS = "SELECT 1 FROM events WHERE eventId = ?"
+_ADJUST_EVENT = (
+    "UPDATE events SET currentRegistrations = currentRegistrations + ?, "
+    "currentWaitlist = currentWaitlist + ?, version = version + 1 WHERE eventId = ?"
+)
+
+_SELECT_USER = f"SELECT {_USER_FIELDS} FROM users WHERE userId = ?"
+_INSERT_USER = f"INSERT INTO users ({_USER_FIELDS}) VALUES (?, ?, ?, ?, ?)"
+_USER_EXISTS = "SELECT 1 FROM users WHERE userId = ?"
+_DELETE_USER = "DELETE FROM users WHERE userId = ?"
+
+_SELECT_REGISTRATION = (
+    "SELECT eventId, userId, status, registeredAt, waitlistSeq FROM registrations WHERE eventId = ? AND userId = ?"
+)
+_INSERT_REGISTRATION = (
+    "INSERT INTO registrations (eventId, userId, status, registeredAt, waitlistSeq) VALUES (?, ?, ?, ?, ?)"
+)
+_DELETE_REGISTRATION = "DELETE FROM registrations WHERE eventId = ? AND userId = ?"
+_NEXT_WAITLIST_SEQ = (
+    "SELECT COALESCE(MAX(waitlistSeq), 0) + 1 FROM registrations WHERE eventId = ? AND waitlistSeq IS NOT NULL"
+)
+_WAITLIST_POSITION = "SELECT COUNT(*) FROM registrations WHERE eventId = ? AND waitlistSeq <= ?"
+_WAITLIST_HEAD = (
+    "SELECT userId FROM registrations WHERE eventId = ? AND waitlistSeq IS NOT NULL ORDER BY waitlistSeq LIMIT 1"
+)
+_PROMOTE = (
+    "UPDATE registrations SET status = 'registered', waitlistSeq = NULL "
+    "WHERE eventId = ? AND userId = ? AND status = 'waitlisted'"
+)
+_EVENT_REGISTRATIONS = (
+    "SELECT eventId, userId, status, registeredAt, waitlistSeq FROM registrations WHERE eventId = ? ORDER BY userId"
+)
+_EVENT_ROSTER = (
+    "SELECT r.userId, r.status, r.registeredAt, r.waitlistSeq, u.name FROM registrations r "
+    "JOIN users u ON u.userId = r.userId WHERE r.eventId = ? ORDER BY r.userId"
+)
+_USER_REGISTRATIONS = (
+    "SELECT r.eventId, r.userId, r.status, r.registeredAt, "
+    "CASE WHEN r.waitlistSeq IS NULL THEN NULL ELSE ("
+    "SELECT COUNT(*) FROM registrations w WHERE w.eventId = r.eventId AND w.waitlistSeq <= r.waitlistSeq"
+    ") END AS position, "
+    "e.title, e.date, e.location, e.status AS eventStatus, e.version AS eventVersion "
+    "FROM registrations r JOIN events e ON e.eventId = r.eventId WHERE r.userId = ?"
+)
+_USER_REGISTRATION_KEYS = "SELECT eventId, status FROM registrations WHERE userId = ?"
+_EVENT_REGISTRATION_COUNT = "SELECT COUNT(*) FROM registrations WHERE eventId = ?"
+_DELETE_EVENT_REGISTRATIONS = "DELETE FROM registrations WHERE eventId = ?"
+
+_INSERT_JOB = f"INSERT INTO jobs ({', '.join(JOB_COLUMNS)}) VALUES ({', '.join('?' * len(JOB_COLUMNS))})"
+_SELECT_JOB = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE jobId = ?"
+_EXPIRE_JOBS = "DELETE FROM jobs WHERE expiresAt < ?"
+
+IDEMPOTENCY_COLUMNS = ('idempotencyKey', 'fingerprint', 'state', 'statusCode', 'body', 'lockedUntil', 'expiresAt')
+_CLAIM_IDEMPOTENCY_KEY = (
+    f"INSERT INTO idempotency ({', '.join(IDEMPOTENCY_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (idempotencyKey) DO UPDATE SET fingerprint = excluded.fingerprint, state = excluded.state, "
+    "statusCode = NULL, body = NULL, lockedUntil = excluded.lockedUntil, expiresAt = excluded.expiresAt "
+    "WHERE idempotency.expiresAt < ? OR (idempotency.state = 'pending' AND idempotency.lockedUntil < ?)"
+)
+_SELECT_IDEMPOTENCY_KEY = f"SELECT {', '.join(IDEMPOTENCY_COLUMNS)} FROM idempotency WHERE idempotencyKey = ?"
+_COMPLETE_IDEMPOTENCY_KEY = "UPDATE idempotency SET state = ?, statusCode = ?, body = ? WHERE idempotencyKey = ?"
+_RELEASE_IDEMPOTENCY_KEY = "DELETE FROM idempotency WHERE idempotencyKey = ? AND state = 'pending'"
+_EXPIRE_IDEMPOTENCY_KEYS = "DELETE FROM idempotency WHERE expiresAt < ?"
+
+
+class _Pool:
+    """A fixed-size pool of connections to one database file."""
+
+    def __init__(self, path: str, size: int):
+        if path == ':memory:':
+            # One shared in-memory database; a single connection serializes access to it
+            self.path = f"file:events-{uuid.uuid4().hex}?mode=memory&cache=shared"
+            self.size = 1
+        else:
+            self.path = f"file:{path}"
+            self.size = max(1, size)
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path, uri=True, timeout=SQLITE_BUSY_TIMEOUT_SECONDS, isolation_level=None,
+            check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    conn = self._connect()
+                    if self._created == 1:
+                        has_fts = conn.execute(_HAS_FTS).fetchone() is not None
+                        conn.executescript(SCHEMA)
+                        if not has_fts:
+                            # Databases created before the full-text index existed
+                            conn.execute(_REBUILD_FTS)
+        if conn is None:
+            conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+
+_pool_lock = threading.Lock()
+_pool: Optional[_Pool] = None
+
+
+def pool() -> _Pool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _Pool(SQLITE_PATH, SQLITE_POOL_SIZE)
+    return _pool
+
+
+@contextmanager
+def _transaction() -> Iterator[sqlite3.Connection]:
+    """A write transaction; IMMEDIATE takes the write lock up front instead of failing on upgrade."""
+    with pool().connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def _chunks(items: List, size: int = LOOKUP_CHUNK) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _event(row: Optional[sqlite3.Row]) -> Optional[dict]:
+    if row is None:
+        return None
+    event = dict(row)
+    for column in EVENT_BOOLEANS:
+        if column in event:
+            event[column] = bool(event[column])
+    return event
+
+
+def _event_columns(attributes: Optional[List[str]]) -> str:
+    if not attributes:
+        return _EVENT_FIELDS
+    return ', '.join(c for c in dict.fromkeys(['eventId', *attributes]) if c in EVENT_COLUMNS)
+
+
+def _user_columns(attributes: Optional[List[str]]) -> str:
+    if not attributes:
+        return _USER_FIELDS
+    return ', '.join(c for c in dict.fromkeys(['userId', *attributes]) if c in USER_COLUMNS)
+
+
+def _encode_cursor(last_key: Optional[dict]) -> Optional[str]:
+    if not last_key:
+        return None
+    raw = json.dumps(last_key, separators=(',', ':'), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[dict]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded))
+    except ValueError:
+        raise ValueError("Invalid pagination cursor")
+    if not isinstance(key, dict) or 'eventId' not in key:
+        raise ValueError("Invalid pagination cursor")
+    return key
+
+
+# Events
+def _prepare_event(event_data: dict) -> dict:
+    if not event_data.get('eventId'):
+        event_data['eventId'] = str(uuid.uuid4())
+    event_data.setdefault('currentRegistrations', 0)
+    event_data.setdefault('currentWaitlist', 0)
+    event_data.setdefault('waitlistEnabled', False)
+    event_data.setdefault('highDemand', False)
+    event_data.setdefault('version', 1)
+    return event_data
+
+
+def create_event(event_data: dict) -> dict:
+    event_data = _prepare_event(event_data)
+    with _transaction() as conn:
+        conn.execute(_UPSERT_EVENT, tuple(event_data.get(column) for column in EVENT_COLUMNS))
+        return _event(conn.execute(_SELECT_EVENT, (event_data['eventId'],)).fetchone())
+
+
+def import_events(events: List[dict]) -> List[Tuple[dict, str]]:
+    """Upsert a batch of validated events in one transaction; existing events keep their counters."""
+    prepared = [_prepare_event(event_data) for event_data in events]
+    with _transaction() as conn:
+        conn.executemany(_UPSERT_EVENT, [tuple(event.get(column) for column in EVENT_COLUMNS) for event in prepared])
+    return []
+
+
+def iter_events(segments: int = 1, page_size: int = MAX_PAGE_SIZE,
+                attributes: Optional[List[str]] = None) -> Iterator[dict]:
+    """Stream every event in key order, one page per query (`segments` has no meaning here)."""
+    statement = f"SELECT {_event_columns(attributes)} FROM events WHERE eventId > ? ORDER BY eventId LIMIT ?"
+    last = ''
+    while True:
+        with pool().connection() as conn:
+            rows = conn.execute(statement, (last, page_size)).fetchall()
+        for row in rows:
+            yield _event(row)
+        if len(rows) < page_size:
+            return
+        last = rows[-1]['eventId']
+
+
+def get_event(event_id: str, consistent: bool = False) -> Optional[dict]:
+    # Local reads are always current, so there is no cache to bypass
+    with pool().connection() as conn:
+        return _event(conn.execute(_SELECT_EVENT, (event_id,)).fetchone())
+
+
+def get_events_batch(event_ids: Iterable[str], attributes: Optional[List[str]] = None,
+                     max_workers: int = 1) -> Dict[str, dict]:
+    unique_ids = list(dict.fromkeys(eid for eid in event_ids if eid))
+    events = {}
+    columns = _event_columns(attributes)
+    with pool().connection() as conn:
+        for chunk in _chunks(unique_ids):
+            statement = f"SELECT {columns} FROM events WHERE eventId IN ({', '.join('?' * len(chunk))})"
+            for row in conn.execute(statement, chunk):
+                events[row['eventId']] = _event(row)
+    return events
+
+
+def get_all_events(segments: int = 1, attributes: Optional[List[str]] = None) -> List[dict]:
+    return list(iter_events(attributes=attributes))
+
+
+def list_events(status: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+                cursor: Optional[str] = None) -> dict:
+    """One page of events and the cursor for the next; by status they come ordered by date."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    start = _decode_cursor(cursor)
+    if status:
+        if start is not None and 'date' not in start:
+            raise ValueError("Invalid pagination cursor")
+        statement = f"SELECT {_EVENT_FIELDS} FROM events WHERE status = ?"
+        params: list = [status]
+        if start:
+            statement += " AND (date, eventId) > (?, ?)"
+            params += [start['date'], start['eventId']]
+        statement += " ORDER BY date, eventId LIMIT ?"
+    else:
+        statement = f"SELECT {_EVENT_FIELDS} FROM events WHERE eventId > ? ORDER BY eventId LIMIT ?"
+        params = [start['eventId'] if start else '']
+    # One extra row tells whether another page follows
+    with pool().connection() as conn:
+        rows = conn.execute(statement, [*params, limit + 1]).fetchall()
+
+    items = [_event(row) for row in rows[:limit]]
+    next_key = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_key = {'eventId': last['eventId']}
+        if status:
+            next_key.update(status=last['status'], date=last['date'])
+    return {'items': items, 'nextCursor': _encode_cursor(next_key)}
+
+
+def search_events(q: Optional[str] = None, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                  organizer: Optional[str] = None, location: Optional[str] = None, status: Optional[str] = None,
+                  limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> dict:
+    """One page of matching events ordered by date; see database.search_events.
+
+    Text terms are prefix matches against the events_fts index.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    start = _decode_cursor(cursor)
+    if start is not None and not isinstance(start.get('date'), str):
+        raise ValueError("Invalid pagination cursor")
+
+    conditions: List[str] = []
+    params: list = []
+    query_terms = search.terms(q)
+    if query_terms:
+        conditions.append(_MATCHING_TEXT)
+        params.append(' '.join(f'"{term}"*' for term in query_terms))
+    for column, value in (('organizer', organizer), ('location', location), ('status', status)):
+        if value:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if date_from:
+        conditions.append("date >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("date <= ?")
+        params.append(date_to)
+    if start:
+        conditions.append("(date, eventId) > (?, ?)")
+        params += [start['date'], start['eventId']]
+
+    statement = f"SELECT {_EVENT_FIELDS} FROM events"
+    if conditions:
+        statement += " WHERE " + " AND ".join(conditions)
+    statement += " ORDER BY date, eventId LIMIT ?"
+    with pool().connection() as conn:
+        rows = conn.execute(statement, [*params, limit + 1]).fetchall()
+
+    items = [_event(row) for row in rows[:limit]]
+    next_key = None
+    if len(rows) > limit:
+        next_key = {'date': items[-1]['date'], 'eventId': items[-1]['eventId']}
+    return {'items': items, 'nextCursor': _encode_cursor(next_key)}
+
+
+def update_event(event_id: str, update_data: dict, expected_version: Optional[int] = None) -> Optional[dict]:
+    """Apply a partial update and bump the version; see database.update_event."""
+    columns = [column for column in update_data if column in EVENT_UPDATABLE]
+    assignments = ''.join(f"{column} = ?, " for column in columns)
+    statement = f"UPDATE events SET {assignments}version = version + 1 WHERE eventId = ?"
+    params = [update_data[column] for column in columns] + [event_id]
+    if expected_version is not None:
+        statement += " AND version = ?"
+        params.append(expected_version)
+
+    with _transaction() as conn:
+        if conn.execute(statement, params).rowcount == 0:
+            if expected_version is not None and conn.execute(_EVENT_EXISTS, (event_id,)).fetchone():
+                raise ValueError("Event has been modified")
+            return None
+        return _event(conn.execute(_SELECT_EVENT, (event_id,)).fetchone())
+
+
+def delete_event(event_id: str, progress: Optional[Callable[[int, int], None]] = None) -> bool:
+    """Delete an event and its registrations in one transaction."""
+    with _transaction() as conn:
+        total = conn.execute(_EVENT_REGISTRATION_COUNT, (event_id,)).fetchone()[0]
+        conn.execute(_DELETE_EVENT_REGISTRATIONS, (event_id,))
+        conn.execute(_DELETE_EVENT, (event_id,))
+    if progress:
+        progress(total, total)
+    return True
+
+
+# Users
+def create_user(user_data: dict) -> dict:
+    if not user_data.get('userId'):
+        user_data['userId'] = str(uuid.uuid4())
+    now = _now()
+    user_data['createdAt'] = now
+    user_data['updatedAt'] = now
+    user_data['version'] = 1
+    try:
+        with _transaction() as conn:
+            conn.execute(_INSERT_USER, tuple(user_data[column] for column in USER_COLUMNS))
+    except sqlite3.IntegrityError:
+        raise ValueError(f"User with userId {user_data['userId']} already exists")
+    return user_data
+
+
+def get_user(user_id: str, consistent: bool = False) -> Optional[dict]:
+    with pool().connection() as conn:
+        row = conn.execute(_SELECT_USER, (user_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def get_users_batch(user_ids: Iterable[str]) -> Dict[str, dict]:
+    unique_ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+    users = {}
+    with pool().connection() as conn:
+        for chunk in _chunks(unique_ids):
+            statement = f"SELECT {_USER_FIELDS} FROM users WHERE userId IN ({', '.join('?' * len(chunk))})"
+            for row in conn.execute(statement, chunk):
+                users[row['userId']] = dict(row)
+    return users
+
+
+def iter_users(segments: int = 1, attributes: Optional[List[str]] = None) -> Iterator[dict]:
+    statement = f"SELECT {_user_columns(attributes)} FROM users WHERE userId > ? ORDER BY userId LIMIT ?"
+    last = ''
+    while True:
+        with pool().connection() as conn:
+            rows = conn.execute(statement, (last, MAX_PAGE_SIZE)).fetchall()
+        for row in rows:
+            yield dict(row)
+        if len(rows) < MAX_PAGE_SIZE:
+            return
+        last = rows[-1]['userId']
+
+
+def get_all_users(segments: int = 1, attributes: Optional[List[str]] = None) -> List[dict]:
+    return list(iter_users(attributes=attributes))
+
+
+def update_user(user_id: str, update_data: dict, expected_version: Optional[int] = None) -> Optional[dict]:
+    update_data = {k: v for k, v in update_data.items() if k == 'name'}
+    update_data['updatedAt'] = _now()
+    assignments = ''.join(f"{column} = ?, " for column in update_data)
+    statement = f"UPDATE users SET {assignments}version = version + 1 WHERE userId = ?"
+    params = [*update_data.values(), user_id]
+    if expected_version is not None:
+        statement += " AND version = ?"
+        params.append(expected_version)
+
+    with _transaction() as conn:
+        if conn.execute(statement, params).rowcount == 0:
+            if expected_version is not None and conn.execute(_USER_EXISTS, (user_id,)).fetchone():
+                raise ValueError("User has been modified")
+            return None
+        return dict(conn.execute(_SELECT_USER, (user_id,)).fetchone())
+
+
+def delete_user(user_id: str, progress: Optional[Callable[[int, int], None]] = None) -> bool:
+    """Delete a user and their registrations, releasing seats to the waitlists, in one transaction."""
+    with _transaction() as conn:
+        registrations = conn.execute(_USER_REGISTRATION_KEYS, (user_id,)).fetchall()
+        for registration in registrations:
+            _remove(conn, registration['eventId'], user_id, registration['status'])
+        conn.execute(_DELETE_USER, (user_id,))
+    if progress:
+        progress(len(registrations), len(registrations))
+    return True
+
+
+# Registrations
+def _registration(event_id: str, user_id: str, status: str, registered_at: str,
+                  position: Optional[int] = None) -> dict:
+    return {
+        'registrationId': f"{user_id}#{event_id}",
+        'eventId': event_id,
+        'userId': user_id,
+        'status': status,
+        'registeredAt': registered_at,
+        'position': position
+    }
+
+
+def _claim(conn: sqlite3.Connection, event: dict, user_id: str, now: str) -> dict:
+    """Seat or waitlist a user; `event` is the locked event row, kept in step with the counters."""
+    event_id = event['eventId']
+    if event['currentRegistrations'] < event['capacity']:
+        conn.execute(_INSERT_REGISTRATION, (event_id, user_id, 'registered', now, None))
+        conn.execute(_ADJUST_EVENT, (1, 0, event_id))
+        event['currentRegistrations'] += 1
+        return {**_registration(event_id, user_id, 'registered', now), 'message': 'Successfully registered for event'}
+    if not event['waitlistEnabled']:
+        raise ValueError("Event is at capacity and has no waitlist")
+
+    seq = conn.execute(_NEXT_WAITLIST_SEQ, (event_id,)).fetchone()[0]
+    conn.execute(_INSERT_REGISTRATION, (event_id, user_id, 'waitlisted', now, seq))
+    conn.execute(_ADJUST_EVENT, (0, 1, event_id))
+    event['currentWaitlist'] += 1
+    position = conn.execute(_WAITLIST_POSITION, (event_id, seq)).fetchone()[0]
+    return {
+        **_registration(event_id, user_id, 'waitlisted', now, position),
+        'message': f'Event is full. Added to waitlist at position {position}'
+    }
+
+
+def register_user(event_id: str, user_id: str) -> dict:
+    """Register a user, or waitlist them once the event is full, in one transaction."""
+    with _transaction() as conn:
+        event = _event(conn.execute(_SELECT_EVENT, (event_id,)).fetchone())
+        if not event:
+            raise ValueError("Event not found")
+        if not conn.execute(_USER_EXISTS, (user_id,)).fetchone():
+            raise ValueError("User not found")
+        existing = conn.execute(_SELECT_REGISTRATION, (event_id, user_id)).fetchone()
+        if existing:
+            raise ValueError(f"User already {existing['status']} for this event")
+        return _claim(conn, event, user_id, _now())
+
+
+def register_users_bulk(event_id: str, user_ids: List[str]) -> dict:
+    """Register a group of users in request order within one transaction; see registration_db."""
+    unique_ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+    now = _now()
+    results = []
+    with _transaction() as conn:
+        event = _event(conn.execute(_SELECT_EVENT, (event_id,)).fetchone())
+        if not event:
+            raise ValueError("Event not found")
+        for user_id in unique_ids:
+            if not conn.execute(_USER_EXISTS, (user_id,)).fetchone():
+                results.append(_rejected(event_id, user_id, "User not found"))
+                continue
+            existing = conn.execute(_SELECT_REGISTRATION, (event_id, user_id)).fetchone()
+            if existing:
+                results.append(_rejected(event_id, user_id, f"User already {existing['status']} for this event"))
+                continue
+            try:
+                results.append(_claim(conn, event, user_id, now))
+            except ValueError as e:
+                results.append(_rejected(event_id, user_id, str(e)))
+
+    summary = {status: 0 for status in ('registered', 'waitlisted', 'rejected')}
+    for result in results:
+        summary[result['status']] += 1
+    return {'eventId': event_id, **summary, 'results': results}
+
+
+def _rejected(event_id: str, user_id: str, reason: str) -> dict:
+    return {'eventId': event_id, 'userId': user_id, 'status': 'rejected', 'message': reason}
+
+
+def _promote(conn: sqlite3.Connection, event_id: str):
+    head = conn.execute(_WAITLIST_HEAD, (event_id,)).fetchone()
+    if head is None:
+        return
+    conn.execute(_PROMOTE, (event_id, head['userId']))
+    conn.execute(_ADJUST_EVENT, (1, -1, event_id))
+
+
+def _remove(conn: sqlite3.Connection, event_id: str, user_id: str, status: str):
+    conn.execute(_DELETE_REGISTRATION, (event_id, user_id))
+    if status == 'registered':
+        conn.execute(_ADJUST_EVENT, (-1, 0, event_id))
+        _promote(conn, event_id)
+    else:
+        conn.execute(_ADJUST_EVENT, (0, -1, event_id))
+
+
+def unregister_user(event_id: str, user_id: str) -> bool:
+    with _transaction() as conn:
+        registration = conn.execute(_SELECT_REGISTRATION, (event_id, user_id)).fetchone()
+        if not registration:
+            raise ValueError("User is not registered for this event")
+        _remove(conn, event_id, user_id, registration['status'])
+    return True
+
+
+def promote_from_waitlist(event_id: str):
+    with _transaction() as conn:
+        _promote(conn, event_id)
+
+
+def get_registration(event_id: str, user_id: str) -> Optional[dict]:
+    with pool().connection() as conn:
+        row = conn.execute(_SELECT_REGISTRATION, (event_id, user_id)).fetchone()
+    if row is None:
+        return None
+    return _registration(event_id, user_id, row['status'], row['registeredAt'])
+
+
+def get_user_registrations(user_id: str) -> List[dict]:
+    """A user's registrations with waitlist positions and their event's summary, in one query."""
+    with pool().connection() as conn:
+        rows = conn.execute(_USER_REGISTRATIONS, (user_id,)).fetchall()
+    return [{
+        **_registration(row['eventId'], row['userId'], row['status'], row['registeredAt'], row['position']),
+        'eventSummary': {
+            'title': row['title'], 'date': row['date'], 'location': row['location'],
+            'status': row['eventStatus'], 'version': row['eventVersion']
+        }
+    } for row in rows]
+
+
+def _split(event_id: str, rows: List[sqlite3.Row], entry: Callable[[sqlite3.Row, Optional[int]], dict]) -> dict:
+    registered = [entry(row, None) for row in rows if row['status'] == 'registered']
+    waitlisted = sorted((row for row in rows if row['status'] == 'waitlisted'), key=lambda row: row['waitlistSeq'] or 0)
+    return {
+        'registered': registered,
+        'waitlisted': [entry(row, position) for position, row in enumerate(waitlisted, start=1)]
+    }
+
+
+def get_event_registrations(event_id: str) -> Dict[str, List[dict]]:
+    with pool().connection() as conn:
+        rows = conn.execute(_EVENT_REGISTRATIONS, (event_id,)).fetchall()
+    return _split(event_id, rows, lambda row, position: _registration(
+        event_id, row['userId'], row['status'], row['registeredAt'], position
+    ))
+
+
+def get_event_roster(event: dict) -> Dict[str, List[dict]]:
+    """Attendee lists with user names, joined in one query."""
+    event_id = event['eventId']
+    with pool().connection() as conn:
+        rows = conn.execute(_EVENT_ROSTER, (event_id,)).fetchall()
+    return _split(event_id, rows, lambda row, position: {
+        **_registration(event_id, row['userId'], row['status'], row['registeredAt'], position),
+        'user': {'userId': row['userId'], 'name': row['name']}
+    })
+
+
+# Background job records
+def put_job(job: dict):
+    with _transaction() as conn:
+        conn.execute(_EXPIRE_JOBS, (int(time.time()),))
+        conn.execute(_INSERT_JOB, tuple(job.get(column) for column in JOB_COLUMNS))
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    with pool().connection() as conn:
+        row = conn.execute(_SELECT_JOB, (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def update_job(job_id: str, fields: dict) -> Optional[dict]:
+    columns = [column for column in fields if column in JOB_COLUMNS]
+    with _transaction() as conn:
+        conn.execute(
+            f"UPDATE jobs SET {', '.join(f'{column} = ?' for column in columns)} WHERE jobId = ?",
+            [*(fields[column] for column in columns), job_id]
+        )
+        row = conn.execute(_SELECT_JOB, (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+# Idempotency records (see idempotency.py)
+def claim_idempotency_key(record: dict, now: int) -> Optional[dict]:
+    """Insert a pending record unless a live one holds the key; returns the holder, if any."""
+    with _transaction() as conn:
+        claimed = conn.execute(
+            _CLAIM_IDEMPOTENCY_KEY, (*(record.get(column) for column in IDEMPOTENCY_COLUMNS), now, now)
+        ).rowcount
+        if claimed:
+            return None
+        return dict(conn.execute(_SELECT_IDEMPOTENCY_KEY, (record['idempotencyKey'],)).fetchone())
+
+
+def complete_idempotency_key(key: str, fields: dict):
+    with _transaction() as conn:
+        conn.execute(_COMPLETE_IDEMPOTENCY_KEY, (fields['state'], fields['statusCode'], fields['body'], key))
+        conn.execute(_EXPIRE_IDEMPOTENCY_KEYS, (int(time.time()),))
+
+
+def release_idempotency_key(key: str):
+    with _transaction() as conn:
+        conn.execute(_RELEASE_IDEMPOTENCY_KEY, (key,))
@@ -0,0 +1,66 @@
+"""Storage backend selection.
+
+STORAGE_BACKEND picks the data layer behind the API: `dynamodb` (the
+default; database.py and registration_db.py) or `sqlite` (sqlite_db.py, an
+embedded database for on-prem and edge deployments). Both implement the
+functions in INTERFACE with the same signatures, return shapes and
+ValueError messages, so callers go through `backend()` and never import a
+backend module directly.
+"""
+import importlib
+import os
+import threading
+from types import SimpleNamespace
+from typing import Optional
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'dynamodb').lower()
+
+BACKENDS = {
+    'dynamodb': ('database', 'registration_db'),
+    'sqlite': ('sqlite_db',),
+}
+
+INTERFACE = (
+    # Events
+    'create_event', 'import_events', 'iter_events', 'get_event', 'get_events_batch',
+    'get_all_events', 'list_events', 'search_events', 'update_event', 'delete_event',
+    # Users
+    'create_user', 'get_user', 'get_users_batch', 'iter_users', 'get_all_users',
+    'update_user', 'delete_user',
+    # Registrations
+    'register_user', 'register_users_bulk', 'unregister_user', 'promote_from_waitlist',
+    'get_registration', 'get_user_registrations', 'get_event_registrations', 'get_event_roster',
+    # Limits
+    'DEFAULT_PAGE_SIZE', 'MAX_PAGE_SIZE', 'MAX_BULK_REGISTRATIONS',
+)
+
+_lock = threading.Lock()
+_backend: Optional[SimpleNamespace] = None
+
+
+def load(name: str) -> SimpleNamespace:
+    """The INTERFACE members of a backend, gathered from its modules."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend {name}; expected one of {', '.join(BACKENDS)}")
+    modules = [importlib.import_module(module) for module in BACKENDS[name]]
+    members = {'name': name}
+    for member in INTERFACE:
+        owner = next((module for module in modules if hasattr(module, member)), None)
+        if owner is None:
+            raise ValueError(f"Storage backend {name} does not implement {member}")
+        members[member] = getattr(owner, member)
+    return SimpleNamespace(**members)
+
+
+def backend() -> SimpleNamespace:
+    """The configured backend, loaded on first use."""
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = load(STORAGE_BACKEND)
+    return _backend
+
+
+def is_sqlite() -> bool:
+    return STORAGE_BACKEND == 'sqlite'
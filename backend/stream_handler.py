@@ -0,0 +1,19 @@
+"""Lambda entry point for the DynamoDB Streams consumer (see streams.py).
+
+Kept apart from lambda_handler so the consumer's cold start does not load
+FastAPI. Background jobs started while applying records (large summary
+refreshes) are asynchronous invocations of this same function.
+"""
+import counters
+import jobs
+import streams
+
+
+def handler(event, context):
+    try:
+        if jobs.is_job_event(event):
+            jobs.run(event['backgroundJob'])
+            return None
+        return streams.handle(event)
+    finally:
+        counters.flush()
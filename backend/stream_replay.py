@@ -0,0 +1,154 @@
+"""Replay DynamoDB Streams records through the stream consumer, without Lambda.
+
+Reads the streams of the given tables with the DynamoDB Streams API (moto,
+DynamoDB Local or AWS) and hands the records to `streams.handle` in
+Lambda-shaped batches. Like a Lambda event source mapping, each shard is
+read in order, and a reported batch item failure re-reads the shard from
+the failed record, up to `max_retries` times before the batch is skipped.
+Captured records can also be replayed from an NDJSON file, one Lambda
+record per line.
+
+    cd backend
+    python -m stream_replay --endpoint-url http://localhost:8001
+    python -m stream_replay --table Registrations --follow
+    python -m stream_replay --file records.ndjson
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from common import aws
+import streams
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_RETRIES = 3
+# Reads of an open shard that may come back empty before its records do
+EMPTY_READS = 5
+
+
+def _first_failure(batch: List[dict]) -> Optional[int]:
+    """Hand a batch to the consumer; the index of the first record to re-deliver, if any."""
+    response = streams.handle({'Records': batch}) or {}
+    failed = {failure['itemIdentifier'] for failure in response.get('batchItemFailures', [])}
+    for i, record in enumerate(batch):
+        if record['dynamodb']['SequenceNumber'] in failed:
+            return i
+    return None
+
+
+class Replayer:
+    """Drains table streams into the consumer, remembering where each shard was left."""
+
+    def __init__(self, tables: List[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_retries: int = DEFAULT_MAX_RETRIES):
+        self.tables = tables
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self._client = aws.dynamodb_streams_client()
+        # (stream ARN, shard ID) -> (iterator type, sequence number) to resume from
+        self._positions: Dict[Tuple[str, str], Tuple[str, str]] = {}
+
+    def _shards(self) -> Iterator[Tuple[str, str]]:
+        client = aws.dynamodb_client()
+        for table in self.tables:
+            stream_arn = client.describe_table(TableName=table)['Table'].get('LatestStreamArn')
+            if not stream_arn:
+                raise ValueError(f"Table {table} has no stream")
+            params = {'StreamArn': stream_arn}
+            while True:
+                description = self._client.describe_stream(**params)['StreamDescription']
+                for shard in description['Shards']:
+                    yield stream_arn, shard['ShardId']
+                if not description.get('LastEvaluatedShardId'):
+                    break
+                params['ExclusiveStartShardId'] = description['LastEvaluatedShardId']
+
+    def _read(self, stream_arn: str, shard_id: str) -> List[dict]:
+        params = {'StreamArn': stream_arn, 'ShardId': shard_id, 'ShardIteratorType': 'TRIM_HORIZON'}
+        position = self._positions.get((stream_arn, shard_id))
+        if position:
+            params['ShardIteratorType'], params['SequenceNumber'] = position
+        iterator = self._client.get_shard_iterator(**params).get('ShardIterator')
+        for _ in range(EMPTY_READS):
+            if not iterator:
+                break
+            response = self._client.get_records(ShardIterator=iterator, Limit=self.batch_size)
+            if response['Records']:
+                return [{**record, 'eventSourceARN': stream_arn} for record in response['Records']]
+            iterator = response.get('NextShardIterator')
+        return []
+
+    def drain(self) -> int:
+        """Apply every record not applied yet; returns how many records were delivered."""
+        delivered = 0
+        for stream_arn, shard_id in self._shards():
+            key = (stream_arn, shard_id)
+            attempts = 0
+            while True:
+                batch = self._read(stream_arn, shard_id)
+                if not batch:
+                    break
+                delivered += len(batch)
+                failed_at = _first_failure(batch)
+                if failed_at is None or attempts >= self.max_retries:
+                    if failed_at is not None:
+                        logger.warning(f"Skipping {len(batch) - failed_at} records of {shard_id} after {attempts} retries")
+                    self._positions[key] = ('AFTER_SEQUENCE_NUMBER', batch[-1]['dynamodb']['SequenceNumber'])
+                    attempts = 0
+                else:
+                    self._positions[key] = ('AT_SEQUENCE_NUMBER', batch[failed_at]['dynamodb']['SequenceNumber'])
+                    attempts += 1
+        return delivered
+
+
+def replay_file(path: str, batch_size: int = DEFAULT_BATCH_SIZE, max_retries: int = DEFAULT_MAX_RETRIES) -> int:
+    """Apply captured Lambda records from an NDJSON file; returns how many records were read."""
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        for attempt in range(max_retries + 1):
+            failed_at = _first_failure(batch)
+            if failed_at is None:
+                break
+            batch = batch[failed_at:]
+        else:
+            logger.warning(f"Skipping {len(batch)} records of {path} after {max_retries} retries")
+    return len(records)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--table', action='append', dest='tables',
+                        help='Table whose stream to replay (repeatable); defaults to every followed table')
+    parser.add_argument('--file', help='NDJSON file of captured Lambda records to replay instead')
+    parser.add_argument('--endpoint-url', help='DynamoDB Local endpoint')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--max-retries', type=int, default=DEFAULT_MAX_RETRIES)
+    parser.add_argument('--follow', action='store_true', help='Keep polling for new records')
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls with --follow')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.endpoint_url:
+        os.environ['AWS_ENDPOINT_URL_DYNAMODB'] = args.endpoint_url
+        os.environ['AWS_ENDPOINT_URL_DYNAMODBSTREAMS'] = args.endpoint_url
+    if args.file:
+        print(f"Replayed {replay_file(args.file, args.batch_size, args.max_retries)} records")
+        return
+
+    replayer = Replayer(args.tables or list(streams.PARTITION_KEYS), args.batch_size, args.max_retries)
+    while True:
+        delivered = replayer.drain()
+        print(f"Replayed {delivered} records")
+        if not args.follow:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
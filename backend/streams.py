@@ -0,0 +1,277 @@
+"""Change-stream consumer for derived views.
+
+With DERIVED_VIEWS=stream, requests only write the source items. The
+registration transaction still claims the seat or waitlist place, since
+that is what enforces capacity. Everything derived from the items is then
+maintained from the tables' DynamoDB Streams (NEW_AND_OLD_IMAGES), in
+batches, by `handle`:
+
+- Registrations: counter releases and waitlist departures (from removed
+  and promoted items; inserts and promotions claimed their seat in their
+  own transaction), promotion of the waitlist onto released seats, and
+  the materialized rosters.
+- Events: registration event summaries, when a summary field changed,
+  and the search postings.
+- Users: the names copied into rosters.
+
+Records are grouped by partition (table and partition key) and applied in
+order within each partition, with partitions processed concurrently. Each
+partition's changes are coalesced: one counter write per event, one roster
+write per user and one summary refresh and postings write per event,
+however many records the batch holds.
+
+Every partition keeps a checkpoint, the last sequence number it applied.
+Redelivered records at or below it are skipped. A failed partition stops
+and is reported as a batch item failure, so Lambda re-delivers from its
+first unapplied record while other partitions carry on. Application is
+at-least-once: rosters, summaries and postings are idempotent, and a counter delta
+doubled by a crash between writing it and the checkpoint is corrected by
+`counters.reconcile`.
+"""
+from botocore.exceptions import ClientError
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from common import aws, codec, metrics
+from common.batch import batch_get
+import counters
+import rosters
+import search
+import summaries
+
+logger = logging.getLogger(__name__)
+
+dynamodb = aws.dynamodb
+events_table_name = os.getenv('DYNAMODB_TABLE_NAME', 'Events')
+users_table_name = os.getenv('USERS_TABLE_NAME', 'Users')
+registrations_table_name = os.getenv('REGISTRATIONS_TABLE_NAME', 'Registrations')
+checkpoints_table_name = os.getenv('STREAM_CHECKPOINTS_TABLE_NAME', 'StreamCheckpoints')
+
+registrations_table = aws.table(registrations_table_name)
+checkpoints_table = aws.table(checkpoints_table_name)
+registrations_reader = codec.reader(registrations_table_name, registrations_table)
+
+# `inline` keeps derived views on the request path; `stream` leaves them to this consumer
+DERIVED_VIEWS = os.getenv('DERIVED_VIEWS', 'inline').lower()
+STREAM_WORKERS = int(os.getenv('STREAM_WORKERS', '8'))
+# Streams keep records for 24 hours; checkpoints only need to outlive them
+CHECKPOINT_TTL_SECONDS = int(os.getenv('STREAM_CHECKPOINT_TTL_SECONDS', str(48 * 3600)))
+# Stream sequence numbers have up to 40 digits; padded, they compare as strings
+SEQUENCE_DIGITS = 40
+
+PARTITION_KEYS = {
+    events_table_name: 'eventId',
+    users_table_name: 'userId',
+    registrations_table_name: 'eventId',
+}
+
+
+class Change(NamedTuple):
+    table: str
+    partition: str
+    sequence: str
+    # As Lambda reports it, for batch item failures
+    record_id: str
+    old: Optional[dict]
+    new: Optional[dict]
+
+
+def inline() -> bool:
+    """Whether the request path maintains derived views itself."""
+    return DERIVED_VIEWS != 'stream'
+
+
+def is_stream_event(event) -> bool:
+    return isinstance(event, dict) and bool(event.get('Records')) and \
+        event['Records'][0].get('eventSource') == 'aws:dynamodb'
+
+
+def table_of(record: dict) -> str:
+    # arn:aws:dynamodb:<region>:<account>:table/<name>/stream/<label>
+    return record['eventSourceARN'].split(':table/', 1)[1].split('/', 1)[0]
+
+
+def parse(record: dict) -> Optional[Change]:
+    """The change a stream record describes, or None for tables this consumer does not follow."""
+    table = table_of(record)
+    key_name = PARTITION_KEYS.get(table)
+    if key_name is None:
+        return None
+    data = record['dynamodb']
+    keys = codec.decode_item(data['Keys'])
+    return Change(
+        table=table,
+        partition=f"{table}#{keys[key_name]}",
+        sequence=data['SequenceNumber'].zfill(SEQUENCE_DIGITS),
+        record_id=data['SequenceNumber'],
+        old=codec.decode_item(data.get('OldImage')),
+        new=codec.decode_item(data.get('NewImage'))
+    )
+
+
+def handle(event: dict) -> dict:
+    """Apply a batch of stream records; returns the Lambda partial batch response."""
+    groups: Dict[str, List[Change]] = {}
+    for record in event.get('Records', []):
+        change = parse(record)
+        if change is not None:
+            groups.setdefault(change.partition, []).append(change)
+    if not groups:
+        return {'batchItemFailures': []}
+
+    checkpoints = _load_checkpoints(list(groups))
+    pending = {
+        partition: [change for change in changes if change.sequence > checkpoints.get(partition, '')]
+        for partition, changes in groups.items()
+    }
+    pending = {partition: changes for partition, changes in pending.items() if changes}
+    names = _user_names(pending)
+
+    def process(item: Tuple[str, List[Change]]) -> Optional[str]:
+        partition, changes = item
+        try:
+            _apply(changes, names)
+            _save_checkpoint(partition, changes[-1].sequence)
+            return None
+        except Exception as e:
+            logger.error(f"Applying stream records of {partition} failed: {e}")
+            return changes[0].record_id
+
+    with ThreadPoolExecutor(max_workers=max(1, STREAM_WORKERS)) as executor:
+        failed = [record_id for record_id in executor.map(metrics.bind(process), pending.items()) if record_id]
+    skipped = sum(len(changes) for changes in groups.values()) - sum(len(changes) for changes in pending.values())
+    logger.info(
+        f"Applied stream records of {len(pending) - len(failed)} partitions; "
+        f"{len(failed)} failed, {skipped} records already applied"
+    )
+    return {'batchItemFailures': [{'itemIdentifier': record_id} for record_id in failed]}
+
+
+def _apply(changes: List[Change], names: Dict[str, Optional[str]]):
+    table = changes[0].table
+    if table == registrations_table_name:
+        _apply_registrations(changes, names)
+    elif table == events_table_name:
+        _apply_events(changes)
+    elif table == users_table_name:
+        _apply_users(changes)
+
+
+def _net(changes: List[Change], key: str) -> Dict[str, Tuple[Optional[dict], Optional[dict]]]:
+    """Per item: its image before the first change and after the last one."""
+    net: Dict[str, Tuple[Optional[dict], Optional[dict]]] = {}
+    for change in changes:
+        item_key = (change.new or change.old)[key]
+        before = net[item_key][0] if item_key in net else change.old
+        net[item_key] = (before, change.new)
+    return net
+
+
+def _seats(image: Optional[dict]) -> Tuple[int, int]:
+    status = (image or {}).get('status')
+    return int(status == 'registered'), int(status == 'waitlisted')
+
+
+def _roster_entry(image: dict) -> tuple:
+    return image.get('status'), image.get('registeredAt'), image.get('waitlistSeq')
+
+
+def _roster_changes(changes: List[Change]) -> List[Tuple[dict, Optional[dict]]]:
+    """(before, after) of the registrations whose roster entry changed."""
+    return [
+        (before, after) for before, after in _net(changes, 'userId').values()
+        if before is None or after is None or _roster_entry(before) != _roster_entry(after)
+    ]
+
+
+def _apply_registrations(changes: List[Change], names: Dict[str, Optional[str]]):
+    event_id = (changes[0].new or changes[0].old)['eventId']
+    # Rosters first: they are idempotent, the counter delta is not
+    added = []
+    for before, after in _roster_changes(changes):
+        if after is None:
+            if before is not None:
+                rosters.remove(event_id, before['userId'])
+        elif before is None:
+            added.append(after)
+        else:
+            rosters.add(after, names.get(after['userId']))
+    rosters.add_many(event_id, added, names)
+
+    registrations = waitlist = 0
+    for change in changes:
+        if change.old is None:
+            # Inserts claimed their seat or waitlist place in their own transaction
+            continue
+        new_seats, old_seats = _seats(change.new), _seats(change.old)
+        if change.new is None:
+            # Promotions claimed their seat in their own transaction; only releases give seats back
+            registrations -= old_seats[0]
+        waitlist += new_seats[1] - old_seats[1]
+    # Released seats go to the waitlist
+    counters.apply(event_id, registrations, waitlist)
+
+
+def _apply_events(changes: List[Change]):
+    for before, after in _net(changes, 'eventId').values():
+        search.reindex(before, after)
+        if before is None or after is None:
+            continue
+        if any(before.get(field) != after.get(field) for field in summaries.SUMMARY_FIELDS):
+            summaries.propagate(counters.apply_aggregate(after))
+
+
+def _apply_users(changes: List[Change]):
+    for user_id, (before, after) in _net(changes, 'userId').items():
+        if before is None or after is None or before.get('name') == after.get('name'):
+            continue
+        event_ids = []
+        params = {
+            'IndexName': 'userId-index',
+            'KeyConditionExpression': 'userId = :uid',
+            'ExpressionAttributeValues': {':uid': user_id},
+            'ProjectionExpression': 'eventId'
+        }
+        while True:
+            response = registrations_reader.query(**params)
+            event_ids.extend(item['eventId'] for item in response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        rosters.rename(user_id, after.get('name') or '', event_ids)
+
+
+def _user_names(pending: Dict[str, List[Change]]) -> Dict[str, Optional[str]]:
+    """Names of the users whose roster entries the batch writes, in one BatchGetItem pass."""
+    user_ids = set()
+    for changes in pending.values():
+        if changes[0].table == registrations_table_name:
+            user_ids.update(after['userId'] for _, after in _roster_changes(changes) if after)
+    users = batch_get(dynamodb, users_table_name, [{'userId': uid} for uid in sorted(user_ids)],
+                      projection=['userId', 'name'])
+    return {user['userId']: user.get('name') for user in users}
+
+
+def _load_checkpoints(partitions: List[str]) -> Dict[str, str]:
+    items = batch_get(dynamodb, checkpoints_table_name, [{'partitionKey': p} for p in partitions],
+                      projection=['partitionKey', 'sequenceNumber'])
+    return {item['partitionKey']: item['sequenceNumber'] for item in items}
+
+
+def _save_checkpoint(partition: str, sequence: str):
+    try:
+        checkpoints_table.put_item(
+            Item={
+                'partitionKey': partition,
+                'sequenceNumber': sequence,
+                'expiresAt': int(time.time()) + CHECKPOINT_TTL_SECONDS
+            },
+            ConditionExpression='attribute_not_exists(partitionKey) OR sequenceNumber < :sequence',
+            ExpressionAttributeValues={':sequence': sequence}
+        )
+    except ClientError as e:
+        # Already further along; nothing to record
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
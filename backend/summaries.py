@@ -0,0 +1,143 @@
+"""Event summaries denormalized onto registration items.
+
+Each registration carries `eventSummary` (title, date, location and status,
+plus the event version it was taken at), so a user's registrations come
+back from one userId-index query without reading their events. New
+registrations get the summary when they are written; when an update
+changes one of those fields, `propagate` fans the new summary out to the
+event's registrations, inline for small events and as a background job for
+large ones.
+
+New registrations copy the summary from the event cache, so for a short
+while after an update they may still write the old one. `propagate` also
+starts a `settle_summaries` job that refreshes again once no such copy can
+be written any more; refreshes are version-guarded and never undo a newer
+summary.
+"""
+from botocore.exceptions import ClientError
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+from common import aws, codec, metrics
+from common.batch import chunked
+from common.cache import CACHE_TTL_SECONDS, event_cache
+
+logger = logging.getLogger(__name__)
+
+events_table_name = os.getenv('DYNAMODB_TABLE_NAME', 'Events')
+registrations_table_name = os.getenv('REGISTRATIONS_TABLE_NAME', 'Registrations')
+
+events_table = aws.table(events_table_name)
+registrations_table = aws.table(registrations_table_name)
+events_reader = codec.reader(events_table_name, events_table)
+registrations_reader = codec.reader(registrations_table_name, registrations_table)
+
+SUMMARY_FIELDS = ('title', 'date', 'location', 'status')
+# Events with more registrations than this are refreshed by a background job
+SUMMARY_INLINE_LIMIT = int(os.getenv('SUMMARY_INLINE_LIMIT', '100'))
+SUMMARY_WORKERS = int(os.getenv('SUMMARY_WORKERS', '8'))
+# Registrations updated between progress reports
+SUMMARY_BATCH = 200
+# How long after an update a registration may still copy the old summary (0: no second refresh)
+SUMMARY_SETTLE_SECONDS = float(os.getenv('SUMMARY_SETTLE_SECONDS', str(CACHE_TTL_SECONDS + 5)))
+
+
+def summary_of(event: dict) -> dict:
+    summary = {field: event[field] for field in SUMMARY_FIELDS if field in event}
+    summary['version'] = int(event.get('version', 0))
+    return summary
+
+
+def public(event_id: str, summary: dict) -> dict:
+    """The summary as embedded in responses."""
+    return {'eventId': event_id, **{field: summary[field] for field in SUMMARY_FIELDS if field in summary}}
+
+
+def load(event_id: str) -> Optional[dict]:
+    """The current summary of an event, from the event cache when it is warm."""
+    event = event_cache.get(event_id)
+    if event is None:
+        names = {f'#f{i}': field for i, field in enumerate(SUMMARY_FIELDS)}
+        try:
+            event = events_reader.get_item(
+                Key={'eventId': event_id},
+                ProjectionExpression=', '.join([*names, 'version']),
+                ExpressionAttributeNames=names
+            ).get('Item')
+        except ClientError:
+            return None
+    return summary_of(event) if event else None
+
+
+def propagate(event: dict):
+    """Push an updated event's summary to its registrations."""
+    # Imported here: the jobs module imports the data layer, which imports this one
+    import jobs
+    pending = int(event.get('currentRegistrations', 0)) + int(event.get('currentWaitlist', 0))
+    try:
+        if pending <= SUMMARY_INLINE_LIMIT:
+            refresh(event['eventId'])
+        else:
+            jobs.start('refresh_summaries', event['eventId'])
+        if SUMMARY_SETTLE_SECONDS > 0:
+            jobs.start('settle_summaries', event['eventId'])
+    except ClientError as e:
+        logger.warning(f"Refreshing registration summaries of event {event['eventId']} failed: {e}")
+
+
+def refresh(event_id: str, progress: Optional[Callable[[int, int], None]] = None) -> bool:
+    """Write the event's current summary onto all of its registrations.
+
+    Each registration is updated on its own, only if its summary is older,
+    so a refresh never undoes a newer one and never touches other fields.
+    `progress(done, total)` is called after every batch.
+    """
+    event = events_table.get_item(Key={'eventId': event_id}, ConsistentRead=True).get('Item')
+    if not event:
+        return True
+    summary = summary_of(event)
+
+    user_ids: List[str] = []
+    params = {
+        'KeyConditionExpression': 'eventId = :eid',
+        'ExpressionAttributeValues': {':eid': event_id},
+        'ProjectionExpression': 'userId'
+    }
+    while True:
+        response = registrations_reader.query(**params)
+        user_ids.extend(item['userId'] for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def update(user_id: str):
+        try:
+            registrations_table.update_item(
+                Key={'eventId': event_id, 'userId': user_id},
+                UpdateExpression='SET eventSummary = :summary',
+                ConditionExpression=(
+                    'attribute_exists(userId) AND '
+                    '(attribute_not_exists(eventSummary) OR eventSummary.version < :version)'
+                ),
+                ExpressionAttributeValues={':summary': summary, ':version': summary['version']}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, SUMMARY_WORKERS)) as executor:
+        for batch in chunked(user_ids, SUMMARY_BATCH):
+            list(executor.map(metrics.bind(update), batch))
+            done += len(batch)
+            if progress:
+                progress(done, len(user_ids))
+    return True
+
+
+def settle(event_id: str, progress: Optional[Callable[[int, int], None]] = None) -> bool:
+    """Refresh again once registrations can no longer copy a summary cached before the update."""
+    time.sleep(SUMMARY_SETTLE_SECONDS)
+    return refresh(event_id, progress)
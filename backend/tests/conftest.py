@@ -0,0 +1,67 @@
+"""The API in-process against empty moto tables, recreated for every test.
+
+The tables come from the benchmark environment, which has to be set up
+before any app module is imported; hence the work at import time here.
+"""
+import os
+
+import pytest
+
+# Background jobs would run on threads, and moto is not thread-safe
+os.environ['SUMMARY_SETTLE_SECONDS'] = '0'
+
+from benchmarks import environment
+
+environment.start(prefix='test-')
+
+from fastapi.testclient import TestClient
+from common.cache import event_cache, user_cache
+import counters
+import main
+import rosters
+
+
+@pytest.fixture(autouse=True)
+def tables():
+    environment.create_tables('test-')
+    for cache in (event_cache, user_cache):
+        cache.clear()
+    counters._known_shards.clear()
+    counters._pending.clear()
+    rosters._known_chunks.clear()
+    yield
+
+
+@pytest.fixture
+def client() -> TestClient:
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def make_event(client):
+    def make(event_id: str, capacity: int = 2, **fields) -> dict:
+        event = {
+            'eventId': event_id,
+            'title': f'Event {event_id}',
+            'description': 'An event',
+            'date': '2024-06-01',
+            'location': 'Berlin',
+            'capacity': capacity,
+            'organizer': 'Acme',
+            'status': 'published',
+            'waitlistEnabled': True,
+            **fields
+        }
+        response = client.post('/events', json=event)
+        assert response.status_code == 201, response.text
+        return response.json()
+    return make
+
+
+@pytest.fixture
+def make_users(client):
+    def make(*user_ids: str):
+        for user_id in user_ids:
+            response = client.post('/users', json={'userId': user_id, 'name': user_id.upper()})
+            assert response.status_code == 201, response.text
+    return make
@@ -0,0 +1,48 @@
+def test_if_none_match_returns_304_until_the_event_changes(client, make_event):
+    make_event('e1')
+    etag = client.get('/events/e1').headers['ETag']
+
+    response = client.get('/events/e1', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+
+    client.put('/events/e1', json={'title': 'Renamed'})
+    assert client.get('/events/e1', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_if_match_rejects_a_stale_update(client, make_event):
+    make_event('e1')
+    etag = client.get('/events/e1').headers['ETag']
+
+    first = client.put('/events/e1', json={'title': 'First'}, headers={'If-Match': etag})
+    second = client.put('/events/e1', json={'title': 'Second'}, headers={'If-Match': etag})
+
+    assert first.status_code == 200
+    assert second.status_code == 412
+    assert client.get('/events/e1').json()['title'] == 'First'
+
+
+def test_if_match_on_a_missing_item_is_412(client):
+    assert client.put('/events/nope', json={'title': 'x'}, headers={'If-Match': '*'}).status_code == 412
+    assert client.put('/users/nope', json={'name': 'x'}, headers={'If-Match': '"1"'}).status_code == 412
+    assert client.put('/users/nope', json={'name': 'x'}).status_code == 404
+
+
+def test_seats_on_shards_do_not_fail_if_match(client, make_event, make_users):
+    make_event('e1', capacity=10, highDemand=True)
+    make_users('u1')
+    etag = client.get('/events/e1').headers['ETag']
+
+    client.post('/events/e1/registrations', json={'userId': 'u1'})
+    response = client.put('/events/e1', json={'title': 'Renamed'}, headers={'If-Match': etag})
+
+    assert response.status_code == 200
+    assert response.json()['currentRegistrations'] == 1
+
+
+def test_user_if_match(client, make_users):
+    make_users('u1')
+    etag = client.get('/users/u1').headers['ETag']
+
+    assert client.put('/users/u1', json={'name': 'A'}, headers={'If-Match': etag}).status_code == 200
+    assert client.put('/users/u1', json={'name': 'B'}, headers={'If-Match': etag}).status_code == 412
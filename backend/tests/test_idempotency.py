@@ -0,0 +1,46 @@
+def test_retried_post_replays_the_first_response(client):
+    user = {'userId': 'u1', 'name': 'U1'}
+    headers = {'Idempotency-Key': 'create-u1'}
+
+    first = client.post('/users', json=user, headers=headers)
+    retry = client.post('/users', json=user, headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    # Without the key the same request runs again, and fails
+    assert client.post('/users', json=user).status_code == 409
+
+
+def test_replayed_registration_is_not_registered_twice(client, make_event, make_users):
+    make_event('e1', capacity=1)
+    make_users('u1')
+    headers = {'Idempotency-Key': 'register-u1'}
+
+    first = client.post('/events/e1/registrations', json={'userId': 'u1'}, headers=headers)
+    retry = client.post('/events/e1/registrations', json={'userId': 'u1'}, headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert client.get('/events/e1?consistent=true').json()['currentRegistrations'] == 1
+
+
+def test_key_reused_with_another_body_is_rejected(client):
+    headers = {'Idempotency-Key': 'k'}
+    client.post('/users', json={'userId': 'u1', 'name': 'U1'}, headers=headers)
+
+    response = client.post('/users', json={'userId': 'u2', 'name': 'U2'}, headers=headers)
+
+    assert response.status_code == 422
+    assert client.get('/users/u2').status_code == 404
+
+
+def test_client_errors_are_replayed_too(client, make_event):
+    make_event('e1')
+    headers = {'Idempotency-Key': 'register-u1'}
+
+    assert client.post('/events/e1/registrations', json={'userId': 'u1'}, headers=headers).status_code == 404
+    client.post('/users', json={'userId': 'u1', 'name': 'U1'})
+
+    assert client.post('/events/e1/registrations', json={'userId': 'u1'}, headers=headers).status_code == 404
+    assert client.post('/events/e1/registrations', json={'userId': 'u1'}).status_code == 201
@@ -0,0 +1,150 @@
+import counters
+import registration_db
+
+
+def register(client, event_id, user_id):
+    return client.post(f'/events/{event_id}/registrations', json={'userId': user_id})
+
+
+def cancel(client, event_id, user_id):
+    return client.delete(f'/events/{event_id}/registrations/{user_id}')
+
+
+def counts(client, event_id):
+    event = client.get(f'/events/{event_id}?consistent=true').json()
+    return event['currentRegistrations'], event['currentWaitlist']
+
+
+def roster(client, event_id):
+    body = client.get(f'/events/{event_id}/registrations').json()
+    return (
+        sorted(item['userId'] for item in body['registered']),
+        [item['userId'] for item in body['waitlisted']]
+    )
+
+
+def test_full_event_without_waitlist_rejects(client, make_event, make_users):
+    make_event('e1', capacity=1, waitlistEnabled=False)
+    make_users('u1', 'u2')
+
+    assert register(client, 'e1', 'u1').json()['status'] == 'registered'
+    response = register(client, 'e1', 'u2')
+
+    assert response.status_code == 409
+    assert 'capacity' in response.json()['detail']
+    assert counts(client, 'e1') == (1, 0)
+
+
+def test_full_event_waitlists_in_order(client, make_event, make_users):
+    make_event('e1', capacity=1)
+    make_users('u1', 'u2', 'u3')
+
+    statuses = [register(client, 'e1', user_id).json() for user_id in ('u1', 'u2', 'u3')]
+
+    assert [s['status'] for s in statuses] == ['registered', 'waitlisted', 'waitlisted']
+    assert [s['position'] for s in statuses[1:]] == [1, 2]
+    assert counts(client, 'e1') == (1, 2)
+
+
+def test_registering_twice_conflicts(client, make_event, make_users):
+    make_event('e1')
+    make_users('u1')
+
+    register(client, 'e1', 'u1')
+
+    assert register(client, 'e1', 'u1').status_code == 409
+    assert counts(client, 'e1') == (1, 0)
+
+
+def test_cancelled_seats_go_to_the_waitlist_in_order(client, make_event, make_users):
+    make_event('e1', capacity=2)
+    make_users(*(f'u{i}' for i in range(6)))
+    for i in range(6):
+        register(client, 'e1', f'u{i}')
+
+    assert cancel(client, 'e1', 'u0').status_code == 204
+    assert cancel(client, 'e1', 'u3').status_code == 204
+    assert roster(client, 'e1') == (['u1', 'u2'], ['u4', 'u5'])
+
+    cancel(client, 'e1', 'u1')
+    assert roster(client, 'e1') == (['u2', 'u4'], ['u5'])
+    assert counts(client, 'e1') == (2, 1)
+
+
+def test_promotion_needs_a_free_seat(client, make_event, make_users):
+    make_event('e1', capacity=1)
+    make_users('u1', 'u2')
+    register(client, 'e1', 'u1')
+    register(client, 'e1', 'u2')
+
+    assert registration_db.promote_from_waitlist('e1') is False
+    assert counts(client, 'e1') == (1, 1)
+
+
+def test_registration_during_cancel_does_not_take_the_seat(client, make_event, make_users, monkeypatch):
+    make_event('e1', capacity=1)
+    make_users('u1', 'u2', 'u3')
+    register(client, 'e1', 'u1')
+    register(client, 'e1', 'u2')
+
+    heads = registration_db._waitlist_heads
+
+    def register_first(event_id):
+        # u3 registers after u1's cancellation started, before the seat is handed over
+        assert registration_db.register_user(event_id, 'u3')['status'] == 'waitlisted'
+        return heads(event_id)
+    monkeypatch.setattr(registration_db, '_waitlist_heads', register_first)
+
+    assert cancel(client, 'e1', 'u1').status_code == 204
+    assert roster(client, 'e1') == (['u2'], ['u3'])
+    assert counts(client, 'e1') == (1, 1)
+
+
+def test_concurrent_cancels_release_one_seat(client, make_event, make_users, monkeypatch):
+    make_event('e1', capacity=1)
+    make_users('u1', 'u2', 'u3')
+    register(client, 'e1', 'u1')
+    register(client, 'e1', 'u2')
+    register(client, 'e1', 'u3')
+
+    # Both requests read the registration before either deletes it
+    stale = registration_db.get_registration('e1', 'u1')
+    monkeypatch.setattr(registration_db, 'get_registration', lambda event_id, user_id: stale)
+
+    assert cancel(client, 'e1', 'u1').status_code == 204
+    assert cancel(client, 'e1', 'u1').status_code == 404
+    monkeypatch.undo()
+    assert roster(client, 'e1') == (['u2'], ['u3'])
+    assert counts(client, 'e1') == (1, 1)
+
+
+def test_buffered_release_promotes_when_flushed(client, make_event, make_users, monkeypatch):
+    monkeypatch.setattr(counters, 'COUNTER_FLUSH_INTERVAL', 3600)
+    make_event('e1', capacity=1)
+    make_users('u1', 'u2')
+    register(client, 'e1', 'u1')
+
+    cancel(client, 'e1', 'u1')
+    # The release is still buffered, so the seat still counts as taken
+    assert register(client, 'e1', 'u2').json()['status'] == 'waitlisted'
+
+    counters.flush()
+    counters.flush()
+    assert roster(client, 'e1') == (['u2'], [])
+    assert counts(client, 'e1') == (1, 0)
+
+
+def test_sharded_event_totals(client, make_event, make_users):
+    make_event('e1', capacity=3, highDemand=True)
+    make_users(*(f'u{i}' for i in range(5)))
+
+    statuses = [register(client, 'e1', f'u{i}').json()['status'] for i in range(5)]
+
+    assert statuses.count('registered') == 3
+    assert counts(client, 'e1') == (3, 2)
+
+    registered, waitlisted = roster(client, 'e1')
+    cancel(client, 'e1', registered[0])
+    assert counts(client, 'e1') == (3, 1)
+    assert roster(client, 'e1') == (sorted([*registered[1:], waitlisted[0]]), waitlisted[1:])
+    assert counters.aggregate('e1') == (3, 1)
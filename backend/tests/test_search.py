@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.fixture
+def events(make_event):
+    make_event('e1', title='Python meetup', date='2024-06-01', organizer='Acme')
+    make_event('e2', title='Pythonic patterns', date='2024-06-02', location='Paris', organizer='Other', status='draft')
+    make_event('e3', title='Rust meetup', date='2024-06-02', organizer='Acme')
+    make_event('e4', title='Python workshop', date='2024-06-03', location='Paris', organizer='Other')
+
+
+def search(client, **params):
+    """Event IDs of every page, following the cursor."""
+    ids, cursor = [], None
+    while True:
+        response = client.get('/events', params={**params, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        ids.extend(event['eventId'] for event in response.json())
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return ids
+
+
+def test_text_search_matches_word_prefixes(client, events):
+    assert search(client, q='pyth', limit=1) == ['e1', 'e2', 'e4']
+    assert search(client, q='python meet') == ['e1']
+
+
+def test_filters_without_text_use_the_date_indexes(client, events):
+    assert search(client, organizer='Acme', limit=1) == ['e1', 'e3']
+    assert search(client, location='Paris', limit=1) == ['e2', 'e4']
+    assert search(client, dateFrom='2024-06-02', dateTo='2024-06-02', limit=1) == ['e2', 'e3']
+    assert search(client, status='draft') == ['e2']
+
+
+def test_search_follows_updates_and_deletes(client, events):
+    client.put('/events/e1', json={'title': 'Golang meetup'})
+    client.delete('/events/e4')
+
+    assert search(client, q='pyth') == ['e2']
+    assert search(client, q='golang') == ['e1']
@@ -1,6 +1,7 @@
 import * as cdk from 'aws-cdk-lib';
 import * as dynamodb from 'aws-cdk-lib/aws-dynamodb';
 import * as lambda from 'aws-cdk-lib/aws-lambda';
+import * as lambdaEventSources from 'aws-cdk-lib/aws-lambda-event-sources';
 import * as apigateway from 'aws-cdk-lib/aws-apigateway';
 import * as iam from 'aws-cdk-lib/aws-iam';
 import { Construct } from 'constructs';
@@ -13,6 +14,8 @@ export class InfrastructureStack extends cdk.Stack {
     // DynamoDB Tables
     const eventsTable = new dynamodb.Table(this, 'EventsTable', {
       tableName: 'Events',
+      // Change records feed the derived-views consumer (stream_handler.py)
+      stream: dynamodb.StreamViewType.NEW_AND_OLD_IMAGES,
       partitionKey: {
         name: 'eventId',
         type: dynamodb.AttributeType.STRING,
@@ -21,8 +24,40 @@ export class InfrastructureStack extends cdk.Stack {
       removalPolicy: cdk.RemovalPolicy.DESTROY,
     });
 
+    // Add GSI for paginated listing of events by status, ordered by date
+    eventsTable.addGlobalSecondaryIndex({
+      indexName: 'status-date-index',
+      partitionKey: {
+        name: 'status',
+        type: dynamodb.AttributeType.STRING,
+      },
+      sortKey: {
+        name: 'date',
+        type: dynamodb.AttributeType.STRING,
+      },
+      projectionType: dynamodb.ProjectionType.ALL,
+    });
+
+    // GSI for searching an organizer's events by date range. It only projects
+    // the filterable fields, so registration counter updates never write to it.
+    eventsTable.addGlobalSecondaryIndex({
+      indexName: 'organizer-date-index',
+      partitionKey: {
+        name: 'organizer',
+        type: dynamodb.AttributeType.STRING,
+      },
+      sortKey: {
+        name: 'date',
+        type: dynamodb.AttributeType.STRING,
+      },
+      projectionType: dynamodb.ProjectionType.INCLUDE,
+      nonKeyAttributes: ['status', 'location'],
+    });
+
     const usersTable = new dynamodb.Table(this, 'UsersTable', {
       tableName: 'Users',
+      // Change records feed the derived-views consumer (stream_handler.py)
+      stream: dynamodb.StreamViewType.NEW_AND_OLD_IMAGES,
       partitionKey: {
         name: 'userId',
         type: dynamodb.AttributeType.STRING,
@@ -33,6 +68,8 @@ export class InfrastructureStack extends cdk.Stack {
 
     const registrationsTable = new dynamodb.Table(this, 'RegistrationsTable', {
       tableName: 'Registrations',
+      // Change records feed the derived-views consumer (stream_handler.py)
+      stream: dynamodb.StreamViewType.NEW_AND_OLD_IMAGES,
       partitionKey: {
         name: 'eventId',
         type: dynamodb.AttributeType.STRING,
@@ -55,28 +92,148 @@ export class InfrastructureStack extends cdk.Stack {
       projectionType: dynamodb.ProjectionType.ALL,
     });
 
+    // Sharded registration counters for high-demand events
+    const countersTable = new dynamodb.Table(this, 'EventCountersTable', {
+      tableName: 'EventCounters',
+      partitionKey: {
+        name: 'eventId',
+        type: dynamodb.AttributeType.STRING,
+      },
+      sortKey: {
+        name: 'shard',
+        type: dynamodb.AttributeType.NUMBER,
+      },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
+    // Sparse GSI over waitlisted registrations only, ordered by join sequence
+    registrationsTable.addGlobalSecondaryIndex({
+      indexName: 'waitlist-index',
+      partitionKey: {
+        name: 'eventId',
+        type: dynamodb.AttributeType.STRING,
+      },
+      sortKey: {
+        name: 'waitlistSeq',
+        type: dynamodb.AttributeType.NUMBER,
+      },
+      projectionType: dynamodb.ProjectionType.KEYS_ONLY,
+    });
+
+    // Materialized attendee lists, a few chunk items per event
+    const rostersTable = new dynamodb.Table(this, 'RostersTable', {
+      tableName: 'Rosters',
+      partitionKey: {
+        name: 'eventId',
+        type: dynamodb.AttributeType.STRING,
+      },
+      sortKey: {
+        name: 'chunk',
+        type: dynamodb.AttributeType.NUMBER,
+      },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
+    // Status and progress of background jobs (cascading deletes)
+    const jobsTable = new dynamodb.Table(this, 'JobsTable', {
+      tableName: 'Jobs',
+      partitionKey: {
+        name: 'jobId',
+        type: dynamodb.AttributeType.STRING,
+      },
+      timeToLiveAttribute: 'expiresAt',
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
+    // First responses to POSTs sent with an Idempotency-Key, replayed to retries
+    const idempotencyTable = new dynamodb.Table(this, 'IdempotencyTable', {
+      tableName: 'Idempotency',
+      partitionKey: {
+        name: 'idempotencyKey',
+        type: dynamodb.AttributeType.STRING,
+      },
+      timeToLiveAttribute: 'expiresAt',
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
+    // Search postings: one item per title/description word prefix and event, sorted by date
+    const searchTermsTable = new dynamodb.Table(this, 'SearchTermsTable', {
+      tableName: 'SearchTerms',
+      partitionKey: {
+        name: 'term',
+        type: dynamodb.AttributeType.STRING,
+      },
+      sortKey: {
+        name: 'dateKey',
+        type: dynamodb.AttributeType.STRING,
+      },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
+    // An event's postings, to replace them when it changes
+    searchTermsTable.addGlobalSecondaryIndex({
+      indexName: 'eventId-index',
+      partitionKey: {
+        name: 'eventId',
+        type: dynamodb.AttributeType.STRING,
+      },
+      projectionType: dynamodb.ProjectionType.KEYS_ONLY,
+    });
+
+    // Last stream record applied per partition by the derived-views consumer
+    const streamCheckpointsTable = new dynamodb.Table(this, 'StreamCheckpointsTable', {
+      tableName: 'StreamCheckpoints',
+      partitionKey: {
+        name: 'partitionKey',
+        type: dynamodb.AttributeType.STRING,
+      },
+      timeToLiveAttribute: 'expiresAt',
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
+    const backendCode = lambda.Code.fromAsset(path.join(__dirname, '../../backend'), {
+      bundling: {
+        image: lambda.Runtime.PYTHON_3_11.bundlingImage,
+        platform: 'linux/amd64',
+        command: [
+          'bash', '-c',
+          'pip install -r requirements.txt -t /asset-output && cp -au . /asset-output'
+        ],
+      },
+    });
+
+    const backendEnvironment = {
+      DYNAMODB_TABLE_NAME: eventsTable.tableName,
+      USERS_TABLE_NAME: usersTable.tableName,
+      REGISTRATIONS_TABLE_NAME: registrationsTable.tableName,
+      COUNTERS_TABLE_NAME: countersTable.tableName,
+      JOBS_TABLE_NAME: jobsTable.tableName,
+      ROSTERS_TABLE_NAME: rostersTable.tableName,
+      IDEMPOTENCY_TABLE_NAME: idempotencyTable.tableName,
+      STREAM_CHECKPOINTS_TABLE_NAME: streamCheckpointsTable.tableName,
+      SEARCH_TERMS_TABLE_NAME: searchTermsTable.tableName,
+      // Counters, rosters, summaries and search postings are maintained by the stream consumer
+      DERIVED_VIEWS: 'stream',
+    };
+
     // Lambda Function
     const apiLambda = new lambda.Function(this, 'EventsApiLambda', {
       runtime: lambda.Runtime.PYTHON_3_11,
       handler: 'lambda_handler.handler',
       architecture: lambda.Architecture.X86_64,
-      code: lambda.Code.fromAsset(path.join(__dirname, '../../backend'), {
-        bundling: {
-          image: lambda.Runtime.PYTHON_3_11.bundlingImage,
-          platform: 'linux/amd64',
-          command: [
-            'bash', '-c',
-            'pip install -r requirements.txt -t /asset-output && cp -au . /asset-output'
-          ],
-        },
-      }),
+      code: backendCode,
       environment: {
-        DYNAMODB_TABLE_NAME: eventsTable.tableName,
-        USERS_TABLE_NAME: usersTable.tableName,
-        REGISTRATIONS_TABLE_NAME: registrationsTable.tableName,
+        ...backendEnvironment,
         ALLOWED_ORIGINS: '*',
       },
-      timeout: cdk.Duration.seconds(30),
+      // API Gateway still cuts requests off at 29s; the headroom is for background jobs
+      timeout: cdk.Duration.minutes(5),
       memorySize: 512,
     });
 
@@ -84,6 +241,64 @@ export class InfrastructureStack extends cdk.Stack {
     eventsTable.grantReadWriteData(apiLambda);
     usersTable.grantReadWriteData(apiLambda);
     registrationsTable.grantReadWriteData(apiLambda);
+    countersTable.grantReadWriteData(apiLambda);
+    jobsTable.grantReadWriteData(apiLambda);
+    rostersTable.grantReadWriteData(apiLambda);
+    idempotencyTable.grantReadWriteData(apiLambda);
+    searchTermsTable.grantReadWriteData(apiLambda);
+
+    // Background jobs run as asynchronous invocations of this same function.
+    // A name pattern avoids a circular dependency between the function and its role.
+    apiLambda.addToRolePolicy(new iam.PolicyStatement({
+      actions: ['lambda:InvokeFunction'],
+      resources: [
+        this.formatArn({
+          service: 'lambda',
+          resource: 'function',
+          resourceName: `${this.stackName}-EventsApiLambda*`,
+          arnFormat: cdk.ArnFormat.COLON_RESOURCE_NAME,
+        }),
+      ],
+    }));
+
+    // Consumer of the table streams that maintains derived views
+    const streamLambda = new lambda.Function(this, 'EventsStreamLambda', {
+      runtime: lambda.Runtime.PYTHON_3_11,
+      handler: 'stream_handler.handler',
+      architecture: lambda.Architecture.X86_64,
+      code: backendCode,
+      environment: backendEnvironment,
+      // Also runs the background jobs it starts
+      timeout: cdk.Duration.minutes(5),
+      memorySize: 512,
+    });
+
+    for (const table of [eventsTable, usersTable, registrationsTable, countersTable, jobsTable, rostersTable, searchTermsTable, streamCheckpointsTable]) {
+      table.grantReadWriteData(streamLambda);
+    }
+    streamLambda.addToRolePolicy(new iam.PolicyStatement({
+      actions: ['lambda:InvokeFunction'],
+      resources: [
+        this.formatArn({
+          service: 'lambda',
+          resource: 'function',
+          resourceName: `${this.stackName}-EventsStreamLambda*`,
+          arnFormat: cdk.ArnFormat.COLON_RESOURCE_NAME,
+        }),
+      ],
+    }));
+
+    // Records of one partition key stay in order; failed records are retried from the first failure
+    for (const table of [eventsTable, usersTable, registrationsTable]) {
+      streamLambda.addEventSource(new lambdaEventSources.DynamoEventSource(table, {
+        startingPosition: lambda.StartingPosition.TRIM_HORIZON,
+        batchSize: 100,
+        maxBatchingWindow: cdk.Duration.seconds(1),
+        parallelizationFactor: 4,
+        reportBatchItemFailures: true,
+        retryAttempts: 10,
+      }));
+    }
 
     // API Gateway
     const api = new apigateway.LambdaRestApi(this, 'EventsApi', {